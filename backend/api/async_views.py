@@ -0,0 +1,103 @@
+"""
+Async annotator endpoints
+Served in place of the DRF views when ASYNC_VIEWS is on (CROWDLABEL_ASYNC_VIEWS=1,
+ASGI servers only). Reads use the async ORM; task picking and the submit
+transaction go through sync_to_async, since the dispatcher lock and Django
+transactions are sync-only. Payloads and status codes are the same as
+the DRF views.
+"""
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.renderers import JSONRenderer
+from .models import UserStats, LabelSet
+from .dispatch import dispatcher
+from .serializers import UserSerializer, ImageSerializer
+from .views import save_annotation, stats_summary
+from . import stats, metrics
+from . import caching as response_cache
+
+# what DRF's IsAuthenticated answers for a missing session
+NOT_AUTHENTICATED = {'detail': 'Authentication credentials were not provided.'}
+
+
+def _json(data, status=200):
+    """Rendered like a DRF Response (decimals as numbers, None as an empty body)"""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def _annotator(request):
+    """Logged-in user, or None"""
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def _body(request):
+    """JSON or form body as a dict; raises ValueError with DRF's message if malformed"""
+    if request.content_type != 'application/json':
+        return request.POST
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError as e:
+        raise ValueError(f'JSON parse error - {e}')
+    if not isinstance(data, dict):
+        raise ValueError('JSON body must be an object')
+    return data
+
+# ===== Auth APIs =====
+
+@require_GET
+async def check_auth(request):
+    """Check if user is logged in"""
+    user = await _annotator(request)
+    if user is None:
+        return _json(NOT_AUTHENTICATED, status=403)
+    return _json(UserSerializer(user).data)
+
+# ===== Annotator APIs =====
+
+@require_GET
+async def get_available_task(request):
+    """Get next available task for annotator"""
+    user = await _annotator(request)
+    if user is None:
+        return _json(NOT_AUTHENTICATED, status=403)
+    start = time.perf_counter()
+    task = await dispatcher.anext_task(user.id)
+    metrics.DISPATCH_SECONDS.observe(time.perf_counter() - start, 'task' if task else 'empty')
+    if task is None:
+        return _json(None)
+    await LabelSet.acached(task.label_set_id)  # the serializer reads options from the process cache
+    return _json(ImageSerializer(task, context={'request': request}).data)
+
+@csrf_exempt
+@require_POST
+async def submit_annotation(request):
+    """Submit annotation for an image"""
+    user = await _annotator(request)
+    if user is None:
+        return _json(NOT_AUTHENTICATED, status=403)
+    try:
+        data = _body(request)
+    except ValueError as e:
+        return _json({'detail': str(e)}, status=400)
+    payload, status = await sync_to_async(save_annotation)(user, data.get('image_id'), data.get('label'))
+    return _json(payload, status=status)
+
+@require_GET
+async def get_user_stats(request):
+    """Get user statistics"""
+    user = await _annotator(request)
+    if user is None:
+        return _json(NOT_AUTHENTICATED, status=403)
+
+    async def compute():
+        row = await UserStats.objects.filter(user_id=user.id).afirst()
+        if row is None:
+            await sync_to_async(stats.rebuild)([user.id])
+            row = await UserStats.objects.aget(user_id=user.id)
+        return stats_summary(row)
+    return _json(await response_cache.aget_or_compute(f'stats:{user.id}', 'summary', compute))
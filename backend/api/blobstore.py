@@ -0,0 +1,111 @@
+"""
+Content-addressed blob store
+Image bytes live on disk under their SHA-256 (deduplicated); Image rows
+only keep a short "blob:<sha256>" reference instead of inline base64.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from django.conf import settings
+
+REF_PREFIX = 'blob:'
+MIN_BARE_BASE64 = 100
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+_DATA_URI_RE = re.compile(r'^data:[\w/+.-]*(;[\w=-]+)*;base64,', re.IGNORECASE)
+
+# magic bytes -> content type, for serving
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+
+def root():
+    return str(getattr(settings, 'BLOB_STORE_ROOT', os.path.join(settings.BASE_DIR, 'blobs')))
+
+
+def is_digest(value):
+    return bool(_DIGEST_RE.match(value or ''))
+
+
+def path_for(digest):
+    if not is_digest(digest):
+        raise ValueError('Invalid blob id')
+    return os.path.join(root(), digest[:2], digest[2:4], digest)
+
+
+def _commit(tmp_path, digest):
+    """Move a finished temp file into place; an existing copy wins (same content)"""
+    final = path_for(digest)
+    if os.path.exists(final):
+        os.unlink(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(tmp_path, final)
+    return digest
+
+
+def store_stream(chunks):
+    """Write an iterable of byte chunks, return its digest"""
+    os.makedirs(root(), exist_ok=True)
+    sha = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=root(), prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                sha.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return _commit(tmp_path, sha.hexdigest())
+
+
+def store_bytes(data):
+    return store_stream([data])
+
+
+def decode_inline(value):
+    """Bytes of a data: URI or bare base64 string, or None if value is a normal URL"""
+    value = value.strip()
+    if value.startswith(('http://', 'https://', '/', REF_PREFIX)):
+        return None
+    match = _DATA_URI_RE.match(value)
+    if not match and len(value) < MIN_BARE_BASE64:
+        return None  # too short to be an image, treat as a plain reference
+    payload = value[match.end():] if match else value
+    try:
+        return base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def to_reference(value):
+    """Store inline image data and return its "blob:<digest>" reference; URLs pass through"""
+    data = decode_inline(value)
+    if data is None:
+        return value.strip()
+    return REF_PREFIX + store_bytes(data)
+
+
+def digest_of(reference):
+    if reference and reference.startswith(REF_PREFIX):
+        return reference[len(REF_PREFIX):]
+    return None
+
+
+def content_type(path):
+    with open(path, 'rb') as f:
+        head = f.read(16)
+    for magic, kind in _SIGNATURES:
+        if head.startswith(magic):
+            return kind
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
@@ -0,0 +1,190 @@
+"""
+Response cache for read-heavy endpoints
+Entries live in a Django cache (LocMem by default, Redis when configured)
+under a per-namespace version. Writes bump the version of the namespaces
+they affect after commit, so stale entries are never read again and age
+out of the bounded (LRU) cache on their own.
+
+Listings can also be versioned per row: an entry cached with rows= keeps
+the versions of the rows it shows, and invalidate_rows() after a write to
+some rows only drops the entries that show them.
+"""
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+_lock = threading.Lock()
+_counters = {}  # namespace group -> {'hits': n, 'misses': n, 'invalidations': n}
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _count(namespace, event):
+    group = namespace.split(':', 1)[0]
+    with _lock:
+        counters = _counters.setdefault(group, {'hits': 0, 'misses': 0, 'invalidations': 0})
+        counters[event] += 1
+
+
+def _version_key(namespace):
+    return f'crowdlabel:ver:{namespace}'
+
+
+def _version(cache, namespace):
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        # start from the clock so an evicted counter never reuses an old version
+        cache.add(_version_key(namespace), int(time.time() * 1000), timeout=None)
+        version = cache.get(_version_key(namespace), 0)
+    return version
+
+
+def _row_key(namespace, row_id):
+    return f'crowdlabel:row:{namespace}:{row_id}'
+
+
+def _row_versions(cache, namespace, row_ids):
+    """{row_id: version}, starting missing rows from the clock like namespace versions"""
+    keys = {_row_key(namespace, row_id): row_id for row_id in row_ids}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        start = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, start, timeout=None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in found.items()}
+
+
+def row_sequence(namespace):
+    """Changes on every invalidate_rows() of the namespace; put it in the key of entries that
+    depend on rows they do not show (e.g. sorted or filtered by a counter)"""
+    return _version(_cache(), f'{namespace}:rows')
+
+
+def make_key(*parts):
+    """Short stable key from request parameters"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def get_or_compute(namespace, key, compute, timeout=None, rows=None):
+    """Cached value of compute() for (namespace, key); exceptions are not cached.
+
+    rows(value) -> ids of the rows the value shows: the entry then also goes stale
+    when invalidate_rows() touches one of them.
+    """
+    if not getattr(settings, 'RESPONSE_CACHE_ENABLED', True):
+        return compute()
+    cache = _cache()
+    full_key = f'crowdlabel:{namespace}:{_version(cache, namespace)}:{key}'
+    entry = cache.get(full_key)
+    if entry is not None:
+        if rows is None:
+            _count(namespace, 'hits')
+            return entry
+        value, versions = entry
+        if _row_versions(cache, namespace, versions) == versions:
+            _count(namespace, 'hits')
+            return value
+    _count(namespace, 'misses')
+    if timeout is None:
+        timeout = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+    if rows is None:
+        value = compute()
+        cache.set(full_key, value, timeout)
+        return value
+
+    sequence = row_sequence(namespace)
+    value = compute()
+    versions = _row_versions(cache, namespace, rows(value))
+    # a row write that committed while computing may already be in the versions read above
+    if row_sequence(namespace) == sequence:
+        cache.set(full_key, (value, versions), timeout)
+    return value
+
+
+async def _aversion(cache, namespace):
+    version = await cache.aget(_version_key(namespace))
+    if version is None:
+        await cache.aadd(_version_key(namespace), int(time.time() * 1000), timeout=None)
+        version = await cache.aget(_version_key(namespace), 0)
+    return version
+
+
+async def aget_or_compute(namespace, key, compute, timeout=None):
+    """get_or_compute for async views; compute is a coroutine function"""
+    if not getattr(settings, 'RESPONSE_CACHE_ENABLED', True):
+        return await compute()
+    cache = _cache()
+    full_key = f'crowdlabel:{namespace}:{await _aversion(cache, namespace)}:{key}'
+    value = await cache.aget(full_key)
+    if value is not None:
+        _count(namespace, 'hits')
+        return value
+    _count(namespace, 'misses')
+    value = await compute()
+    if timeout is None:
+        timeout = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+    await cache.aset(full_key, value, timeout)
+    return value
+
+
+def _bump(namespaces):
+    cache = _cache()
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            _version(cache, namespace)  # never read yet: nothing cached to drop
+        _count(namespace, 'invalidations')
+
+
+def invalidate(*namespaces):
+    """Drop every entry of the namespaces once the current transaction commits"""
+    if namespaces:
+        transaction.on_commit(lambda: _bump(namespaces))
+
+
+def _bump_rows(namespace, row_ids):
+    cache = _cache()
+    try:
+        cache.incr(_version_key(f'{namespace}:rows'))  # before the rows, see get_or_compute
+    except ValueError:
+        pass  # never read yet: no entry depends on it
+    for row_id in row_ids:
+        try:
+            cache.incr(_row_key(namespace, row_id))
+        except ValueError:
+            pass  # no version: no entry can be holding it
+    _count(namespace, 'invalidations')
+
+
+def invalidate_rows(namespace, row_ids):
+    """Drop the entries of the namespace that show any of these rows once the transaction commits"""
+    row_ids = list(row_ids)
+    if row_ids:
+        transaction.on_commit(lambda: _bump_rows(namespace, row_ids))
+
+
+def invalidate_users(user_ids):
+    invalidate(*[f'stats:{uid}' for uid in user_ids])
+
+
+def stats():
+    """Hit / miss / invalidation counters of this process"""
+    with _lock:
+        groups = {name: dict(c) for name, c in _counters.items()}
+    hits = sum(c['hits'] for c in groups.values())
+    misses = sum(c['misses'] for c in groups.values())
+    return {
+        'backend': type(_cache()).__name__,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        'namespaces': groups,
+    }
@@ -0,0 +1,388 @@
+"""
+Consensus engine
+Decides the final label of an image once it has all its votes. Strategies
+work per image on the integer vote tallies (submit path) and vectorized over
+the whole annotation matrix (rescore_consensus command).
+"""
+import logging
+import time
+import numpy as np
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
+from django.utils import timezone
+from .models import Image, Annotation, LabelSet, UserStats
+from . import stats
+from . import caching as response_cache
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ConsensusStrategy:
+    """Base strategy: subclasses decide per image and per vote matrix"""
+    name = None
+    batch_only = False  # True if it cannot close images on the submit path
+
+    def decide(self, image):
+        """Return the agreed label code of a full image, or None to send it to review"""
+        raise NotImplementedError
+
+    def decide_batch(self, matrix):
+        """Return (label index per image, -1 if undecided) for a VoteMatrix"""
+        raise NotImplementedError
+
+
+# all votes identical (the original rule)
+class UnanimityConsensus(ConsensusStrategy):
+    name = 'unanimity'
+
+    def decide(self, image):
+        if sum(1 for n in image.vote_counts if n) == 1:
+            return image.leading_code
+        return None
+
+    def decide_batch(self, matrix):
+        counts = matrix.counts()
+        top = counts.argmax(axis=1)
+        return np.where(counts.max(axis=1) == counts.sum(axis=1), top, -1)
+
+
+# at least k votes for the leading label
+class MajorityConsensus(ConsensusStrategy):
+    name = 'majority'
+
+    def __init__(self, k=None):
+        self.k = k or getattr(settings, 'CONSENSUS_MAJORITY_K', 4)
+
+    def decide(self, image):
+        code = image.leading_code
+        if code is not None and image.vote_counts[code] >= self.k:
+            return code
+        return None
+
+    def decide_batch(self, matrix):
+        counts = matrix.counts()
+        return np.where(counts.max(axis=1) >= self.k, counts.argmax(axis=1), -1)
+
+
+# votes weighted by each annotator's accuracy on judged annotations
+class WeightedConsensus(ConsensusStrategy):
+    name = 'weighted'
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or getattr(settings, 'CONSENSUS_WEIGHT_THRESHOLD', 0.7)
+
+    @staticmethod
+    def accuracies(user_ids):
+        """Smoothed accuracy per user from the materialized counters, unknown users count as 0.5"""
+        # one primary-key read per voter: runs under the image row lock on the submit path
+        rows = UserStats.objects.filter(user_id__in=user_ids).values_list('user_id', 'correct_count', 'judged_count')
+        acc = {uid: 0.5 for uid in user_ids}
+        for uid, correct, judged in rows:
+            acc[uid] = (correct + 1) / (judged + 2)
+        return acc
+
+    def decide(self, image):
+        votes = list(Annotation.objects.filter(image=image).values_list('user_id', 'label'))
+        acc = self.accuracies({uid for uid, _ in votes})
+        scores = {}
+        for uid, code in votes:
+            scores[code] = scores.get(code, 0.0) + acc[uid]
+        if not scores:
+            return None
+        code, score = max(scores.items(), key=lambda kv: kv[1])
+        return code if score / sum(scores.values()) >= self.threshold else None
+
+    def decide_batch(self, matrix):
+        weights = matrix.worker_accuracy()[matrix.worker]
+        scores = matrix.counts(weights)
+        share = scores.max(axis=1) / np.maximum(scores.sum(axis=1), 1e-12)
+        return np.where(share >= self.threshold, scores.argmax(axis=1), -1)
+
+
+# EM estimate of true labels and per-annotator confusion matrices
+class DawidSkeneConsensus(ConsensusStrategy):
+    name = 'dawid-skene'
+    batch_only = True
+
+    def __init__(self, threshold=None, max_iter=50, tol=1e-6):
+        self.threshold = threshold or getattr(settings, 'CONSENSUS_DS_THRESHOLD', 0.9)
+        self.max_iter = max_iter
+        self.tol = tol
+
+    def decide(self, image):
+        # needs the whole matrix to estimate annotator quality: leave the image to review / the next rescore
+        return None
+
+    def posteriors(self, matrix):
+        """Return (n_images x n_labels) posterior of the true label"""
+        n_img, n_lab, n_wrk = matrix.n_images, matrix.n_labels, matrix.n_workers
+        img, wrk, lab = matrix.image, matrix.worker, matrix.label
+        # start from the vote shares
+        post = matrix.counts()
+        post /= post.sum(axis=1, keepdims=True)
+        for it in range(self.max_iter):
+            # M-step: class priors and confusion matrices (worker, true, observed)
+            prior = post.mean(axis=0) + 1e-9
+            conf = np.full((n_wrk, n_lab, n_lab), 1e-2)
+            cell = wrk * n_lab + lab
+            for k in range(n_lab):
+                conf[:, k, :] += np.bincount(cell, weights=post[img, k], minlength=n_wrk * n_lab).reshape(n_wrk, n_lab)
+            conf /= conf.sum(axis=2, keepdims=True)
+            # E-step: annotations are sorted by image, so sum per image with reduceat
+            log_lik = np.log(conf[wrk, :, lab])
+            log_post = np.log(prior)[None, :] + np.add.reduceat(log_lik, matrix.starts, axis=0)
+            log_post -= log_post.max(axis=1, keepdims=True)
+            new_post = np.exp(log_post)
+            new_post /= new_post.sum(axis=1, keepdims=True)
+            delta = np.abs(new_post - post).max()
+            post = new_post
+            if delta < self.tol:
+                break
+        logger.info(f'Dawid-Skene converged after {it + 1} iterations (delta {delta:.2e})')
+        return post
+
+    def decide_batch(self, matrix):
+        # only labels that actually got a vote on the image are candidates
+        post = self.posteriors(matrix) * (matrix.counts() > 0)
+        post /= post.sum(axis=1, keepdims=True)
+        return np.where(post.max(axis=1) >= self.threshold, post.argmax(axis=1), -1)
+
+
+STRATEGIES = {cls.name: cls for cls in (UnanimityConsensus, MajorityConsensus,
+                                        WeightedConsensus, DawidSkeneConsensus)}
+
+
+def get_strategy(name=None):
+    """Strategy instance by name, defaults to settings.CONSENSUS_STRATEGY (which must work per image)"""
+    if name is None:
+        name = getattr(settings, 'CONSENSUS_STRATEGY', 'unanimity')
+        if name in STRATEGIES and STRATEGIES[name].batch_only:
+            raise ImproperlyConfigured(f'CONSENSUS_STRATEGY {name!r} only runs in manage.py rescore_consensus')
+    if name not in STRATEGIES:
+        raise ValueError(f'Unknown consensus strategy: {name}')
+    return STRATEGIES[name]()
+
+
+def check_strategy_setting(app_configs, **kwargs):
+    """System check: CONSENSUS_STRATEGY must name a strategy that can close images on submit"""
+    name = getattr(settings, 'CONSENSUS_STRATEGY', 'unanimity')
+    live = sorted(n for n, cls in STRATEGIES.items() if not cls.batch_only)
+    if name not in STRATEGIES or STRATEGIES[name].batch_only:
+        return [checks.Error(f'CONSENSUS_STRATEGY {name!r} cannot decide images on submit',
+                             hint=f'Use one of: {", ".join(live)}; run batch strategies with rescore_consensus',
+                             id='api.E001')]
+    return []
+
+
+class VoteMatrix:
+    """All votes as parallel integer arrays, sorted by image.
+
+    Labels are indexed by name across label sets, so "Cat" is one column
+    whichever set of options it came from.
+    """
+
+    def __init__(self, ann_ids, image_ids, user_ids, codes, label_set_ids, correct):
+        self.ann_ids = np.asarray(ann_ids, dtype=np.int64)
+        self.image_ids, self.image = np.unique(np.asarray(image_ids, dtype=np.int64), return_inverse=True)
+        self.user_ids, self.worker = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+        self.labels, self.label = self._global_labels(np.asarray(codes, dtype=np.int64),
+                                                      np.asarray(label_set_ids, dtype=np.int64))
+        self.correct = np.asarray(correct, dtype=np.int8)  # -1 pending, 0 wrong, 1 correct
+        self.n_images, self.n_workers, self.n_labels = len(self.image_ids), len(self.user_ids), len(self.labels)
+        order = np.argsort(self.image, kind='stable')
+        for attr in ('ann_ids', 'image', 'worker', 'label', 'correct'):
+            setattr(self, attr, getattr(self, attr)[order])
+        self.starts = np.flatnonzero(np.r_[True, self.image[1:] != self.image[:-1]])
+
+    @staticmethod
+    def _global_labels(codes, label_set_ids):
+        """Map (label set, code) pairs to indexes into one sorted array of label names"""
+        set_ids, set_index = np.unique(label_set_ids, return_inverse=True)
+        label_sets = [LabelSet.cached(int(sid)) for sid in set_ids]
+        names = np.array(sorted({name for ls in label_sets for name in ls.labels}), dtype=object)
+        width = max((len(ls.labels) for ls in label_sets), default=0)
+        table = np.zeros((len(label_sets), width), dtype=np.int64)
+        for row, ls in enumerate(label_sets):
+            table[row, :len(ls.labels)] = np.searchsorted(names, np.array(ls.labels, dtype=object))
+        return names, table[set_index, codes] if len(codes) else codes
+
+    @classmethod
+    def load(cls, annotations, chunk_size=50000):
+        """Stream an Annotation queryset into arrays"""
+        cols = ([], [], [], [], [], [])
+        rows = annotations.values_list('id', 'image_id', 'user_id', 'label', 'image__label_set_id', 'is_correct')
+        for ann_id, image_id, user_id, code, label_set_id, is_correct in rows.iterator(chunk_size=chunk_size):
+            cols[0].append(ann_id)
+            cols[1].append(image_id)
+            cols[2].append(user_id)
+            cols[3].append(code)
+            cols[4].append(label_set_id)
+            cols[5].append(-1 if is_correct is None else int(is_correct))
+        return cls(*cols)
+
+    def counts(self, weights=None):
+        """(n_images x n_labels) vote counts, optionally weighted"""
+        flat = np.bincount(self.image * self.n_labels + self.label, weights=weights,
+                           minlength=self.n_images * self.n_labels)
+        return flat.reshape(self.n_images, self.n_labels).astype(float)
+
+    def worker_accuracy(self):
+        """Smoothed accuracy per worker from already judged votes"""
+        judged = self.correct >= 0
+        total = np.bincount(self.worker[judged], minlength=self.n_workers)
+        right = np.bincount(self.worker[judged], weights=self.correct[judged], minlength=self.n_workers)
+        return (right + 1) / (total + 2)
+
+
+def close_image(image, strategy=None):
+    """Complete a full image; set final_label if consensus is reached, else send to review.
+
+    Returns the agreed label code, or None.
+    """
+    strategy = strategy or get_strategy()
+    image.status = 'completed'
+    code = strategy.decide(image)
+    if code is not None:
+        image.review_status = 'reviewed'
+        image.final_label = image.label_options.label_of(code)
+        image.reviewed_at = timezone.now()
+        metrics.CONSENSUS.inc('auto_approved')
+        logger.info(f'Image {image.id} auto-approved with label: {image.final_label} ({strategy.name})')
+        return code
+    # conflict detected, need manual review
+    image.review_status = 'pending'
+    response_cache.invalidate('reviews')
+    metrics.CONSENSUS.inc('review')
+    logger.info(f'Image {image.id} requires manual review (conflict detected)')
+    return None
+
+
+def mark_votes(decisions, deltas=None):
+    """Set is_correct on every vote of the given images in one statement: {image_id: label code}.
+
+    deltas: other counter changes of the transaction ({user_id: {field: delta}}, e.g. the
+    submitter's total_count), applied with the verdicts in one stats.apply call.
+    """
+    if not decisions:
+        stats.apply(deltas or {})
+        return 0
+    votes = Annotation.objects.filter(image_id__in=list(decisions))
+    # previous verdicts, so user counters only move by what changed
+    rows = list(votes.values_list('user_id', 'image_id', 'label', 'is_correct',
+                                  'payment_id', 'image__bounty'))
+    verdict = models.Case(
+        *[models.When(image_id=image_id, label=code, then=models.Value(True))
+          for image_id, code in decisions.items()],
+        default=models.Value(False),
+    )
+    updated = votes.update(is_correct=verdict)
+    stats.apply(stats.merge(stats.verdict_deltas(rows, decisions), deltas or {}))
+    response_cache.invalidate('unpaid')
+    return updated
+
+
+def stamp_reviewed(image_ids, chunk_size=1000):
+    """Set reviewed_at as the last writes of a long transaction.
+
+    Exports page on reviewed_at and stop EXPORT_SETTLE_SECONDS short of now, so a review
+    must commit soon after its timestamp: each chunk takes the time right before its UPDATE.
+    """
+    start = time.perf_counter()
+    for i in range(0, len(image_ids), chunk_size):
+        Image.objects.filter(id__in=image_ids[i:i + chunk_size]).update(reviewed_at=timezone.now())
+    elapsed = time.perf_counter() - start
+    if elapsed > getattr(settings, 'EXPORT_SETTLE_SECONDS', 30) / 2:
+        logger.warning(f'Stamping {len(image_ids)} reviews took {elapsed:.1f}s; '
+                       f'raise EXPORT_SETTLE_SECONDS or incremental exports may skip them')
+
+
+def resolve_images(resolutions, chunk_size=None):
+    """Apply admin verdicts {image_id: (code, label)}: final labels, vote verdicts and counters.
+
+    Each chunk of images costs one UPDATE on Image plus the statements of mark_votes;
+    reviewed_at is stamped at the end (see stamp_reviewed).
+    """
+    chunk_size = chunk_size or getattr(settings, 'RESOLVE_CHUNK_SIZE', 500)
+    ids = sorted(resolutions)
+    for i in range(0, len(ids), chunk_size):
+        chunk = ids[i:i + chunk_size]
+        final_label = models.Case(
+            *[models.When(id=image_id, then=models.Value(resolutions[image_id][1])) for image_id in chunk],
+            output_field=models.CharField(),
+        )
+        Image.objects.filter(id__in=chunk).update(final_label=final_label, review_status='reviewed')
+        mark_votes({image_id: resolutions[image_id][0] for image_id in chunk})
+    stamp_reviewed(ids, chunk_size)
+    response_cache.invalidate('reviews')
+    return len(ids)
+
+
+def rescore(strategy=None, include_reviewed=False, chunk_size=1000, dry_run=False, progress=None):
+    """Re-score completed images over the whole vote matrix and write back final labels in bulk.
+
+    Returns a summary dict; progress(fraction, message) is called between steps.
+    """
+    strategy = get_strategy(strategy)
+    report = progress or (lambda fraction, message: None)
+    start = time.perf_counter()
+
+    # every completed vote helps estimate annotator quality
+    matrix = VoteMatrix.load(Annotation.objects.filter(image__status='completed'))
+    summary = {'strategy': strategy.name, 'images': matrix.n_images, 'votes': len(matrix.ann_ids),
+               'annotators': matrix.n_workers, 'in_scope': 0, 'resolved': 0, 'left_for_review': 0,
+               'written': 0, 'verdicts': 0}
+    if matrix.n_images == 0:
+        return summary
+    summary['load_seconds'] = round(time.perf_counter() - start, 3)
+    report(0.2, f'Loaded {matrix.n_images:,} images / {len(matrix.ann_ids):,} votes')
+
+    decided = strategy.decide_batch(matrix)
+    scored = time.perf_counter()
+    summary['score_seconds'] = round(scored - start - summary['load_seconds'], 3)
+    report(0.5, f'Scored with {strategy.name}')
+
+    # pick the images we are allowed to change
+    targets = Image.objects.filter(status='completed')
+    if not include_reviewed:
+        targets = targets.filter(review_status='pending')
+    target_ids = set(targets.values_list('id', flat=True))
+    if include_reviewed:
+        paid = Annotation.objects.filter(payment__isnull=False).values_list('image_id', flat=True).distinct()
+        target_ids -= set(paid)
+    in_scope = np.isin(matrix.image_ids, np.fromiter(target_ids, dtype=np.int64, count=len(target_ids)))
+    resolved = in_scope & (decided >= 0)
+    summary.update(in_scope=int(in_scope.sum()), resolved=int(resolved.sum()),
+                   left_for_review=int((in_scope & (decided < 0)).sum()))
+    if dry_run:
+        return summary
+
+    # per-vote verdict for resolved images
+    vote_resolved = resolved[matrix.image]
+    vote_correct = matrix.label == decided[matrix.image]
+    right_ids = matrix.ann_ids[vote_resolved & vote_correct].tolist()
+    wrong_ids = matrix.ann_ids[vote_resolved & ~vote_correct].tolist()
+    image_ids = matrix.image_ids[resolved].tolist()
+    labels = matrix.labels[decided[resolved]].tolist()
+
+    report(0.6, f'Writing {len(image_ids):,} final labels')
+    with transaction.atomic():
+        for i in range(0, len(image_ids), chunk_size):
+            Image.objects.bulk_update(
+                [Image(id=image_id, final_label=label, review_status='reviewed')
+                 for image_id, label in zip(image_ids[i:i + chunk_size], labels[i:i + chunk_size])],
+                ['final_label', 'review_status']
+            )
+        for ids, verdict in ((right_ids, True), (wrong_ids, False)):
+            for i in range(0, len(ids), chunk_size):
+                Annotation.objects.filter(id__in=ids[i:i + chunk_size]).update(is_correct=verdict)
+        # counters of everyone who voted on a re-scored image
+        stats.rebuild(matrix.user_ids[np.unique(matrix.worker[vote_resolved])].tolist())
+        stamp_reviewed(image_ids, chunk_size)
+        response_cache.invalidate('reviews', 'unpaid')
+    summary.update(written=len(image_ids), verdicts=len(right_ids) + len(wrong_ids),
+                   write_seconds=round(time.perf_counter() - scored, 3))
+    logger.info(f'Re-scored consensus with {strategy.name}: {summary["written"]} final labels written')
+    return summary
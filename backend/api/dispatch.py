@@ -0,0 +1,372 @@
+"""
+Task dispatch engine
+Keeps active images in ready-queues bucketed by assigned_count and, per
+recently active user, the set of active images they annotated, so picking
+the next task costs the same no matter how long the user's history or the
+image table is. Idle users are evicted (TASK_DISPATCH_SEEN_USERS, LRU) and
+one thread at a time reloads the queues while the others keep picking from
+the current ones.
+
+Each open slot of an image is handed out as a time-limited lease, so
+concurrent annotators are spread over different images instead of all
+racing for the same one. Expired leases go back into the pool. Leases live
+in this process only, so they steer what each worker hands out but do not
+gate submits: those are judged by the database count alone.
+
+TASK_DISPATCH_MODE decides the order within the fullest buckets: 'fullest'
+hands out images in queue order, so up to five writers share one hot row;
+'random' picks among the first TASK_DISPATCH_TOP_K eligible images; 'shard'
+starts each user in their own image_id % TASK_DISPATCH_SHARDS slice of a bucket
+(each bucket also keeps its images split by slice, so this is no extra scan).
+
+Picking is in-memory but takes a threading lock that sync views also hold,
+so async views run it in a worker thread rather than block the event loop.
+"""
+import random
+import threading
+import time
+import logging
+from collections import OrderedDict
+from itertools import islice
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.db.models import Exists, OuterRef
+from .models import Image, Annotation, ANNOTATIONS_PER_IMAGE
+
+logger = logging.getLogger(__name__)
+
+
+class TaskDispatcher:
+    """In-process ready-queues of active images, one bucket per assigned_count"""
+
+    def __init__(self, refresh_seconds=None, lease_seconds=None):
+        self.refresh_seconds = refresh_seconds
+        self.lease_seconds = lease_seconds
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()  # one reload at a time
+        self._buckets = [dict() for _ in range(ANNOTATIONS_PER_IMAGE)]  # ordered sets
+        self._shards = self._shard_count()
+        self._slices = self._empty_slices(self._shards)  # bucket -> image_id % shards -> ordered set
+        self._counts = {}  # image_id -> assigned_count
+        self._seen = OrderedDict()  # user_id -> set of active image ids they annotated, least recent first
+        self._leases = {}  # image_id -> {user_id: expires_at}
+        self._held = {}    # user_id -> {image_id: expires_at}
+        self._loaded_at = None
+
+    def _refresh_interval(self):
+        if self.refresh_seconds is not None:
+            return self.refresh_seconds
+        return getattr(settings, 'TASK_DISPATCH_REFRESH_SECONDS', 30)
+
+    def _lease_ttl(self):
+        if self.lease_seconds is not None:
+            return self.lease_seconds
+        return getattr(settings, 'TASK_LEASE_SECONDS', 300)
+
+    def _leasing(self):
+        return getattr(settings, 'TASK_LEASES_ENABLED', True)
+
+    @staticmethod
+    def _shard_count():
+        return max(getattr(settings, 'TASK_DISPATCH_SHARDS', 16), 1)
+
+    @staticmethod
+    def _empty_slices(shards):
+        return [[dict() for _ in range(shards)] for _ in range(ANNOTATIONS_PER_IMAGE)]
+
+    def _mode(self):
+        mode = getattr(settings, 'TASK_DISPATCH_MODE', 'fullest')
+        if mode not in DISPATCH_MODES:
+            raise ValueError(f'TASK_DISPATCH_MODE must be one of: {", ".join(DISPATCH_MODES)}')
+        return mode
+
+    def load(self):
+        """Rebuild the ready-queues from the database"""
+        buckets = [dict() for _ in range(ANNOTATIONS_PER_IMAGE)]
+        shards = self._shard_count()
+        slices = self._empty_slices(shards)
+        counts = {}
+        rows = Image.objects.filter(status='active', assigned_count__lt=ANNOTATIONS_PER_IMAGE)\
+            .order_by('id').values_list('id', 'assigned_count')
+        for image_id, count in rows.iterator(chunk_size=10000):
+            buckets[count][image_id] = None
+            slices[count][image_id % shards][image_id] = None
+            counts[image_id] = count
+        with self._lock:
+            self._buckets = buckets
+            self._shards = shards
+            self._slices = slices
+            self._counts = counts
+            self._loaded_at = time.monotonic()
+            self._sweep_leases()
+        logger.info(f'Task dispatcher loaded {len(counts)} active images')
+
+    def reset(self):
+        """Drop all in-memory state, including seen sets and leases"""
+        with self._lock:
+            self._buckets = [dict() for _ in range(ANNOTATIONS_PER_IMAGE)]
+            self._shards = self._shard_count()
+            self._slices = self._empty_slices(self._shards)
+            self._counts = {}
+            self._seen = OrderedDict()
+            self._leases = {}
+            self._held = {}
+            self._loaded_at = None
+
+    def invalidate(self):
+        """Force a rebuild on the next dispatch"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _stale(self):
+        loaded_at = self._loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at > self._refresh_interval()
+
+    def _ensure_loaded(self):
+        if not self._stale():
+            return
+        # before the first load everyone waits for it; later, whoever loses the race keeps the current queues
+        if not self._load_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if self._stale():
+                self.load()
+        finally:
+            self._load_lock.release()
+
+    def _seen_for(self, user_id):
+        seen = self._seen.get(user_id)
+        if seen is None:
+            # images leave the pool for good, so only votes on active ones matter
+            ids = Annotation.objects.filter(user_id=user_id, image__status='active').values_list('image_id', flat=True)
+            seen = set(ids.iterator(chunk_size=10000))
+            with self._lock:
+                seen = self._seen.setdefault(user_id, seen)
+                while len(self._seen) > getattr(settings, 'TASK_DISPATCH_SEEN_USERS', 10000):
+                    self._seen.popitem(last=False)
+        return seen
+
+    def _place(self, image_id, count):
+        old = self._counts.pop(image_id, None)
+        shard = image_id % self._shards
+        if old is not None:
+            self._buckets[old].pop(image_id, None)
+            self._slices[old][shard].pop(image_id, None)
+        if count is not None and count < ANNOTATIONS_PER_IMAGE:
+            self._buckets[count][image_id] = None
+            self._slices[count][shard][image_id] = None
+            self._counts[image_id] = count
+        else:
+            # image left the pool, its leases are void
+            for uid in self._leases.pop(image_id, {}):
+                held = self._held.get(uid)
+                if held:
+                    held.pop(image_id, None)
+
+    # ===== Leases =====
+
+    def _active_leases(self, image_id, now):
+        """Drop expired leases of an image and return the live ones"""
+        leases = self._leases.get(image_id)
+        if not leases:
+            return {}
+        for uid in [uid for uid, exp in leases.items() if exp <= now]:
+            del leases[uid]
+            held = self._held.get(uid)
+            if held:
+                held.pop(image_id, None)
+        if not leases:
+            del self._leases[image_id]
+        return leases
+
+    def _sweep_leases(self):
+        now = time.monotonic()
+        for image_id in list(self._leases):
+            self._active_leases(image_id, now)
+        for uid in [uid for uid, held in self._held.items() if not held]:
+            del self._held[uid]
+
+    def _free_slots(self, image_id, user_id, now):
+        """Open slots of an image not leased to someone else"""
+        leases = self._active_leases(image_id, now)
+        taken = len(leases) - (1 if user_id in leases else 0)
+        return ANNOTATIONS_PER_IMAGE - self._counts.get(image_id, ANNOTATIONS_PER_IMAGE) - taken
+
+    def _grant(self, user_id, image_id, now):
+        expires_at = now + self._lease_ttl()
+        self._leases.setdefault(image_id, {})[user_id] = expires_at
+        self._held.setdefault(user_id, {})[image_id] = expires_at
+
+    def release(self, user_id, image_id):
+        """Give a leased slot back to the pool"""
+        with self._lock:
+            leases = self._leases.get(image_id)
+            if leases:
+                leases.pop(user_id, None)
+                if not leases:
+                    del self._leases[image_id]
+            held = self._held.get(user_id)
+            if held:
+                held.pop(image_id, None)
+
+    # ===== Dispatch =====
+
+    def pick(self, user_id, n=1):
+        """Lease slots on up to n of the fullest images the user has not annotated, return their ids"""
+        self._ensure_loaded()
+        return self._pick(user_id, n, self._seen_for(user_id))
+
+    def _pick(self, user_id, n, seen):
+        leasing = self._leasing()
+        mode = self._mode()
+        now = time.monotonic()
+        picked = []
+        with self._lock:
+            if user_id in self._seen:
+                self._seen.move_to_end(user_id)
+            # hand back slots the user already holds (e.g. page reload)
+            for image_id, expires_at in list(self._held.get(user_id, {}).items()):
+                if len(picked) >= n:
+                    return picked
+                if expires_at > now and image_id in self._counts and image_id not in seen:
+                    self._grant(user_id, image_id, now)
+                    picked.append(image_id)
+            wanted = n - len(picked)
+            if wanted <= 0:
+                return picked
+            eligible = (i for i in self._eligible(user_id, seen, leasing, mode, now) if i not in picked)
+            if mode == 'random':
+                candidates = list(islice(eligible, max(getattr(settings, 'TASK_DISPATCH_TOP_K', 32), wanted)))
+                chosen = random.sample(candidates, min(wanted, len(candidates)))
+            else:
+                chosen = list(islice(eligible, wanted))
+            for image_id in chosen:
+                if leasing:
+                    self._grant(user_id, image_id, now)
+                picked.append(image_id)
+        return picked
+
+    def _eligible(self, user_id, seen, leasing, mode, now):
+        """Images the user may take, fullest bucket first (caller holds the lock)"""
+        shards = self._shards
+        shard = user_id % shards
+        for count in reversed(range(ANNOTATIONS_PER_IMAGE)):
+            if mode == 'shard':
+                # the user's own slice first, then the next slices in turn, so users also differ once theirs runs dry
+                slices = self._slices[count]
+                order = (i for k in range(shards) for i in slices[(shard + k) % shards])
+            else:
+                order = self._buckets[count]
+            for image_id in order:
+                if image_id in seen:
+                    continue
+                if leasing and self._free_slots(image_id, user_id, now) <= 0:
+                    continue
+                yield image_id
+
+    @staticmethod
+    def _unclaimed(image_ids, tasks, n):
+        return [i for i in image_ids if i not in {t.id for t in tasks}][:n - len(tasks)]
+
+    @staticmethod
+    def _candidates(user_id, image_ids):
+        # other processes may have changed the rows since we loaded them
+        return Image.objects.filter(id__in=image_ids).annotate(
+            done=Exists(Annotation.objects.filter(user_id=user_id, image_id=OuterRef('pk')))
+        )
+
+    def _confirm(self, user_id, image_ids, images, tasks):
+        """Append the picked images that are still open to tasks, requeue or drop the rest"""
+        for image_id in image_ids:
+            image = images.get(image_id)
+            if image is None:
+                self.discard(image_id)
+            elif image.done:
+                self.release(user_id, image_id)
+                self.mark_seen(user_id, image_id)
+            elif image.status != 'active' or image.assigned_count >= ANNOTATIONS_PER_IMAGE:
+                self.discard(image_id)
+            else:
+                with self._lock:
+                    if self._counts.get(image_id) != image.assigned_count:
+                        # stale bucket, requeue and pick again
+                        self.release(user_id, image_id)
+                        self._place(image_id, image.assigned_count)
+                        continue
+                tasks.append(image)
+
+    def next_tasks(self, user_id, n=1):
+        """Pick up to n tasks and confirm them against the database in one query"""
+        tasks = []
+        while len(tasks) < n:
+            image_ids = self._unclaimed(self.pick(user_id, n), tasks, n)
+            if not image_ids:
+                break
+            self._confirm(user_id, image_ids, self._candidates(user_id, image_ids).in_bulk(), tasks)
+        return tasks
+
+    def next_task(self, user_id):
+        """Pick the next task, or None"""
+        tasks = self.next_tasks(user_id, 1)
+        return tasks[0] if tasks else None
+
+    def _warm(self, user_id):
+        self._ensure_loaded()
+        return self._seen_for(user_id)
+
+    async def anext_tasks(self, user_id, n=1):
+        """next_tasks for async views"""
+        seen = self._seen.get(user_id)
+        if seen is None or self._stale():
+            seen = await sync_to_async(self._warm)(user_id)
+        # the lock is shared with sync views; no database access, so any executor thread will do
+        pick = sync_to_async(self._pick, thread_sensitive=False)
+        confirm = sync_to_async(self._confirm, thread_sensitive=False)
+        tasks = []
+        while len(tasks) < n:
+            image_ids = self._unclaimed(await pick(user_id, n, seen), tasks, n)
+            if not image_ids:
+                break
+            await confirm(user_id, image_ids, await self._candidates(user_id, image_ids).ain_bulk(), tasks)
+        return tasks
+
+    async def anext_task(self, user_id):
+        tasks = await self.anext_tasks(user_id, 1)
+        return tasks[0] if tasks else None
+
+    def lease_expiry(self):
+        """Wall-clock expiry for a lease granted now"""
+        return timezone.now() + timedelta(seconds=self._lease_ttl())
+
+    def mark_seen(self, user_id, image_id):
+        with self._lock:
+            seen = self._seen.get(user_id)
+            if seen is not None:
+                seen.add(image_id)
+
+    def record_annotation(self, user_id, image_id, assigned_count):
+        """Move the image to its new bucket after a vote and free the user's lease"""
+        with self._lock:
+            self.release(user_id, image_id)
+            seen = self._seen.get(user_id)
+            if seen is not None:
+                seen.add(image_id)
+            if self._loaded_at is not None:
+                self._place(image_id, assigned_count)
+
+    def add_image(self, image_id):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._place(image_id, 0)
+
+    def discard(self, image_id):
+        with self._lock:
+            self._place(image_id, None)
+
+
+DISPATCH_MODES = ('fullest', 'random', 'shard')
+
+# shared instance used by the views
+dispatcher = TaskDispatcher()
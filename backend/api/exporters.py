@@ -0,0 +1,246 @@
+"""
+Label export
+Streams reviewed images with their final labels, or every raw vote on them,
+as JSONL, CSV or Parquet (when pyarrow is installed). Images are read in
+keyset chunks on (reviewed_at, id), so memory stays flat at any table size,
+and every export covers the window (since, until] so the next one can start
+exactly at this one's watermark.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import re
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Image, Annotation, LabelSet
+from .pagination import keyset_page
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet output is optional
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('jsonl', 'csv', 'parquet')
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+LABEL_COLUMNS = ('image_id', 'image_url', 'categories', 'final_label', 'votes', 'agreement',
+                 'created_at', 'reviewed_at')
+VOTE_COLUMNS = ('annotation_id', 'image_id', 'user_id', 'label', 'is_correct', 'final_label',
+                'created_at', 'reviewed_at')
+EXPORT_ORDERING = ('reviewed_at', 'id')
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != 'parquet' or pyarrow is not None]
+
+
+def guess_format(filename, default='jsonl'):
+    name = (filename or '').lower()
+    for fmt, suffixes in (('csv', ('.csv',)), ('parquet', ('.parquet', '.pq')), ('jsonl', ('.jsonl', '.ndjson'))):
+        if name.endswith(suffixes):
+            return fmt
+    return default
+
+
+def parse_time(value, name='time'):
+    """Aware datetime from an ISO 8601 string (UTC if no offset); raises ValueError"""
+    if value in (None, ''):
+        return None
+    # an unencoded '+00:00' in a query string arrives as ' 00:00'
+    parsed = parse_datetime(re.sub(r' (\d\d:?\d\d)$', r'+\1', str(value).strip()))
+    if parsed is None:
+        raise ValueError(f'Invalid {name}: use ISO 8601, like 2026-01-31T00:00:00Z')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def export_window(since=None, until=None):
+    """(since, until] to export; until stops short of reviews whose transactions may still be committing"""
+    settle = getattr(settings, 'EXPORT_SETTLE_SECONDS', 30)
+    latest = timezone.now() - timedelta(seconds=settle)
+    until = min(until, latest) if until else latest
+    if since and since >= until:
+        raise ValueError('since must be earlier than until')
+    return since, until
+
+
+def _label_rows(images):
+    rows = []
+    for img in images:
+        total = sum(img['vote_counts'])
+        rows.append((
+            img['id'], img['image_url'], LabelSet.cached(img['label_set_id']).options, img['final_label'],
+            total, round(max(img['vote_counts']) / total, 4) if total else None,
+            img['created_at'], img['reviewed_at'],
+        ))
+    return rows
+
+
+def _vote_rows(images):
+    """One row per annotation of a chunk of images, in one query"""
+    by_id = {img['id']: img for img in images}
+    votes = Annotation.objects.filter(image_id__in=by_id).order_by('image_id', 'id')\
+        .values_list('id', 'image_id', 'user_id', 'label', 'is_correct', 'created_at')
+    rows = []
+    for ann_id, image_id, user_id, code, is_correct, created_at in votes:
+        img = by_id[image_id]
+        rows.append((
+            ann_id, image_id, user_id, LabelSet.cached(img['label_set_id']).label_of(code), is_correct,
+            img['final_label'], created_at, img['reviewed_at'],
+        ))
+    return rows
+
+
+def reviewed_images(since, until):
+    """Images whose review falls in (since, until]"""
+    images = Image.objects.filter(review_status='reviewed', reviewed_at__lte=until)
+    if since:
+        images = images.filter(reviewed_at__gt=since)
+    return images
+
+
+def iter_chunks(since, until, votes=False, chunk_size=5000):
+    """Yield (image count, row tuples) per chunk of reviewed images, oldest review first"""
+    images = reviewed_images(since, until).values('id', 'image_url', 'label_set_id', 'final_label', 'vote_counts',
+                           'created_at', 'reviewed_at')
+    cursor = None
+    while True:
+        page, cursor = keyset_page(images, EXPORT_ORDERING, cursor, chunk_size)
+        if page:
+            yield len(page), (_vote_rows(page) if votes else _label_rows(page))
+        if not cursor:
+            return
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _write_jsonl(chunks, columns):
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, map(_iso, row)))) + '\n' for row in rows).encode()
+
+
+def _write_csv(chunks, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows([_iso(v) if v is not None else '' for v in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ByteSink:
+    """Write-only file object that hands back what was written since the last take()"""
+
+    def __init__(self):
+        self.parts, self.position, self.closed = [], 0, False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def _parquet_schema(columns):
+    timestamp = pyarrow.timestamp('us', tz='UTC')
+    types = {
+        'image_id': pyarrow.int64(), 'annotation_id': pyarrow.int64(), 'user_id': pyarrow.int64(),
+        'image_url': pyarrow.string(), 'categories': pyarrow.string(), 'final_label': pyarrow.string(),
+        'label': pyarrow.string(), 'votes': pyarrow.int32(), 'agreement': pyarrow.float64(),
+        'is_correct': pyarrow.bool_(), 'created_at': timestamp, 'reviewed_at': timestamp,
+    }
+    return pyarrow.schema([(name, types[name]) for name in columns])
+
+
+def _write_parquet(chunks, columns):
+    """One row group per chunk; bytes are yielded as soon as each group is written"""
+    schema = _parquet_schema(columns)
+    sink = _ByteSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for rows in chunks:
+            values = list(zip(*rows))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(values, schema)], schema=schema
+            ))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+WRITERS = {'jsonl': _write_jsonl, 'csv': _write_csv, 'parquet': _write_parquet}
+
+
+def export_labels(fmt, since=None, until=None, votes=False, chunk_size=5000, progress=None):
+    """Return (iterator of byte chunks, watermark); rows are only read while the iterator is consumed.
+
+    The watermark is the end of the exported window: pass it as since next time.
+    """
+    if fmt not in available_formats():
+        hint = ' (install pyarrow)' if fmt == 'parquet' else ''
+        raise ValueError(f'format must be one of: {", ".join(available_formats())}{hint}')
+    since, until = export_window(since, until)
+    report = {'images': 0, 'rows': 0}
+
+    def rows():
+        for images, chunk in iter_chunks(since, until, votes, chunk_size):
+            report['images'] += images
+            report['rows'] += len(chunk)
+            if progress:
+                progress(report)
+            if chunk:
+                yield chunk
+        logger.info(f'Exported {report["images"]} images / {report["rows"]} rows as {fmt} up to {until.isoformat()}')
+
+    columns = VOTE_COLUMNS if votes else LABEL_COLUMNS
+    return WRITERS[fmt](rows(), columns), until
+
+
+def write_file(chunks, path):
+    """Write byte chunks to path and return its size.
+
+    Goes through a temp file and a rename, so a failed export never leaves a truncated file behind.
+    """
+    partial = f'{path}.partial'
+    size = 0
+    try:
+        with open(partial, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, path)
+    return size
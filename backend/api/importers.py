@@ -0,0 +1,110 @@
+"""
+Bulk task ingestion
+Streams CSV / JSONL rows (url, categories, bounty), validates them the same
+way add_task does and inserts Images with chunked bulk_create.
+"""
+import csv
+import io
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from .models import Image, LabelSet
+from .dispatch import dispatcher
+from . import blobstore
+from . import caching as response_cache
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+MAX_REPORTED_ERRORS = 1000
+
+
+def validate_task(url, categories, bounty, has_upload=False):
+    """Return cleaned (url, categories, bounty); raise ValueError with the API error message"""
+    if not (url or has_upload) or not categories:
+        raise ValueError('url and categories are required')
+    if not has_upload and (not isinstance(url, str) or len(url.strip()) == 0):
+        raise ValueError('Invalid url')
+    if not isinstance(categories, str) or len(categories.strip()) == 0:
+        raise ValueError('Invalid categories')
+    categories = ','.join(LabelSet.parse(categories))
+    try:
+        bounty = Decimal(str(bounty)) if bounty is not None else Decimal('0.50')
+    except (ValueError, InvalidOperation, TypeError):
+        raise ValueError('Invalid bounty value')
+    if bounty < 0:
+        raise ValueError('Bounty must be non-negative')
+    if bounty > 1000:
+        raise ValueError('Bounty too large (max 1000)')
+    return (url.strip() if isinstance(url, str) else url), categories, bounty
+
+
+def guess_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def iter_rows(stream, fmt):
+    """Yield (line_no, dict) from a binary or text stream; bad JSON lines yield the error instead"""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format: {fmt}')
+    text = stream if isinstance(stream, io.TextIOBase) else io.TextIOWrapper(stream, encoding='utf-8-sig')
+    if fmt == 'csv':
+        for row in csv.DictReader(text):
+            yield row, None
+        return
+    for line_no, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield None, f'line {line_no}: invalid JSON'
+            continue
+        yield (row, None) if isinstance(row, dict) else (None, f'line {line_no}: expected an object')
+
+
+def import_tasks(rows, chunk_size=5000, progress=None):
+    """Insert valid rows in chunks (one transaction each); return counts and per-row errors"""
+    report = {'rows': 0, 'created': 0, 'failed': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            Image.objects.bulk_create(batch, batch_size=chunk_size)
+        report['created'] += len(batch)
+        batch.clear()
+        if progress:
+            progress(report)
+
+    for row, parse_error in rows:
+        report['rows'] += 1
+        try:
+            if parse_error:
+                raise ValueError(parse_error)
+            bounty = row.get('bounty')
+            url, categories, bounty = validate_task(row.get('url'), row.get('categories'),
+                                                    None if bounty in ('', None) else bounty)
+            batch.append(Image(image_url=blobstore.to_reference(url), label_set=LabelSet.intern(categories), bounty=bounty))
+        except ValueError as e:
+            report['failed'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'row': report['rows'], 'error': str(e)})
+            continue
+        if len(batch) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+
+    if report['created']:
+        # ids are not returned by bulk_create on MySQL, so rebuild the ready-queues
+        dispatcher.invalidate()
+        response_cache.invalidate('active')
+    logger.info(f"Imported {report['created']} tasks ({report['failed']} rejected)")
+    return report
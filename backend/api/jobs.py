@@ -0,0 +1,299 @@
+"""
+Background jobs
+Payroll, consensus re-scoring and label exports run as Job rows in the main
+database, so no broker is needed. A pool of worker threads claims the oldest
+queued job (FOR UPDATE SKIP LOCKED where the backend has it, plus a
+conditional UPDATE so two workers never both win), runs it and records
+progress on the row. The pool runs on its own with `python manage.py run_jobs`
+or, when JOB_WORKERS_IN_PROCESS is set, inside each web process; any number
+of either can share one queue. A running job whose worker stops beating is requeued.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+from .consensus import STRATEGIES, rescore
+from . import exporters, payroll, metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _flag(params, name):
+    value = params.get(name, False)
+    if not isinstance(value, bool):
+        raise ValueError(f'{name} must be true or false')
+    return value
+
+
+class JobKind:
+    """Base class: validates the params of one kind of job and runs it"""
+    name = None
+
+    def clean(self, params):
+        """Validated params to store on the job; raises ValueError"""
+        return {}
+
+    def run(self, job, progress):
+        """Do the work, calling progress(fraction, message) now and then; return a JSON-able result"""
+        raise NotImplementedError
+
+
+class PayrollJob(JobKind):
+    name = 'payroll'
+
+    def clean(self, params):
+        chunk_size = params.get('chunk_size')
+        if chunk_size is None:
+            return {}
+        if not isinstance(chunk_size, int) or isinstance(chunk_size, bool) or chunk_size < 0:
+            raise ValueError('chunk_size must be a non-negative integer')
+        return {'chunk_size': chunk_size}
+
+    def run(self, job, progress):
+        total, users = payroll.run_payroll(job.params.get('chunk_size'), progress=progress)
+        return {'total': round(float(total), 2), 'users': users}
+
+
+class RescoreJob(JobKind):
+    name = 'rescore'
+
+    def clean(self, params):
+        strategy = params.get('strategy', 'dawid-skene')
+        if strategy not in STRATEGIES:
+            raise ValueError(f'strategy must be one of: {", ".join(sorted(STRATEGIES))}')
+        return {'strategy': strategy, 'include_reviewed': _flag(params, 'include_reviewed'),
+                'dry_run': _flag(params, 'dry_run')}
+
+    def run(self, job, progress):
+        return rescore(job.params['strategy'], include_reviewed=job.params['include_reviewed'],
+                       dry_run=job.params['dry_run'], progress=progress)
+
+
+class ExportJob(JobKind):
+    """Writes the export to EXPORT_ROOT; fetch it from GET /api/admin/jobs/<id>/download/"""
+    name = 'export'
+
+    def clean(self, params):
+        fmt = params.get('format', 'jsonl')
+        if fmt not in exporters.available_formats():
+            raise ValueError(f'format must be one of: {", ".join(exporters.available_formats())}')
+        cleaned = {'format': fmt, 'votes': _flag(params, 'votes')}
+        for name in ('since', 'until'):
+            value = exporters.parse_time(params.get(name), name)
+            if value:
+                cleaned[name] = value.isoformat()
+        return cleaned
+
+    def run(self, job, progress):
+        params = job.params
+        since, until = exporters.export_window(exporters.parse_time(params.get('since'), 'since'),
+                                               exporters.parse_time(params.get('until'), 'until'))
+        total = exporters.reviewed_images(since, until).count()
+        counts = {'images': 0, 'rows': 0}
+
+        def report(done):
+            counts.update(done)
+            progress(done['images'] / total if total else 1, f"{done['images']:,} images, {done['rows']:,} rows")
+
+        chunks, watermark = exporters.export_labels(params['format'], since, until, votes=params['votes'],
+                                                    progress=report)
+        kind = 'votes' if params['votes'] else 'labels'
+        name = f"{kind}-{job.id}-{watermark:%Y%m%dT%H%M%SZ}.{params['format']}"
+        root = Path(settings.EXPORT_ROOT)
+        root.mkdir(parents=True, exist_ok=True)
+        size = exporters.write_file(chunks, root / name)
+        return {'file': name, 'bytes': size, 'format': params['format'], 'images': counts['images'],
+                'rows': counts['rows'], 'since': since.isoformat() if since else None,
+                'watermark': watermark.isoformat()}
+
+
+KINDS = {cls.name: cls() for cls in (PayrollJob, RescoreJob, ExportJob)}
+
+
+def export_path(job):
+    """File written by a finished export job, or None"""
+    if job.kind != 'export' or job.status != 'succeeded' or not job.result:
+        return None
+    path = Path(settings.EXPORT_ROOT) / job.result['file']
+    return path if path.exists() else None
+
+
+def enqueue(kind, params=None, user=None):
+    """Validate params and queue a job; raises ValueError for an unknown kind or bad params"""
+    if kind not in KINDS:
+        raise ValueError(f'kind must be one of: {", ".join(KINDS)}')
+    if not isinstance(params or {}, dict):
+        raise ValueError('params must be an object')
+    job = Job.objects.create(kind=kind, params=KINDS[kind].clean(params or {}), created_by=user)
+    logger.info(f'Job {job.id} ({kind}) queued')
+    if _pool is not None:
+        transaction.on_commit(_pool.wake)
+    return job
+
+
+def claim(worker):
+    """Mark the oldest queued job as running on worker and return it, or None if the queue is empty"""
+    queued = Job.objects.filter(status='queued')
+    while queued.exists():  # plain read first: on SQLite the transaction below takes the write lock
+        with transaction.atomic():
+            candidates = queued.order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            job = candidates.first()
+            if job is None:
+                return None
+            now = timezone.now()
+            won = Job.objects.filter(id=job.id, status='queued').update(
+                status='running', worker=worker, attempts=F('attempts') + 1, progress=0, message='',
+                started_at=now, heartbeat_at=now,
+            )
+        if won:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def requeue_stale():
+    """Requeue running jobs whose worker stopped beating; fail them after JOB_MAX_ATTEMPTS"""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_STALE_SECONDS', 300))
+    stale = Job.objects.filter(status='running', heartbeat_at__lt=cutoff)
+    requeued = stale.filter(attempts__lt=getattr(settings, 'JOB_MAX_ATTEMPTS', 3))\
+        .update(status='queued', worker='', message='Requeued: worker stopped responding')
+    failed = stale.update(status='failed', error='Worker stopped responding', finished_at=timezone.now())
+    if requeued or failed:
+        logger.warning(f'Stale jobs: {requeued} requeued, {failed} failed')
+    return requeued + failed
+
+
+def _reporter(job):
+    """progress(fraction, message) that writes to the job row at most once per JOB_PROGRESS_SECONDS"""
+    interval = getattr(settings, 'JOB_PROGRESS_SECONDS', 1)
+    last = [0.0]
+
+    def progress(fraction, message=''):
+        now = time.monotonic()
+        # inside the job's own transaction the row would stay locked (and invisible) until commit
+        if now - last[0] < interval or connection.in_atomic_block:
+            return
+        last[0] = now
+        Job.objects.filter(id=job.id, attempts=job.attempts).update(
+            progress=min(max(fraction, 0), 1), message=message[:255], heartbeat_at=timezone.now()
+        )
+    return progress
+
+
+def run(job):
+    """Run a claimed job and record its outcome; failures are stored on the job, not raised"""
+    start = time.perf_counter()
+    logger.info(f'Job {job.id} ({job.kind}) started on {job.worker}, attempt {job.attempts}')
+    # a job that was requeued meanwhile belongs to its new attempt
+    mine = Job.objects.filter(id=job.id, attempts=job.attempts)
+    try:
+        result = KINDS[job.kind].run(job, _reporter(job))
+    except Exception as e:
+        logger.exception(f'Job {job.id} ({job.kind}) failed')
+        mine.update(status='failed', error=f'{type(e).__name__}: {e}', finished_at=timezone.now())
+        metrics.JOBS.inc(job.kind, 'failed')
+        return False
+    elapsed = time.perf_counter() - start
+    mine.update(status='succeeded', progress=1, message=f'Done in {elapsed:.1f}s', result=result,
+                finished_at=timezone.now())
+    metrics.JOBS.inc(job.kind, 'succeeded')
+    metrics.JOB_SECONDS.observe(elapsed, job.kind)
+    logger.info(f'Job {job.id} ({job.kind}) succeeded in {elapsed:.1f}s')
+    return True
+
+
+class WorkerPool:
+    """Worker threads that claim and run queued jobs, plus one thread beating for the running ones"""
+
+    def __init__(self, threads=None, poll_seconds=None):
+        self.threads = threads or getattr(settings, 'JOB_WORKERS', 2)
+        self.poll_seconds = poll_seconds or getattr(settings, 'JOB_POLL_SECONDS', 2)
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.running = set()  # ids of jobs being run by this pool
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+
+    def start(self):
+        for i in range(self.threads):
+            worker = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        threading.Thread(target=self._beat, name='job-heartbeat', daemon=True).start()
+        logger.info(f'Job worker pool {self.name} started with {self.threads} threads')
+        return self
+
+    def stop(self, timeout=None):
+        """Stop claiming jobs and wait for the running ones to finish"""
+        self._stop.set()
+        self._wake.set()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def wake(self):
+        self._wake.set()
+
+    def run_next(self):
+        """Claim and run one job in the calling thread; False if the queue was empty"""
+        job = claim(self.name)
+        if job is None:
+            return False
+        with self._lock:
+            self.running.add(job.id)
+        try:
+            run(job)
+        finally:
+            with self._lock:
+                self.running.discard(job.id)
+        return True
+
+    def _work(self):
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                busy = self.run_next()
+            except Exception:
+                logger.exception('Job worker could not claim a job')
+                busy = False
+            if not busy:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+        connection.close()
+
+    def _beat(self):
+        interval = getattr(settings, 'JOB_HEARTBEAT_SECONDS', 30)
+        while not self._stop.wait(interval):
+            close_old_connections()
+            try:
+                with self._lock:
+                    running = list(self.running)
+                if running:
+                    Job.objects.filter(id__in=running, status='running').update(heartbeat_at=timezone.now())
+                requeue_stale()
+            except Exception:
+                logger.exception('Job heartbeat failed')
+        connection.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def start_workers(threads=None):
+    """Start this process's worker pool once; returns it"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(threads).start()
+    return _pool
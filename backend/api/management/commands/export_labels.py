@@ -0,0 +1,67 @@
+"""
+Stream reviewed labels (or every vote) to a file or stdout
+Run: python manage.py export_labels labels.jsonl [--votes] [--since 2026-01-01T00:00:00Z] [--until ...]
+     python manage.py export_labels labels.parquet --watermark-file export.watermark   (incremental)
+"""
+import os
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api import exporters
+
+
+class Command(BaseCommand):
+    help = 'Export reviewed images with final labels, or every raw vote, as JSONL, CSV or Parquet (- for stdout)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-')
+        parser.add_argument('--format', choices=exporters.FORMATS)
+        parser.add_argument('--votes', action='store_true', help='one row per annotation instead of per image')
+        parser.add_argument('--since', help='only reviews after this time (ISO 8601)')
+        parser.add_argument('--until', help='only reviews up to this time (default: now)')
+        parser.add_argument('--watermark-file',
+                            help='read --since from this file and store the end of the export in it afterwards')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        output = opts['output']
+        fmt = opts['format'] or exporters.guess_format(output)
+        # with data on stdout, progress goes to stderr
+        log = self.stderr if output == '-' else self.stdout
+        watermark_file = opts['watermark_file']
+        since = opts['since']
+        if since is None and watermark_file and os.path.exists(watermark_file):
+            with open(watermark_file) as f:
+                since = f.read().strip() or None
+        start = time.perf_counter()
+
+        def progress(report):
+            rate = report['rows'] / max(time.perf_counter() - start, 1e-9)
+            log.write(f"  {report['images']:,} images, {report['rows']:,} rows ({rate:,.0f} rows/s)")
+
+        try:
+            chunks, watermark = exporters.export_labels(
+                fmt, exporters.parse_time(since, 'since'), exporters.parse_time(opts['until'], 'until'),
+                votes=opts['votes'], chunk_size=opts['chunk_size'], progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        try:
+            if output == '-':
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+            else:
+                exporters.write_file(chunks, output)
+        except OSError as e:
+            raise CommandError(f'Cannot write {output}: {e}')
+
+        if watermark_file:
+            with open(f'{watermark_file}.partial', 'w') as f:
+                f.write(watermark.isoformat() + '\n')
+            os.replace(f'{watermark_file}.partial', watermark_file)
+        log.write(self.style.SUCCESS(
+            f'Exported up to {watermark.isoformat()} in {time.perf_counter() - start:.1f}s'
+            + (f' (watermark saved to {watermark_file})' if watermark_file else '')
+        ))
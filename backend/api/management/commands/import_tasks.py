@@ -0,0 +1,43 @@
+"""
+Stream tasks from a CSV / JSONL file into the Image table
+Run: python manage.py import_tasks tasks.csv [--format jsonl] [--chunk-size 5000]
+Columns / keys: url, categories, bounty (optional, default 0.50)
+"""
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api import importers
+
+
+class Command(BaseCommand):
+    help = 'Bulk import image tasks from CSV or JSONL (use - for stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=importers.FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        path = opts['path']
+        fmt = opts['format'] or importers.guess_format(path)
+        start = time.perf_counter()
+
+        def progress(report):
+            rate = report['rows'] / max(time.perf_counter() - start, 1e-9)
+            self.stdout.write(f"  {report['rows']:,} rows, {report['created']:,} created, "
+                              f"{report['failed']:,} rejected ({rate:,.0f} rows/s)")
+
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e}')
+        with stream:
+            report = importers.import_tasks(importers.iter_rows(stream, fmt), opts['chunk_size'], progress)
+
+        for err in report['errors']:
+            self.stderr.write(f"  row {err['row']}: {err['error']}")
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']:,} of {report['rows']:,} rows in {elapsed:.1f}s "
+            f"({report['rows'] / max(elapsed, 1e-9):,.0f} rows/s)"
+        ))
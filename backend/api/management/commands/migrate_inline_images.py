@@ -0,0 +1,39 @@
+"""
+Move inline base64 images out of Image rows into the blob store
+Run: python manage.py migrate_inline_images [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from api.models import Image
+from api import blobstore
+
+
+class Command(BaseCommand):
+    help = 'Store inline base64 / data URI images in the blob store and keep only a reference in the row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **opts):
+        inline = Image.objects.exclude(
+            Q(image_url__startswith='http://') | Q(image_url__startswith='https://') |
+            Q(image_url__startswith='/') | Q(image_url__startswith=blobstore.REF_PREFIX)
+        ).only('id', 'image_url').order_by('id')
+
+        moved, batch = 0, []
+        for image in inline.iterator(chunk_size=opts['chunk_size']):
+            if blobstore.decode_inline(image.image_url) is None:
+                continue
+            moved += 1
+            if opts['dry_run']:
+                continue
+            image.image_url = blobstore.to_reference(image.image_url)
+            batch.append(image)
+            if len(batch) >= opts['chunk_size']:
+                Image.objects.bulk_update(batch, ['image_url'])
+                batch = []
+        if batch:
+            Image.objects.bulk_update(batch, ['image_url'])
+        verb = 'Would move' if opts['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {moved} inline images to {blobstore.root()}'))
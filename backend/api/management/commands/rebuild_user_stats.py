@@ -0,0 +1,27 @@
+"""
+Rebuild or verify the materialized UserStats counters
+Run: python manage.py rebuild_user_stats [--verify] [--user ID ...]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from api import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute UserStats from annotations, or check them for drift with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='only report users whose counters drifted')
+        parser.add_argument('--user', type=int, nargs='+', dest='user_ids', help='limit to these user ids')
+
+    def handle(self, *args, **opts):
+        user_ids = opts['user_ids']
+        if opts['verify']:
+            drift = stats.verify(user_ids)
+            for uid, (have, want) in sorted(drift.items()):
+                self.stdout.write(f'  user {uid}: stored {have}, expected {want}')
+            if drift:
+                raise CommandError(f'{len(drift)} users have drifted counters, run without --verify to fix')
+            self.stdout.write(self.style.SUCCESS('All user counters match'))
+            return
+        count = stats.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {count} users'))
@@ -0,0 +1,41 @@
+"""
+Re-score consensus over the whole annotation matrix
+Run: python manage.py rescore_consensus --strategy dawid-skene [--dry-run]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from api.consensus import STRATEGIES, rescore
+
+
+class Command(BaseCommand):
+    help = 'Re-score completed images with a consensus strategy and write back final labels in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='dawid-skene')
+        parser.add_argument('--include-reviewed', action='store_true',
+                            help='also re-score images that already have a final label (paid ones are skipped)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **opts):
+        try:
+            summary = rescore(opts['strategy'], include_reviewed=opts['include_reviewed'],
+                              chunk_size=opts['chunk_size'], dry_run=opts['dry_run'])
+        except Exception as e:
+            raise CommandError(f'Failed to write back consensus: {e}')
+        if summary['images'] == 0:
+            self.stdout.write('No completed images')
+            return
+
+        self.stdout.write(
+            f"{summary['strategy']}: {summary['images']:,} images / {summary['votes']:,} votes / "
+            f"{summary['annotators']:,} annotators, load {summary['load_seconds']:.1f}s, "
+            f"score {summary['score_seconds']:.1f}s"
+        )
+        self.stdout.write(f"  in scope: {summary['in_scope']:,}, resolved: {summary['resolved']:,}, "
+                          f"left for review: {summary['left_for_review']:,}")
+        if opts['dry_run']:
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {summary['written']:,} final labels and {summary['verdicts']:,} verdicts "
+            f"in {summary['write_seconds']:.1f}s"
+        ))
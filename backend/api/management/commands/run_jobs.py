@@ -0,0 +1,36 @@
+"""
+Run background jobs (payroll, consensus re-scoring, exports) from the database queue
+Run: python manage.py run_jobs [--threads 4]      (until Ctrl+C)
+     python manage.py run_jobs --once             (drain the queue, then exit)
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = 'Claim and run queued background jobs with a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=getattr(settings, 'JOB_WORKERS', 2))
+        parser.add_argument('--once', action='store_true', help='run queued jobs one by one, then exit')
+
+    def handle(self, *args, **opts):
+        pool = jobs.WorkerPool(opts['threads'])
+        if opts['once']:
+            jobs.requeue_stale()
+            done = 0
+            while pool.run_next():
+                done += 1
+            self.stdout.write(self.style.SUCCESS(f'Ran {done} jobs'))
+            return
+
+        pool.start()
+        self.stdout.write(f'Worker pool {pool.name} running {pool.threads} threads, Ctrl+C to stop')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping: waiting for running jobs to finish')
+            pool.stop()
@@ -0,0 +1,204 @@
+"""
+Prometheus metrics
+Counters and histograms updated in-process by the hot paths, rendered in the
+text exposition format at GET /api/metrics/. Every thread records into its
+own shard, so observing a sample takes no lock; a scrape sums the shards.
+Values are per process, like any client library without a push gateway.
+"""
+import bisect
+import threading
+from django.db.models import Count
+from .models import Image, Job
+from . import caching as response_cache
+
+# default buckets (seconds) for request-scale latencies
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+MAX_LIVE_SHARDS = 64  # fold shards of finished threads once this many exist
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Per-thread shards of {label values: value}"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []  # (thread, shard)
+        self._retired = {}  # merged shards of threads that have exited
+        _registry.append(self)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) > MAX_LIVE_SHARDS:
+                    self._fold()
+        return shard
+
+    def _fold(self):
+        """Merge shards of dead threads into _retired (caller holds the lock)"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    def _merge(self, into, shard):
+        raise NotImplementedError
+
+    def collect(self):
+        """Sum of all shards: {label values: value}"""
+        with self._lock:
+            self._fold()
+            total = {}
+            self._merge(total, self._retired)
+            for _, shard in self._shards:
+                self._merge(total, shard.copy())  # dict.copy is atomic under the GIL
+        return total
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines += self._samples(self.collect())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def _merge(self, into, shard):
+        for key, value in shard.items():
+            into[key] = into.get(key, 0) + value
+
+    def _samples(self, values):
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}' for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        shard = self._shard()
+        entry = shard.get(labelvalues)
+        if entry is None:
+            entry = shard[labelvalues] = [0] * (len(self.buckets) + 3)  # buckets, +Inf, sum, count
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def _merge(self, into, shard):
+        for key, entry in shard.items():
+            total = into.setdefault(key, [0] * len(entry))
+            for i, value in enumerate(entry):
+                total[i] += value
+
+    def _samples(self, values):
+        lines = []
+        for key, entry in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [le])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(float(entry[-2]))}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {entry[-1]}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback returning a number or {label values: number};
+    kind='counter' for totals kept elsewhere"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None, kind='gauge'):
+        super().__init__(name, documentation, labelnames)
+        self.callback, self.kind = callback, kind
+
+    def collect(self):
+        value = self.callback()
+        return value if isinstance(value, dict) else {(): value}
+
+    def _samples(self, values):
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}' for key, value in sorted(values.items())]
+
+
+def render():
+    """All metrics in the Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+# ===== Metrics =====
+
+ANNOTATIONS = Counter('crowdlabel_annotations_total', 'Annotations accepted', ['path'])
+SUBMIT_SECONDS = Histogram('crowdlabel_submit_seconds', 'Annotation submit transaction time', ['path'])
+LOCK_WAIT_SECONDS = Histogram(
+    'crowdlabel_lock_wait_seconds', 'Time spent acquiring select_for_update row locks on images', ['site']
+)
+SUBMIT_RETRIES = Counter('crowdlabel_submit_retries_total', 'Optimistic submits that lost an image to a concurrent vote')
+LOCK_ERRORS = Counter(
+    'crowdlabel_lock_errors_total', 'Writes that failed on a deadlock or lock wait timeout', ['site', 'kind']
+)
+CONSENSUS = Counter('crowdlabel_consensus_total', 'Completed images by consensus outcome', ['outcome'])
+CONFLICTS_RESOLVED = Counter('crowdlabel_conflicts_resolved_total', 'Conflicts resolved by an admin', ['path'])
+DISPATCH_SECONDS = Histogram('crowdlabel_dispatch_seconds', 'Time to pick the next task for an annotator', ['result'])
+PAYROLL_SECONDS = Histogram('crowdlabel_payroll_seconds', 'Payroll run duration', buckets=JOB_BUCKETS)
+PAYROLL_PAID = Counter('crowdlabel_payroll_paid_dollars_total', 'Amount paid out by payroll')
+PAYROLL_USERS = Counter('crowdlabel_payroll_users_total', 'Annotators paid by payroll')
+REQUEST_SECONDS = Histogram('crowdlabel_http_request_seconds', 'Request latency by URL pattern', ['method', 'endpoint'])
+REQUEST_DB_SECONDS = Histogram('crowdlabel_http_db_seconds', 'SQL time per request by URL pattern', ['method', 'endpoint'])
+JOBS = Counter('crowdlabel_jobs_total', 'Background jobs finished by this process', ['kind', 'status'])
+JOB_SECONDS = Histogram('crowdlabel_job_seconds', 'Background job run time', ['kind'], buckets=JOB_BUCKETS)
+
+
+def _response_cache_requests():
+    groups = response_cache.stats()['namespaces']
+    return {(namespace, result): counts[key]
+            for namespace, counts in groups.items() for result, key in (('hit', 'hits'), ('miss', 'misses'))}
+
+
+def _jobs_waiting():
+    counts = dict(Job.objects.filter(status__in=('queued', 'running'))
+                  .values_list('status').annotate(n=Count('id')).order_by())
+    return {(status,): counts.get(status, 0) for status in ('queued', 'running')}
+
+
+REVIEW_QUEUE = Gauge('crowdlabel_review_queue_depth', 'Images waiting for manual review',
+                     callback=lambda: Image.objects.filter(review_status='pending').count())
+OPEN_TASKS = Gauge('crowdlabel_open_tasks', 'Images still collecting votes',
+                   callback=lambda: Image.objects.filter(status='active').count())
+JOB_QUEUE = Gauge('crowdlabel_jobs_waiting', 'Background jobs queued or running', ['status'], callback=_jobs_waiting)
+RESPONSE_CACHE = Gauge('crowdlabel_response_cache_requests_total', 'Response cache lookups',
+                       ['namespace', 'result'], callback=_response_cache_requests, kind='counter')
@@ -0,0 +1,208 @@
+"""
+Per-request SQL metrics
+Counts the statements each request runs, their total time and the slowest
+one through connection.execute_wrapper. Results go out as a Server-Timing
+header and a log line, and the last QUERY_METRICS_WINDOW requests of every
+endpoint are kept for GET /api/admin/queries/.
+
+The recorder of the current request lives in a context variable. Under ASGI
+the ORM runs in worker threads with their own connections, and the context
+follows the request there while the event loop thread's connection does not.
+"""
+import math
+import time
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SQL_PREVIEW_CHARS = 300
+
+_lock = threading.Lock()
+_endpoints = {}  # 'GET api/tasks/next/' -> _Endpoint
+_recorder = ContextVar('query_recorder', default=None)
+
+
+class QueryRecorder:
+    """execute_wrapper that tallies statements and remembers the slowest one"""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.db_time += elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time, self.slowest_sql = elapsed, sql
+
+
+class _Endpoint:
+    """Rolling window of (total ms, db ms, queries) plus all-time totals for one route"""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.queries = 0
+        self.slowest = (0.0, None)  # (ms, sql) of the slowest statement seen
+
+    def add(self, total_ms, db_ms, queries, slowest_ms, slowest_sql):
+        self.samples.append((total_ms, db_ms, queries))
+        self.requests += 1
+        self.queries += queries
+        if slowest_ms > self.slowest[0]:
+            self.slowest = (slowest_ms, slowest_sql[:SQL_PREVIEW_CHARS])
+
+
+def _record_statement(execute, sql, params, many, context):
+    """execute_wrapper installed on every connection; hands statements to the current request's recorder"""
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    """connection_created receiver (the keyword is the signal's)"""
+    if _record_statement not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_statement)
+
+
+connection_created.connect(install)
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(1, math.ceil(pct / 100 * len(sorted_values))) - 1]
+
+
+def _route(request):
+    """URL pattern of the view, so /blobs/<digest>/ is one endpoint and not one per digest"""
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match else '<unmatched>'
+
+
+def record(route, total_ms, db_ms, queries, slowest_ms=0.0, slowest_sql=None):
+    with _lock:
+        endpoint = _endpoints.get(route)
+        if endpoint is None:
+            endpoint = _endpoints[route] = _Endpoint(getattr(settings, 'QUERY_METRICS_WINDOW', 1000))
+        endpoint.add(total_ms, db_ms, queries, slowest_ms, slowest_sql or '')
+
+
+def snapshot():
+    """Per-endpoint latency / DB time / query count percentiles, most DB time first"""
+    with _lock:
+        rows = [(route, list(e.samples), e.requests, e.queries, e.slowest) for route, e in _endpoints.items()]
+    result = []
+    for route, samples, requests, queries, (slowest_ms, slowest_sql) in rows:
+        total = sorted(s[0] for s in samples)
+        db = sorted(s[1] for s in samples)
+        counts = sorted(s[2] for s in samples)
+        result.append({
+            'endpoint': route,
+            'requests': requests,
+            'window': len(samples),
+            'ms': {p: round(_percentile(total, n), 2) for p, n in (('p50', 50), ('p95', 95), ('p99', 99))},
+            'db_ms': {p: round(_percentile(db, n), 2) for p, n in (('p50', 50), ('p95', 95), ('p99', 99))},
+            'queries': {
+                'p50': _percentile(counts, 50),
+                'max': counts[-1] if counts else 0,
+                'mean': round(queries / requests, 2) if requests else 0,
+            },
+            'db_share': round(sum(db) / sum(total), 3) if sum(total) else 0.0,
+            'slowest_statement': {'ms': round(slowest_ms, 2), 'sql': slowest_sql} if slowest_sql else None,
+        })
+    result.sort(key=lambda row: row['db_ms']['p50'] * row['window'], reverse=True)
+    return result
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+
+
+class QueryMetricsMiddleware:
+    """Measures the SQL of every request (QUERY_METRICS_ENABLED); runs natively under WSGI and ASGI"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'QUERY_METRICS_ENABLED', True):
+            return self.get_response(request)
+        install(connection)  # opened before this module was imported
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self._report(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'QUERY_METRICS_ENABLED', True):
+            return await self.get_response(request)
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self._report(request, response, recorder, start)
+
+    def _report(self, request, response, recorder, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.db_time * 1000
+        slowest_ms = recorder.slowest_time * 1000
+        path = _route(request)
+        route = f'{request.method} {path}'
+
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.2f};desc="{recorder.count} queries", app;dur={total_ms - db_ms:.2f}'
+        )
+        record(route, total_ms, db_ms, recorder.count, slowest_ms, recorder.slowest_sql)
+        metrics.REQUEST_SECONDS.observe(total_ms / 1000, request.method, path)
+        metrics.REQUEST_DB_SECONDS.observe(recorder.db_time, request.method, path)
+
+        fields = {
+            'method': request.method,
+            'endpoint': path,
+            'status': response.status_code,
+            'ms': round(total_ms, 2),
+            'db_ms': round(db_ms, 2),
+            'queries': recorder.count,
+            'slowest_ms': round(slowest_ms, 2),
+        }
+        if db_ms >= getattr(settings, 'QUERY_METRICS_SLOW_MS', 200):
+            fields['slowest_sql'] = (recorder.slowest_sql or '')[:SQL_PREVIEW_CHARS]
+            logger.warning(f'Slow request {route}: {db_ms:.1f}ms in {recorder.count} queries, '
+                           f'slowest {slowest_ms:.1f}ms: {fields["slowest_sql"]}', extra={'query_metrics': fields})
+        else:
+            logger.info(' '.join(f'{key}={value}' for key, value in fields.items()),
+                        extra={'query_metrics': fields})
+        return response
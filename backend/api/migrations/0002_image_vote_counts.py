@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:15
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_vote_counts(apps, schema_editor):
+    """Build tallies from existing annotations"""
+    Image = apps.get_model('api', 'Image')
+    Annotation = apps.get_model('api', 'Annotation')
+    tallies = {}
+    rows = Annotation.objects.values('image_id', 'submitted_label').annotate(n=Count('id')).order_by()
+    for row in rows.iterator(chunk_size=10000):
+        tallies.setdefault(row['image_id'], {})[row['submitted_label']] = row['n']
+    batch = []
+    for image_id, counts in tallies.items():
+        batch.append(Image(id=image_id, vote_counts=counts))
+        if len(batch) >= 1000:
+            Image.objects.bulk_update(batch, ['vote_counts'])
+            batch = []
+    if batch:
+        Image.objects.bulk_update(batch, ['vote_counts'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='vote_counts',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(backfill_vote_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def build_user_stats(apps, schema_editor):
+    """Fill counters from existing annotations"""
+    User = apps.get_model('api', 'User')
+    Annotation = apps.get_model('api', 'Annotation')
+    UserStats = apps.get_model('api', 'UserStats')
+    counters = {
+        row.pop('user_id'): row for row in Annotation.objects.values('user_id').annotate(
+            total_count=Count('id'),
+            judged_count=Count('id', filter=Q(is_correct__isnull=False)),
+            correct_count=Count('id', filter=Q(is_correct=True)),
+            pending_balance=Sum('image__bounty', filter=Q(is_correct=True, payment__isnull=True)),
+        ).order_by()
+    }
+    rows = []
+    for uid in User.objects.values_list('id', flat=True):
+        row = counters.get(uid, {})
+        rows.append(UserStats(
+            user_id=uid,
+            total_count=row.get('total_count', 0),
+            judged_count=row.get('judged_count', 0),
+            correct_count=row.get('correct_count', 0),
+            pending_balance=row.get('pending_balance') or 0,
+        ))
+    UserStats.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_image_vote_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_count', models.IntegerField(default=0)),
+                ('judged_count', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('pending_balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+            ],
+        ),
+        migrations.RunPython(build_user_stats, migrations.RunPython.noop),
+    ]
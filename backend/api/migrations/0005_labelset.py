@@ -0,0 +1,138 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def _parse(options):
+    labels = []
+    for part in (options or '').split(','):
+        part = part.strip()
+        if part and part not in labels:
+            labels.append(part)
+    return labels
+
+
+def _save_tallies(Image, tallies):
+    batch = []
+    for image_id, counts in tallies.items():
+        batch.append(Image(id=image_id, vote_counts=counts))
+        if len(batch) >= 1000:
+            Image.objects.bulk_update(batch, ['vote_counts'])
+            batch = []
+    if batch:
+        Image.objects.bulk_update(batch, ['vote_counts'])
+
+
+def to_label_codes(apps, schema_editor):
+    """Intern category strings into LabelSets and turn label strings into codes"""
+    LabelSet = apps.get_model('api', 'LabelSet')
+    Image = apps.get_model('api', 'Image')
+    Annotation = apps.get_model('api', 'Annotation')
+
+    # labels that were actually submitted, so nothing is lost if options were edited by hand
+    used = {}
+    for raw, label in Annotation.objects.values_list('image__category_options', 'submitted_label').distinct():
+        used.setdefault(raw, []).append(label)
+
+    label_sets = {}
+    for raw in Image.objects.values_list('category_options', flat=True).distinct().order_by():
+        labels = _parse(raw)
+        labels += [label for label in sorted(set(used.get(raw, ()))) if label not in labels]
+        label_set, _ = LabelSet.objects.get_or_create(options=','.join(labels or ['unknown']))
+        label_sets[label_set.id] = label_set
+        Image.objects.filter(category_options=raw).update(label_set=label_set)
+
+    for label_set in label_sets.values():
+        for code, label in enumerate(label_set.options.split(',')):
+            Annotation.objects.filter(image__label_set=label_set, submitted_label=label).update(label=code)
+
+    # tallies become lists indexed by code
+    Image.objects.update(vote_counts=[])
+    tallies = {}
+    rows = Annotation.objects.values('image_id', 'label').annotate(n=Count('id')).order_by()
+    for row in rows.iterator(chunk_size=10000):
+        counts = tallies.setdefault(row['image_id'], [])
+        counts.extend([0] * (row['label'] + 1 - len(counts)))
+        counts[row['label']] = row['n']
+    _save_tallies(Image, tallies)
+
+
+def to_label_strings(apps, schema_editor):
+    LabelSet = apps.get_model('api', 'LabelSet')
+    Image = apps.get_model('api', 'Image')
+    Annotation = apps.get_model('api', 'Annotation')
+    for label_set in LabelSet.objects.all():
+        Image.objects.filter(label_set=label_set).update(category_options=label_set.options)
+        for code, label in enumerate(label_set.options.split(',')):
+            Annotation.objects.filter(image__label_set=label_set, label=code).update(submitted_label=label)
+
+    Image.objects.update(vote_counts={})
+    tallies = {}
+    rows = Annotation.objects.values('image_id', 'submitted_label').annotate(n=Count('id')).order_by()
+    for row in rows.iterator(chunk_size=10000):
+        tallies.setdefault(row['image_id'], {})[row['submitted_label']] = row['n']
+    _save_tallies(Image, tallies)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_annotation_user_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabelSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('options', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='label_set',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='images', to='api.labelset'),
+        ),
+        migrations.AddField(
+            model_name='annotation',
+            name='label',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='vote_counts',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(to_label_codes, to_label_strings),
+        # a default lets the string columns be re-added when migrating backwards
+        migrations.AlterField(
+            model_name='image',
+            name='category_options',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='annotation',
+            name='submitted_label',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.RemoveField(
+            model_name='image',
+            name='category_options',
+        ),
+        migrations.RemoveField(
+            model_name='annotation',
+            name='submitted_label',
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='label_set',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='images', to='api.labelset'),
+        ),
+        migrations.AlterField(
+            model_name='annotation',
+            name='label',
+            field=models.PositiveSmallIntegerField(),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+def backfill_reviewed_at(apps, schema_editor):
+    """Reviewed images predate the column; their creation time is the best lower bound"""
+    Image = apps.get_model('api', 'Image')
+    Image.objects.filter(review_status='reviewed').update(reviewed_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_image_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='reviewed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_reviewed_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['review_status', 'reviewed_at'], name='api_image_review__aecd72_idx'),
+        ),
+    ]
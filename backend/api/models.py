@@ -1,5 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.utils.functional import cached_property
+
+# votes needed before an image is completed
+ANNOTATIONS_PER_IMAGE = 5
+MAX_LABEL_LENGTH = 50
 
 # User model
 class User(AbstractUser):
@@ -10,22 +15,140 @@ class User(AbstractUser):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     balance_wallet = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
+# Shared, immutable set of category options ("Cat,Dog,Bird"); labels are stored as their index
+class LabelSet(models.Model):
+    options = models.CharField(max_length=255, unique=True)  # canonical form, no spaces around commas
+
+    @staticmethod
+    def parse(options):
+        """Split a category string into a tuple of labels; raises ValueError if unusable"""
+        labels = []
+        for part in (options or '').split(','):
+            part = part.strip()
+            if part and part not in labels:
+                labels.append(part)
+        if not labels:
+            raise ValueError('Invalid categories')
+        if any(len(label) > MAX_LABEL_LENGTH for label in labels):
+            raise ValueError(f'Labels must be at most {MAX_LABEL_LENGTH} characters')
+        if len(','.join(labels)) > 255:
+            raise ValueError('Categories too long (max 255 characters)')
+        return tuple(labels)
+
+    @classmethod
+    def intern(cls, options):
+        """The shared LabelSet for a category string, created on first use"""
+        key = ','.join(cls.parse(options))
+        label_set = _LABEL_SETS_BY_OPTIONS.get(key)
+        if label_set is None:
+            label_set, created = cls.objects.get_or_create(options=key)
+            if created:
+                # only cache rows that are known to be committed
+                transaction.on_commit(lambda: _cache_label_set(label_set))
+            else:
+                _cache_label_set(label_set)
+        return label_set
+
+    @classmethod
+    def cached(cls, label_set_id):
+        """LabelSet by id from the process cache (rows are never modified)"""
+        label_set = _LABEL_SETS_BY_ID.get(label_set_id)
+        if label_set is None:
+            label_set = _cache_label_set(cls.objects.get(id=label_set_id))
+        return label_set
+
+    @classmethod
+    async def acached(cls, label_set_id):
+        """cached() for async views"""
+        label_set = _LABEL_SETS_BY_ID.get(label_set_id)
+        if label_set is None:
+            label_set = _cache_label_set(await cls.objects.aget(id=label_set_id))
+        return label_set
+
+    @cached_property
+    def labels(self):
+        return tuple(self.options.split(','))
+
+    @cached_property
+    def codes(self):
+        return {label: code for code, label in enumerate(self.labels)}
+
+    def code_of(self, label):
+        """Code of a label, None if it is not one of the options"""
+        return self.codes.get(label) if isinstance(label, str) else None
+
+    def label_of(self, code):
+        return self.labels[code] if code is not None and 0 <= code < len(self.labels) else None
+
+
+_LABEL_SETS_BY_ID = {}
+_LABEL_SETS_BY_OPTIONS = {}
+
+
+def _cache_label_set(label_set):
+    _LABEL_SETS_BY_ID[label_set.id] = label_set
+    _LABEL_SETS_BY_OPTIONS[label_set.options] = label_set
+    return label_set
+
 # Image task model
 class Image(models.Model):
     REVIEW_STATUS_CHOICES = (('none', 'None'), ('pending', 'Pending'), ('reviewed', 'Reviewed'))
     STATUS_CHOICES = (('active', 'Active'), ('completed', 'Completed'))
 
     image_url = models.TextField()  # can be URL or base64
-    category_options = models.CharField(max_length=255)  # like "Cat,Dog,Bird"
+    label_set = models.ForeignKey(LabelSet, on_delete=models.PROTECT, related_name='images')
     final_label = models.CharField(max_length=50, null=True, blank=True)
     review_status = models.CharField(max_length=20, choices=REVIEW_STATUS_CHOICES, default='none')
     bounty = models.DecimalField(max_digits=10, decimal_places=2, default=0.50)
     assigned_count = models.IntegerField(default=0)
+    vote_counts = models.JSONField(default=list)  # votes per label code, like [1, 4] for "Cat,Dog"
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
+    reviewed_at = models.DateTimeField(null=True, blank=True)  # when final_label was last set
 
     class Meta:
-        indexes = [models.Index(fields=['status', 'assigned_count'])]
+        indexes = [
+            models.Index(fields=['status', 'assigned_count']),
+            # admin listings: filter + sort key (the primary key tie-breaker is implicit)
+            models.Index(fields=['status', 'bounty']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['review_status', 'bounty']),
+            models.Index(fields=['review_status', 'created_at']),
+            # label export: reviewed images in review order, incremental from a watermark
+            models.Index(fields=['review_status', 'reviewed_at']),
+        ]
+
+    @property
+    def label_options(self):
+        """The image's LabelSet, from the process cache instead of a join"""
+        return LabelSet.cached(self.label_set_id)
+
+    @property
+    def category_options(self):
+        return self.label_options.options
+
+    def record_vote(self, code):
+        """Add one vote to the tally (caller holds the row lock, or writes it back compare-and-set)"""
+        if len(self.vote_counts) <= code:
+            self.vote_counts.extend([0] * (code + 1 - len(self.vote_counts)))
+        self.vote_counts[code] += 1
+
+    @property
+    def leading_code(self):
+        if not any(self.vote_counts):
+            return None
+        return max(range(len(self.vote_counts)), key=self.vote_counts.__getitem__)
+
+    @property
+    def agreement(self):
+        """Share of votes for the leading label"""
+        total = sum(self.vote_counts)
+        return (self.vote_counts[self.leading_code] / total) if total else 0.0
+
+    def named_vote_counts(self):
+        """Tally keyed by label name, like {"Cat": 1, "Dog": 4}"""
+        labels = self.label_options
+        return {labels.label_of(code): n for code, n in enumerate(self.vote_counts) if n}
 
 # Payment record model
 class Payment(models.Model):
@@ -37,10 +160,56 @@ class Payment(models.Model):
 class Annotation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     image = models.ForeignKey(Image, on_delete=models.CASCADE)
-    submitted_label = models.CharField(max_length=50)
+    label = models.PositiveSmallIntegerField()  # code into image.label_set
     is_correct = models.BooleanField(null=True, default=None)  # None=pending, True=correct, False=wrong
     payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('user', 'image')  # one user can only annotate one image once
\ No newline at end of file
+        unique_together = ('user', 'image')  # one user can only annotate one image once
+        indexes = [models.Index(fields=['user', 'created_at'])]  # history pages
+
+    @property
+    def submitted_label(self):
+        # views that list annotations annotate label_set_id to skip loading the image
+        label_set_id = getattr(self, 'label_set_id', None) or self.image.label_set_id
+        return LabelSet.cached(label_set_id).label_of(self.label)
+
+# Materialized per-user counters behind /stats/
+class UserStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_count = models.IntegerField(default=0)
+    judged_count = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    pending_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)  # correct, not paid yet
+
+# Background job (payroll, consensus re-scoring, label export), queued in the database and run by api/jobs.py
+class Job(models.Model):
+    KIND_CHOICES = (
+        ('payroll', 'Payroll'),
+        ('rescore', 'Consensus re-scoring'),
+        ('export', 'Label export'),
+    )
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.FloatField(default=0)  # 0..1
+    message = models.CharField(max_length=255, blank=True, default='')  # latest progress note
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default='')  # host:pid of the claiming worker
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # a running job that stops beating is requeued
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'id'])]  # claiming the oldest queued job
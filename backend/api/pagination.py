@@ -0,0 +1,81 @@
+"""
+Keyset (cursor) pagination
+Pages are selected with a WHERE on the sort key of the last row seen, so
+the cost of a page does not grow with how deep into the list it is.
+"""
+import base64
+import json
+from django.db.models import Q
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """Page size from a query param; raises ValueError when out of range"""
+    try:
+        limit = int(value) if value not in (None, '') else default
+    except (ValueError, TypeError):
+        raise ValueError('Invalid limit')
+    if limit < 1 or limit > maximum:
+        raise ValueError(f'limit must be between 1 and {maximum}')
+    return limit
+
+
+def parse_sort(value, allowed, default):
+    """Ordering tuple for a ?sort= param like "-bounty", with id as the tie-breaker"""
+    value = value or default
+    name = value.lstrip('-')
+    if name not in allowed:
+        raise ValueError(f'sort must be one of: {", ".join(allowed)} (prefix - for descending)')
+    prefix = '-' if value.startswith('-') else ''
+    return (prefix + name, prefix + 'id')
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else str(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, model, ordering):
+    """Cursor string -> typed values of the ordering fields; raises ValueError if malformed"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(raw, list) or len(raw) != len(ordering):
+        raise ValueError('Invalid cursor')
+    try:
+        return [model._meta.get_field(f.lstrip('-')).to_python(v) for f, v in zip(ordering, raw)]
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _after(ordering, values):
+    """WHERE clause for rows strictly after the given sort key"""
+    condition = Q()
+    for i in range(len(ordering) - 1, -1, -1):
+        name = ordering[i].lstrip('-')
+        op = 'lt' if ordering[i].startswith('-') else 'gt'
+        step = Q(**{f'{name}__{op}': values[i]})
+        if i < len(ordering) - 1:
+            step |= Q(**{name: values[i]}) & condition
+        condition = step
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, limit=DEFAULT_LIMIT):
+    """Return (rows, next_cursor); ordering must end in a unique field such as id.
+
+    The queryset may be a .values() projection as long as it keeps the ordering fields.
+    """
+    if cursor:
+        queryset = queryset.filter(_after(ordering, decode_cursor(cursor, queryset.model, ordering)))
+    rows = list(queryset.order_by(*ordering)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        keys = [f.lstrip('-') for f in ordering]
+        next_cursor = encode_cursor([last[k] if isinstance(last, dict) else getattr(last, k) for k in keys])
+    return rows, next_cursor
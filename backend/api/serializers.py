@@ -1,5 +1,16 @@
+from django.urls import reverse
 from rest_framework import serializers
-from .models import User, Image, Annotation, Payment
+from .models import User, Image, Annotation, Payment, Job
+from . import blobstore
+
+def public_image_url(value, context):
+    """Stored images are served from the blob endpoint, not inlined"""
+    digest = blobstore.digest_of(value)
+    if not digest:
+        return value
+    url = reverse('blob', args=[digest])
+    request = context.get('request')
+    return request.build_absolute_uri(url) if request else url
 
 # User serializer
 class UserSerializer(serializers.ModelSerializer):
@@ -9,18 +20,65 @@ class UserSerializer(serializers.ModelSerializer):
 
 # Image serializer
 class ImageSerializer(serializers.ModelSerializer):
+    category_options = serializers.CharField(read_only=True)
     options_list = serializers.SerializerMethodField()
     
     class Meta:
         model = Image
-        fields = '__all__'
+        # annotators vote blind: the running tally is only in the admin listings
+        exclude = ['vote_counts']
     
     def get_options_list(self, obj):
-        # convert "Cat,Dog,Bird" to ["Cat", "Dog", "Bird"]
-        return [x.strip() for x in obj.category_options.split(',')]
+        # parsed once per label set, not per row
+        return list(obj.label_options.labels)
+
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        data['image_url'] = public_image_url(data['image_url'], self.context)
+        return data
+
+# Light image serializer for admin listings
+class ImageListSerializer(serializers.ModelSerializer):
+    options_list = serializers.SerializerMethodField()
+    vote_counts = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Image
+        fields = ['id', 'image_url', 'options_list', 'bounty', 'assigned_count', 'vote_counts',
+                  'status', 'review_status', 'created_at']
+
+    def get_options_list(self, obj):
+        return list(obj.label_options.labels)
+
+    def get_vote_counts(self, obj):
+        return obj.named_vote_counts()
+
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        data['image_url'] = public_image_url(data['image_url'], self.context)
+        return data
 
 # Annotation serializer
 class AnnotationSerializer(serializers.ModelSerializer):
+    submitted_label = serializers.CharField(read_only=True)
+
     class Meta:
         model = Annotation
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+# Background job serializer
+class JobSerializer(serializers.ModelSerializer):
+    created_by = serializers.CharField(source='created_by.username', default=None, read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'params', 'status', 'progress', 'message', 'result', 'error', 'attempts',
+                  'created_by', 'created_at', 'started_at', 'finished_at', 'download_url']
+
+    def get_download_url(self, obj):
+        if obj.kind != 'export' or obj.status != 'succeeded':
+            return None
+        url = reverse('job-download', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
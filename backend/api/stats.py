@@ -0,0 +1,117 @@
+"""
+Materialized user statistics
+UserStats rows are updated in the same transaction as the writes that
+change them, so /stats/ is a single primary-key read. rebuild() recomputes
+them from the Annotation table (used by manage.py rebuild_user_stats).
+"""
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Count, Sum, Q
+from .models import User, Annotation, UserStats
+from . import caching as response_cache
+
+FIELDS = ('total_count', 'judged_count', 'correct_count', 'pending_balance')
+_DECIMAL = models.DecimalField(max_digits=10, decimal_places=2)
+
+
+def compute(user_ids=None):
+    """Counters per user straight from the Annotation table"""
+    anns = Annotation.objects.all()
+    if user_ids is not None:
+        anns = anns.filter(user_id__in=user_ids)
+    rows = anns.values('user_id').annotate(
+        total_count=Count('id'),
+        judged_count=Count('id', filter=Q(is_correct__isnull=False)),
+        correct_count=Count('id', filter=Q(is_correct=True)),
+        pending_balance=Sum('image__bounty', filter=Q(is_correct=True, payment__isnull=True)),
+    ).order_by()
+    result = {}
+    for row in rows:
+        uid = row.pop('user_id')
+        # SQLite sums decimals as floats; round like the column so verify compares like with like
+        row['pending_balance'] = Decimal(str(row['pending_balance'] or 0)).quantize(Decimal('0.01'))
+        result[uid] = row
+    return result
+
+
+def rebuild(user_ids=None, chunk_size=1000):
+    """Recompute and upsert counters; users without annotations get zeros"""
+    users = User.objects.all() if user_ids is None else User.objects.filter(id__in=user_ids)
+    counters = compute(user_ids)
+    zero = {'total_count': 0, 'judged_count': 0, 'correct_count': 0, 'pending_balance': Decimal('0.00')}
+    rows = [UserStats(user_id=uid, **counters.get(uid, zero)) for uid in users.values_list('id', flat=True)]
+    UserStats.objects.bulk_create(rows, batch_size=chunk_size, update_conflicts=True,
+                                  unique_fields=['user'], update_fields=list(FIELDS))
+    response_cache.invalidate_users([row.user_id for row in rows])
+    return len(rows)
+
+
+def verify(user_ids=None):
+    """Return {user_id: (stored, expected)} for every user whose counters drifted"""
+    users = User.objects.all() if user_ids is None else User.objects.filter(id__in=user_ids)
+    expected = compute(user_ids)
+    stored = {s['user_id']: s for s in UserStats.objects.filter(user__in=users).values('user_id', *FIELDS)}
+    drift = {}
+    for uid in users.values_list('id', flat=True):
+        want = expected.get(uid)
+        have = stored.get(uid)
+        if want is None and (have is None or not any(have[f] for f in FIELDS)):
+            continue  # no annotations; a missing row is built on first read
+        if have is None or want is None or any(have[f] != want[f] for f in FIELDS):
+            drift[uid] = (have, want)
+    return drift
+
+
+def apply(deltas):
+    """Add {user_id: {field: delta}} to the counters in one UPDATE"""
+    deltas = {uid: d for uid, d in deltas.items() if any(d.values())}
+    if not deltas:
+        return
+    if len(deltas) > 1 and transaction.get_connection().in_atomic_block:
+        # lock in user id order: two submits judging overlapping voters must not lock them crosswise
+        list(UserStats.objects.select_for_update().filter(user_id__in=deltas).order_by('user_id')
+             .values_list('user_id', flat=True))
+    changes = {}
+    for field in FIELDS:
+        per_user = {uid: d.get(field, 0) for uid, d in deltas.items() if d.get(field)}
+        if per_user:
+            output = _DECIMAL if field == 'pending_balance' else models.IntegerField()
+            changes[field] = models.F(field) + models.Case(
+                *[models.When(user_id=uid, then=models.Value(v)) for uid, v in per_user.items()],
+                default=models.Value(0), output_field=output,
+            )
+    updated = UserStats.objects.filter(user_id__in=deltas).update(**changes)
+    response_cache.invalidate_users(deltas)
+    if updated < len(deltas):
+        # counters were never built for some users: build them from the (already written) rows
+        missing = set(deltas) - set(UserStats.objects.filter(user_id__in=deltas).values_list('user_id', flat=True))
+        rebuild(missing)
+
+
+def merge(*deltas):
+    """Sum several {user_id: {field: delta}} maps"""
+    merged = {}
+    for d in deltas:
+        for uid, fields in d.items():
+            row = merged.setdefault(uid, {})
+            for field, value in fields.items():
+                row[field] = row.get(field, 0) + value
+    return merged
+
+
+def verdict_deltas(rows, decisions):
+    """Counter changes when votes get judged: rows are (user_id, image_id, code, is_correct, paid, bounty)"""
+    deltas = {}
+    for uid, image_id, label, old, paid, bounty in rows:
+        new = label == decisions[image_id]
+        if old == new:
+            continue
+        d = deltas.setdefault(uid, {})
+        if old is None:
+            d['judged_count'] = d.get('judged_count', 0) + 1
+        step = 1 if new else -1
+        if new or old:
+            d['correct_count'] = d.get('correct_count', 0) + step
+            if not paid:
+                d['pending_balance'] = d.get('pending_balance', Decimal(0)) + step * bounty
+    return deltas
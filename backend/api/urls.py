@@ -1,26 +1,44 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# hot annotator endpoints run as coroutines when served over ASGI
+hot = async_views if settings.ASYNC_VIEWS else views
 
 # API routes
 urlpatterns = [
     # auth
     path('auth/login/', views.login_view),
     path('auth/logout/', views.logout_view),
-    path('auth/check/', views.check_auth),
+    path('auth/check/', hot.check_auth),
     
     # tasks
-    path('tasks/next/', views.get_available_task),
+    path('tasks/next/', hot.get_available_task),
+    path('tasks/batch/', views.get_task_batch),
     path('tasks/add/', views.add_task),
+    path('tasks/import/', views.import_tasks),
     path('tasks/active/', views.get_all_active_tasks),
+    path('blobs/<str:digest>/', views.get_blob, name='blob'),
     
     # annotator
-    path('annotate/', views.submit_annotation),
-    path('stats/', views.get_user_stats),
+    path('annotate/', hot.submit_annotation),
+    path('annotate/bulk/', views.submit_annotations_bulk),
+    path('stats/', hot.get_user_stats),
     path('history/', views.get_user_history),
     
     # admin
     path('admin/reviews/', views.get_review_queue),
     path('admin/resolve/', views.resolve_conflict),
+    path('admin/resolve/bulk/', views.resolve_conflicts_bulk),
     path('admin/unpaid/', views.get_unpaid_users),
     path('admin/payroll/', views.run_payroll),
+    path('admin/cache/', views.get_cache_stats),
+    path('admin/queries/', views.get_query_metrics),
+    path('admin/export/', views.export_labels),
+    path('admin/jobs/', views.job_list),
+    path('admin/jobs/<int:job_id>/', views.job_detail),
+    path('admin/jobs/<int:job_id>/download/', views.job_download, name='job-download'),
+    
+    # monitoring
+    path('metrics/', views.get_metrics),
 ]
\ No newline at end of file
@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.db import transaction, models
-from django.db.models import Sum, Q
+from django.db.models import Sum, Q, F
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny, BasePermission
@@ -7,14 +8,32 @@ from rest_framework.authentication import SessionAuthentication
 from django.contrib.auth import authenticate, login, logout
 from django.views.decorators.csrf import csrf_exempt
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
+from django.db import IntegrityError, OperationalError
+from django.utils import timezone
 import logging
-from .models import User, Image, Annotation, Payment
-from .serializers import UserSerializer, ImageSerializer, AnnotationSerializer
-from decimal import Decimal, InvalidOperation
+import os
+import re
+import hmac
+import time
+from .models import User, Image, Annotation, Payment, UserStats, LabelSet, Job, ANNOTATIONS_PER_IMAGE
+from .dispatch import dispatcher
+from .consensus import close_image, mark_votes, resolve_images
+from . import payroll, stats, blobstore, importers, exporters, jobs
+from . import caching as response_cache
+from . import middleware as query_metrics
+from . import metrics
+from .pagination import keyset_page, parse_limit, parse_sort
+from .serializers import UserSerializer, ImageSerializer, ImageListSerializer, AnnotationSerializer, JobSerializer
 
 logger = logging.getLogger(__name__)
 
+HISTORY_ORDERING = ('-created_at', '-id')
+JOB_ORDERING = ('-id',)
+# columns loaded for admin listings (see ImageListSerializer)
+IMAGE_LIST_COLUMNS = ('id', 'image_url', 'label_set', 'bounty', 'assigned_count', 'vote_counts',
+                      'status', 'review_status', 'created_at')
+
 # Skip CSRF check for API
 class CsrfExemptSessionAuthentication(SessionAuthentication):
     def enforce_csrf(self, request):
@@ -25,6 +44,25 @@ class IsAdminUser(BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.role == 'admin'
 
+# Admin session, or "Authorization: Bearer <METRICS_TOKEN>" for a Prometheus scraper
+class CanScrapeMetrics(IsAdminUser):
+    def has_permission(self, request, view):
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return True
+        return super().has_permission(request, view)
+
+def count_lock_error(site, e):
+    """Count e in metrics.LOCK_ERRORS if it is a deadlock (MySQL 1213) or lock timeout (MySQL 1205, SQLite busy)"""
+    if not isinstance(e, OperationalError):
+        return
+    code = e.args[0] if e.args and isinstance(e.args[0], int) else None
+    if code == 1213:
+        metrics.LOCK_ERRORS.inc(site, 'deadlock')
+    elif code == 1205 or 'database is locked' in str(e):
+        metrics.LOCK_ERRORS.inc(site, 'timeout')
+
 # ===== Auth APIs =====
 
 @api_view(['POST'])
@@ -68,160 +106,496 @@ def check_auth(request):
 @api_view(['GET'])
 def get_available_task(request):
     """Get next available task for annotator"""
-    user = request.user
-    done_ids = Annotation.objects.filter(user=user).values_list('image_id', flat=True)
     # find tasks not done by this user, prefer tasks close to completion
-    task = Image.objects.filter(status='active', assigned_count__lt=5)\
-        .exclude(id__in=done_ids)\
-        .order_by('assigned_count').last()
-    return Response(ImageSerializer(task).data if task else None)
+    start = time.perf_counter()
+    task = dispatcher.next_task(request.user.id)
+    metrics.DISPATCH_SECONDS.observe(time.perf_counter() - start, 'task' if task else 'empty')
+    return Response(ImageSerializer(task, context={'request': request}).data if task else None)
+
+@api_view(['GET'])
+def get_task_batch(request):
+    """Reserve several tasks for annotator in one request"""
+    try:
+        n = int(request.query_params.get('n', 20))
+    except (ValueError, TypeError):
+        return Response({'error': 'Invalid n'}, status=400)
+    max_n = getattr(settings, 'TASK_BATCH_MAX', 50)
+    if n < 1 or n > max_n:
+        return Response({'error': f'n must be between 1 and {max_n}'}, status=400)
+
+    tasks = dispatcher.next_tasks(request.user.id, n)
+    # unconsumed slots go back to the pool when the leases expire
+    return Response({
+        'tasks': ImageSerializer(tasks, many=True, context={'request': request}).data,
+        'expires_at': dispatcher.lease_expiry(),
+    })
 
 @api_view(['POST'])
 @csrf_exempt
 @authentication_classes([CsrfExemptSessionAuthentication])
 def submit_annotation(request):
     """Submit annotation for an image"""
-    user = request.user
-    image_id = request.data.get('image_id')
-    label = request.data.get('label')
+    payload, status = save_annotation(request.user, request.data.get('image_id'), request.data.get('label'))
+    return Response(payload, status=status)
 
+def save_annotation(user, image_id, label):
+    """Validate and store one vote; returns (payload, status). Shared with the async view."""
     if not image_id or not label:
-        return Response({'error': 'image_id and label are required'}, status=400)
+        return {'error': 'image_id and label are required'}, 400
     
     if not isinstance(image_id, int):
         try:
             image_id = int(image_id)
         except (ValueError, TypeError):
-            return Response({'error': 'Invalid image_id'}, status=400)
+            return {'error': 'Invalid image_id'}, 400
+
+    if getattr(settings, 'SUBMIT_MODE', 'locking') == 'optimistic':
+        return _save_annotation_optimistic(user, image_id, label)
 
+    start = time.perf_counter()
     try:
         with transaction.atomic():
             # lock the row to prevent race condition
             image = Image.objects.select_for_update().get(id=image_id)
+            # BEGIN plus the locking read: the row-lock wait on MySQL, the write-lock wait on SQLite
+            metrics.LOCK_WAIT_SECONDS.observe(time.perf_counter() - start, 'submit')
             
             if image.status == 'completed':
-                return Response({'error': 'Task completed'}, status=400)
+                return {'error': 'Task completed'}, 400
             
             if Annotation.objects.filter(user=user, image=image).exists():
-                return Response({'error': 'Already annotated'}, status=400)
+                return {'error': 'Already annotated'}, 400
 
             # check if label is valid
-            valid_labels = [opt.strip() for opt in image.category_options.split(',')]
-            if label not in valid_labels:
-                return Response({'error': f'Invalid label. Must be one of: {", ".join(valid_labels)}'}, status=400)
+            options = image.label_options
+            code = options.code_of(label)
+            if code is None:
+                return {'error': f'Invalid label. Must be one of: {", ".join(options.labels)}'}, 400
 
             # save annotation
-            Annotation.objects.create(user=user, image=image, submitted_label=label)
+            Annotation.objects.create(user=user, image=image, label=code)
             image.assigned_count += 1
+            image.record_vote(code)
             
             # check consensus when 5 annotations collected
-            if image.assigned_count >= 5:
-                image.status = 'completed'
-                anns = Annotation.objects.filter(image=image)
-                labels = [a.submitted_label for a in anns]
-                
-                # if all 5 labels are the same, auto approve
-                if len(set(labels)) == 1:
-                    image.review_status = 'reviewed'
-                    image.final_label = labels[0]
-                    anns.update(is_correct=True)
-                    logger.info(f'Image {image_id} auto-approved with label: {labels[0]}')
-                else:
-                    # conflict detected, need manual review
-                    image.review_status = 'pending'
-                    logger.info(f'Image {image_id} requires manual review (conflict detected)')
+            decisions = {}
+            if image.assigned_count >= ANNOTATIONS_PER_IMAGE:
+                code = close_image(image)
+                if code is not None:
+                    decisions[image.id] = code
             
             image.save()
+            # the submitter's counter goes in with the verdicts, last: one UserStats UPDATE per submit
+            mark_votes(decisions, {user.id: {'total_count': 1}})
+            response_cache.invalidate_rows('active', [image.id])
+            transaction.on_commit(lambda: dispatcher.record_annotation(user.id, image.id, image.assigned_count))
+        metrics.SUBMIT_SECONDS.observe(time.perf_counter() - start, 'single')
+        metrics.ANNOTATIONS.inc('single')
         logger.info(f'User {user.username} submitted annotation for image {image_id}')
-        return Response({'status': 'success'})
+        return {'status': 'success'}, 200
     except Image.DoesNotExist:
-        return Response({'error': 'Image not found'}, status=404)
+        return {'error': 'Image not found'}, 404
     except IntegrityError as e:
         logger.error(f'Integrity error in submit_annotation: {str(e)}')
-        return Response({'error': 'Database integrity error'}, status=400)
+        return {'error': 'Database integrity error'}, 400
+    except Exception as e:
+        count_lock_error('submit', e)
+        logger.error(f'Error in submit_annotation: {str(e)}', exc_info=True)
+        return {'error': 'Internal server error'}, 500
+
+def _save_annotation_optimistic(user, image_id, label):
+    """save_annotation without the locking read.
+
+    Checks run on a plain read; the vote then claims a slot with one conditional UPDATE
+    (assigned_count = seen + 1 WHERE assigned_count = seen) and the unique (user, image)
+    constraint rejects duplicates. The row lock lasts from that UPDATE to commit, and only
+    the vote that fills the last slot runs consensus.
+    """
+    start = time.perf_counter()
+    try:
+        # every lost race means another vote landed, so the image is full after a few rounds
+        for _ in range(ANNOTATIONS_PER_IMAGE + 1):
+            image = Image.objects.get(id=image_id)
+            if image.status == 'completed' or image.assigned_count >= ANNOTATIONS_PER_IMAGE:
+                return {'error': 'Task completed'}, 400
+
+            options = image.label_options
+            code = options.code_of(label)
+            if code is None:
+                return {'error': f'Invalid label. Must be one of: {", ".join(options.labels)}'}, 400
+
+            seen = image.assigned_count
+            image.assigned_count += 1
+            image.record_vote(code)
+            claim_start = time.perf_counter()
+            with transaction.atomic():
+                claimed = Image.objects.filter(id=image.id, status='active', assigned_count=seen)\
+                    .update(assigned_count=F('assigned_count') + 1, vote_counts=image.vote_counts)
+                metrics.LOCK_WAIT_SECONDS.observe(time.perf_counter() - claim_start, 'submit')
+                if claimed:
+                    # after the UPDATE, so the foreign key check runs under our own row lock;
+                    # IntegrityError on a second vote by the same user rolls the slot back
+                    Annotation.objects.create(user=user, image=image, label=code)
+                    decisions = {}
+                    if image.assigned_count >= ANNOTATIONS_PER_IMAGE:
+                        agreed = close_image(image)
+                        image.save(update_fields=['status', 'review_status', 'final_label', 'reviewed_at'])
+                        if agreed is not None:
+                            decisions[image.id] = agreed
+                    mark_votes(decisions, {user.id: {'total_count': 1}})
+                    response_cache.invalidate_rows('active', [image.id])
+                    transaction.on_commit(lambda: dispatcher.record_annotation(user.id, image.id, image.assigned_count))
+            if claimed:
+                break
+            metrics.SUBMIT_RETRIES.inc()
+        else:
+            return {'error': 'Task is busy, try again'}, 409
+        metrics.SUBMIT_SECONDS.observe(time.perf_counter() - start, 'optimistic')
+        metrics.ANNOTATIONS.inc('optimistic')
+        logger.info(f'User {user.username} submitted annotation for image {image_id}')
+        return {'status': 'success'}, 200
+    except Image.DoesNotExist:
+        return {'error': 'Image not found'}, 404
+    except IntegrityError:
+        return {'error': 'Already annotated'}, 400
     except Exception as e:
+        count_lock_error('submit', e)
         logger.error(f'Error in submit_annotation: {str(e)}', exc_info=True)
+        return {'error': 'Internal server error'}, 500
+
+@api_view(['POST'])
+@csrf_exempt
+@authentication_classes([CsrfExemptSessionAuthentication])
+def submit_annotations_bulk(request):
+    """Submit many annotations in one transaction, results per item"""
+    user = request.user
+    items = request.data.get('items') if isinstance(request.data, dict) else request.data
+    max_n = getattr(settings, 'TASK_BATCH_MAX', 50)
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'items must be a non-empty list'}, status=400)
+    if len(items) > max_n:
+        return Response({'error': f'At most {max_n} items per request'}, status=400)
+
+    results = [None] * len(items)
+    wanted = {}  # image_id -> (index, label)
+    for i, item in enumerate(items):
+        image_id = item.get('image_id') if isinstance(item, dict) else None
+        label = item.get('label') if isinstance(item, dict) else None
+        if not image_id or not label:
+            results[i] = {'status': 'error', 'error': 'image_id and label are required'}
+            continue
+        try:
+            image_id = int(image_id)
+        except (ValueError, TypeError):
+            results[i] = {'status': 'error', 'error': 'Invalid image_id'}
+            continue
+        if image_id in wanted:
+            results[i] = {'image_id': image_id, 'status': 'error', 'error': 'Duplicate image_id in batch'}
+            continue
+        wanted[image_id] = (i, label)
+
+    start = time.perf_counter()
+    try:
+        with transaction.atomic():
+            # lock rows in id order so concurrent batches cannot deadlock
+            images = {img.id: img for img in Image.objects.select_for_update().filter(id__in=wanted).order_by('id')}
+            metrics.LOCK_WAIT_SECONDS.observe(time.perf_counter() - start, 'bulk_submit')
+            done = set(Annotation.objects.filter(user=user, image_id__in=images).values_list('image_id', flat=True))
+
+            accepted = []
+            for image_id, (i, label) in wanted.items():
+                image = images.get(image_id)
+                error = None
+                if image is None:
+                    error = 'Image not found'
+                elif image.status == 'completed':
+                    error = 'Task completed'
+                elif image_id in done:
+                    error = 'Already annotated'
+                else:
+                    options = image.label_options
+                    code = options.code_of(label)
+                    if code is None:
+                        error = f'Invalid label. Must be one of: {", ".join(options.labels)}'
+                if error:
+                    results[i] = {'image_id': image_id, 'status': 'error', 'error': error}
+                    continue
+                accepted.append(Annotation(user=user, image=image, label=code))
+                image.assigned_count += 1
+                image.record_vote(code)
+                results[i] = {'image_id': image_id, 'status': 'success'}
+
+            if accepted:
+                accepted_ids = [a.image_id for a in accepted]
+                Annotation.objects.bulk_create(accepted)
+                Image.objects.filter(id__in=accepted_ids).update(assigned_count=models.F('assigned_count') + 1)
+                Image.objects.bulk_update([images[i] for i in accepted_ids], ['vote_counts'])
+
+                # consensus once per image that just got its last vote
+                full = [images[i] for i in accepted_ids if images[i].assigned_count >= ANNOTATIONS_PER_IMAGE]
+                decisions = {}
+                if full:
+                    decisions = {img.id: code for img in full if (code := close_image(img)) is not None}
+                    Image.objects.bulk_update(full, ['status', 'review_status', 'final_label', 'reviewed_at'])
+                mark_votes(decisions, {user.id: {'total_count': len(accepted)}})
+
+                response_cache.invalidate_rows('active', accepted_ids)
+                counts = {i: images[i].assigned_count for i in accepted_ids}
+                transaction.on_commit(lambda: [dispatcher.record_annotation(user.id, i, c) for i, c in counts.items()])
+        metrics.SUBMIT_SECONDS.observe(time.perf_counter() - start, 'bulk')
+        metrics.ANNOTATIONS.inc('bulk', amount=len(accepted))
+        logger.info(f'User {user.username} bulk submitted {len(accepted)}/{len(items)} annotations')
+        return Response({'results': results})
+    except IntegrityError as e:
+        logger.error(f'Integrity error in submit_annotations_bulk: {str(e)}')
+        return Response({'error': 'Database integrity error'}, status=400)
+    except Exception as e:
+        count_lock_error('bulk_submit', e)
+        logger.error(f'Error in submit_annotations_bulk: {str(e)}', exc_info=True)
         return Response({'error': 'Internal server error'}, status=500)
 
 @api_view(['GET'])
 def get_user_stats(request):
     """Get user statistics"""
     user = request.user
-    # pending balance: correct but not paid yet
-    pending = Annotation.objects.filter(user=user, is_correct=True, payment__isnull=True)\
-        .aggregate(total=Sum('image__bounty'))['total'] or 0
-    
-    # accuracy: only count judged annotations
-    judged = Annotation.objects.filter(user=user, is_correct__isnull=False)
-    total = judged.count()
-    correct = judged.filter(is_correct=True).count()
-    acc = (correct / total) if total > 0 else 1.0
 
-    return Response({
-        'pendingBalance': pending,
+    def compute():
+        row = UserStats.objects.filter(user=user).first()
+        if row is None:
+            stats.rebuild([user.id])
+            row = UserStats.objects.get(user=user)
+        return stats_summary(row)
+    return Response(response_cache.get_or_compute(f'stats:{user.id}', 'summary', compute))
+
+def stats_summary(row):
+    """Stats payload from a UserStats row"""
+    # accuracy: only count judged annotations
+    acc = (row.correct_count / row.judged_count) if row.judged_count > 0 else 1.0
+    return {
+        'pendingBalance': row.pending_balance,
         'accuracy': acc,
-        'totalAnnotated': Annotation.objects.filter(user=user).count(),
-        'correctCount': correct
-    })
+        'totalAnnotated': row.total_count,
+        'correctCount': row.correct_count
+    }
 
 @api_view(['GET'])
 def get_user_history(request):
-    """Get user annotation history"""
-    anns = Annotation.objects.filter(user=request.user).order_by('-created_at')
-    return Response(AnnotationSerializer(anns, many=True).data)
+    """Get user annotation history, newest first, one page per call"""
+    full = request.query_params.get('fields') == 'full'
+    # label set id rides along so label codes decode without loading images
+    anns = Annotation.objects.filter(user=request.user).annotate(label_set_id=F('image__label_set_id'))
+    if not full:
+        # compact projection: plain dicts, no model instances
+        anns = anns.values('id', 'image_id', 'label', 'label_set_id', 'is_correct', 'payment_id', 'created_at')
+    try:
+        limit = parse_limit(request.query_params.get('limit'))
+        rows, next_cursor = keyset_page(anns, HISTORY_ORDERING, request.query_params.get('cursor'), limit)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    if full:
+        rows = AnnotationSerializer(rows, many=True).data
+    else:
+        # same timestamp format (and time zone) as the full rows
+        created_at = AnnotationSerializer().fields['created_at'].to_representation
+        for row in rows:
+            row['created_at'] = created_at(row['created_at'])
+            row['image'] = row.pop('image_id')
+            row['payment'] = row.pop('payment_id')
+            row['submitted_label'] = LabelSet.cached(row.pop('label_set_id')).label_of(row['label'])
+    return Response({'results': rows, 'next_cursor': next_cursor})
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@csrf_exempt
+@authentication_classes([CsrfExemptSessionAuthentication])
+def import_tasks(request):
+    """Bulk import tasks from an uploaded CSV or JSONL file"""
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({'error': 'file is required'}, status=400)
+    fmt = request.data.get('format') or importers.guess_format(upload.name)
+    if fmt not in importers.FORMATS:
+        return Response({'error': f'format must be one of: {", ".join(importers.FORMATS)}'}, status=400)
+
+    try:
+        report = importers.import_tasks(importers.iter_rows(upload.file, fmt))
+    except UnicodeDecodeError:
+        return Response({'error': 'File must be UTF-8'}, status=400)
+    except Exception as e:
+        logger.error(f'Error in import_tasks: {str(e)}', exc_info=True)
+        return Response({'error': 'Failed to import tasks'}, status=500)
+    logger.info(f"Admin {request.user.username} imported {report['created']} tasks ({report['failed']} rejected)")
+    report['errors'] = report['errors'][:100]
+    return Response(report)
+
+@api_view(['GET'])
+def get_blob(request, digest):
+    """Stream a stored image (immutable, ETag and Range aware)"""
+    try:
+        path = blobstore.path_for(digest)
+    except ValueError:
+        return Response({'error': 'Invalid blob id'}, status=400)
+    if not os.path.exists(path):
+        return Response({'error': 'Image not found'}, status=404)
+
+    etag = f'"{digest}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'private, max-age=31536000, immutable',  # content never changes
+        'Accept-Ranges': 'bytes',
+    }
+    if etag in request.headers.get('If-None-Match', ''):
+        return HttpResponse(status=304, headers=headers)
+
+    size = os.path.getsize(path)
+    content_type = blobstore.content_type(path)
+    byte_range = _parse_range(request.headers.get('Range'), size)
+    if byte_range is False:
+        return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+    if byte_range:
+        start, end = byte_range
+        resp = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type,
+                                     headers={**headers, 'Content-Range': f'bytes {start}-{end}/{size}'})
+        resp['Content-Length'] = end - start + 1
+        return resp
+    return FileResponse(open(path, 'rb'), content_type=content_type, headers=headers)
+
+def _parse_range(header, size):
+    """(start, end) for a single 'bytes=' range, None to send everything, False if it starts past the end"""
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', (header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None  # absent, malformed or multi-range: full body
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        return None  # invalid range: ignore the header
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1  # suffix range
+    if start >= size:
+        return False
+    return start, end
+
+def _read_range(path, start, end, chunk_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
 
 # ===== Admin APIs =====
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def get_review_queue(request):
-    """Get tasks that need manual review"""
-    tasks = Image.objects.filter(review_status='pending')
-    return Response(ImageSerializer(tasks, many=True).data)
+    """Get tasks that need manual review with their vote breakdown, oldest first by default"""
+    # every queued image has all its votes, so assigned_count is not a useful sort here
+    return _image_page(request, 'reviews', Image.objects.filter(review_status='pending'),
+                       ('created_at', 'bounty'), with_votes=True)
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def get_all_active_tasks(request):
-    """Get all active tasks"""
-    tasks = Image.objects.filter(status='active')
-    return Response(ImageSerializer(tasks, many=True).data)
+    """Get active tasks, one page per call"""
+    # votes only stale the pages showing the voted images (see _image_page)
+    return _image_page(request, 'active', Image.objects.filter(status='active'),
+                       ('created_at', 'bounty', 'assigned_count'), per_row=True)
+
+def _image_page(request, namespace, tasks, sorts, with_votes=False, per_row=False):
+    """Filter, sort and keyset-paginate an admin image listing (cached per query string).
+
+    per_row: writes to the listed images go through response_cache.invalidate_rows(namespace, ids)
+    and only stale the pages showing them; adding images still invalidates the namespace.
+    """
+    params = request.query_params
+    filters = {
+        'bounty__gte': params.get('min_bounty'),
+        'bounty__lte': params.get('max_bounty'),
+        'assigned_count__gte': params.get('min_assigned'),
+        'assigned_count__lte': params.get('max_assigned'),
+        'label_set_id': params.get('label_set'),
+        'created_at__gte': params.get('created_after'),
+        'created_at__lt': params.get('created_before'),
+    }
+
+    def compute():
+        queryset = tasks.filter(**{k: v for k, v in filters.items() if v not in (None, '')})
+        ordering = parse_sort(params.get('sort'), sorts, sorts[0])
+        limit = parse_limit(params.get('limit'))
+        rows, next_cursor = keyset_page(queryset.only(*IMAGE_LIST_COLUMNS), ordering, params.get('cursor'), limit)
+        results = list(ImageListSerializer(rows, many=True, context={'request': request}).data)
+        if with_votes:
+            breakdown = _vote_breakdown(rows)
+            for item in results:
+                item['votes'] = breakdown.get(item['id'], [])
+        return {'results': results, 'next_cursor': next_cursor}
+
+    try:
+        # absolute image urls depend on the host
+        key_parts = [request.get_host(), sorted(params.items())]
+        if not per_row:
+            return Response(response_cache.get_or_compute(namespace, response_cache.make_key(*key_parts), compute))
+        # a vote on an image outside the page can still move it into a page sorted or filtered by count
+        if 'assigned_count' in (params.get('sort') or '') or params.get('min_assigned') or params.get('max_assigned'):
+            key_parts.append(response_cache.row_sequence(namespace))
+        return Response(response_cache.get_or_compute(namespace, response_cache.make_key(*key_parts), compute,
+                                                      rows=lambda page: [item['id'] for item in page['results']]))
+    except (ValueError, ValidationError) as e:
+        message = e.messages[0] if isinstance(e, ValidationError) else str(e)
+        return Response({'error': message}, status=400)
+
+def _vote_breakdown(images):
+    """{image_id: [{label, count, annotators}]} for a page of images, in one query"""
+    by_image = {img.id: {} for img in images}
+    options = {img.id: img.label_options for img in images}
+    rows = Annotation.objects.filter(image_id__in=by_image).values_list('image_id', 'label', 'user_id')\
+        .order_by('image_id', 'label', 'user_id')
+    for image_id, code, user_id in rows:
+        by_image[image_id].setdefault(code, []).append(user_id)
+    return {
+        image_id: sorted(
+            ({'label': options[image_id].label_of(code), 'count': len(users), 'annotators': users}
+             for code, users in votes.items()),
+            key=lambda vote: -vote['count'],
+        )
+        for image_id, votes in by_image.items()
+    }
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 @csrf_exempt
 @authentication_classes([CsrfExemptSessionAuthentication])
 def add_task(request):
-    """Add a new task"""
+    """Add a new task (url may be a link, base64/data URI, or an uploaded file)"""
     url = request.data.get('url')
+    upload = request.FILES.get('file')
     categories = request.data.get('categories')
     bounty = request.data.get('bounty')
     
     # validate input
-    if not url or not categories:
-        return Response({'error': 'url and categories are required'}, status=400)
-    
-    if not isinstance(url, str) or len(url.strip()) == 0:
-        return Response({'error': 'Invalid url'}, status=400)
-    
-    if not isinstance(categories, str) or len(categories.strip()) == 0:
-        return Response({'error': 'Invalid categories'}, status=400)
-    
-    # validate bounty
     try:
-        bounty = Decimal(str(bounty)) if bounty is not None else Decimal('0.50')
-        if bounty < 0:
-            return Response({'error': 'Bounty must be non-negative'}, status=400)
-        if bounty > 1000:
-            return Response({'error': 'Bounty too large (max 1000)'}, status=400)
-    except (ValueError, InvalidOperation, TypeError):
-        return Response({'error': 'Invalid bounty value'}, status=400)
+        url, categories, bounty = importers.validate_task(url, categories, bounty, has_upload=bool(upload))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
     
     try:
-        Image.objects.create(
-            image_url=url.strip(),
-            category_options=categories.strip(),
+        # keep image bytes out of the row: store them and save a short reference
+        if upload:
+            url = blobstore.REF_PREFIX + blobstore.store_stream(upload.chunks())
+        else:
+            url = blobstore.to_reference(url)
+        img = Image.objects.create(
+            image_url=url,
+            label_set=LabelSet.intern(categories),
             bounty=bounty
         )
+        dispatcher.add_image(img.id)
+        response_cache.invalidate('active')
         logger.info(f'Admin {request.user.username} created new task with bounty {bounty}')
         return Response({'status': 'created'})
     except Exception as e:
@@ -248,21 +622,28 @@ def resolve_conflict(request):
     
     try:
         with transaction.atomic():
-            img = Image.objects.get(id=img_id)
+            # lock the row: a second resolve (double click, another admin) waits and sees this one
+            img = Image.objects.select_for_update().get(id=img_id)
             
             # check if label is valid
-            valid_labels = [opt.strip() for opt in img.category_options.split(',')]
-            if true_label not in valid_labels:
-                return Response({'error': f'Invalid label. Must be one of: {", ".join(valid_labels)}'}, status=400)
+            options = img.label_options
+            code = options.code_of(true_label)
+            if code is None:
+                return Response({'error': f'Invalid label. Must be one of: {", ".join(options.labels)}'}, status=400)
+            
+            if img.review_status == 'reviewed' and img.final_label == true_label:
+                return Response({'status': 'resolved'})  # already done, counters stay as they are
             
             img.final_label = true_label
             img.review_status = 'reviewed'
-            img.save()
+            img.reviewed_at = timezone.now()
+            img.save(update_fields=['final_label', 'review_status', 'reviewed_at'])
+            response_cache.invalidate('reviews')
             
-            # mark annotations as correct or wrong
-            Annotation.objects.filter(image=img, submitted_label=true_label).update(is_correct=True)
-            Annotation.objects.filter(image=img).exclude(submitted_label=true_label).update(is_correct=False)
+            # mark annotations as correct or wrong in one statement
+            mark_votes({img.id: code})
         
+        metrics.CONFLICTS_RESOLVED.inc('single')
         logger.info(f'Admin {request.user.username} resolved conflict for image {img_id} with label: {true_label}')
         return Response({'status': 'resolved'})
     except Image.DoesNotExist:
@@ -271,57 +652,186 @@ def resolve_conflict(request):
         logger.error(f'Error in resolve_conflict: {str(e)}', exc_info=True)
         return Response({'error': 'Failed to resolve conflict'}, status=500)
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@csrf_exempt
+@authentication_classes([CsrfExemptSessionAuthentication])
+def resolve_conflicts_bulk(request):
+    """Resolve many conflicts in one transaction, results per item"""
+    items = request.data.get('items') if isinstance(request.data, dict) else request.data
+    max_n = getattr(settings, 'RESOLVE_BATCH_MAX', 5000)
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'items must be a non-empty list'}, status=400)
+    if len(items) > max_n:
+        return Response({'error': f'At most {max_n} items per request'}, status=400)
+
+    results = [None] * len(items)
+    wanted = {}  # image_id -> (index, true_label)
+    for i, item in enumerate(items):
+        img_id = item.get('image_id') if isinstance(item, dict) else None
+        true_label = item.get('true_label') if isinstance(item, dict) else None
+        if not img_id or not true_label:
+            results[i] = {'status': 'error', 'error': 'image_id and true_label are required'}
+            continue
+        try:
+            img_id = int(img_id)
+        except (ValueError, TypeError):
+            results[i] = {'status': 'error', 'error': 'Invalid image_id'}
+            continue
+        if img_id in wanted:
+            results[i] = {'image_id': img_id, 'status': 'error', 'error': 'Duplicate image_id in batch'}
+            continue
+        wanted[img_id] = (i, true_label)
+
+    start = time.perf_counter()
+    try:
+        with transaction.atomic():
+            # lock in id order so this cannot deadlock with submits on the same images
+            locked = {img_id: rest for img_id, *rest in Image.objects.select_for_update().filter(id__in=wanted)
+                      .order_by('id').values_list('id', 'label_set_id', 'review_status', 'final_label')}
+            metrics.LOCK_WAIT_SECONDS.observe(time.perf_counter() - start, 'bulk_resolve')
+            resolutions = {}
+            for img_id, (i, true_label) in wanted.items():
+                if img_id not in locked:
+                    results[i] = {'image_id': img_id, 'status': 'error', 'error': 'Image not found'}
+                    continue
+                label_set_id, review_status, final_label = locked[img_id]
+                if review_status == 'reviewed' and final_label == true_label:
+                    results[i] = {'image_id': img_id, 'status': 'resolved'}  # already done
+                    continue
+                options = LabelSet.cached(label_set_id)
+                code = options.code_of(true_label)
+                if code is None:
+                    error = f'Invalid label. Must be one of: {", ".join(options.labels)}'
+                    results[i] = {'image_id': img_id, 'status': 'error', 'error': error}
+                    continue
+                resolutions[img_id] = (code, true_label)
+                results[i] = {'image_id': img_id, 'status': 'resolved'}
+            resolve_images(resolutions)
+        metrics.CONFLICTS_RESOLVED.inc('bulk', amount=len(resolutions))
+        logger.info(f'Admin {request.user.username} bulk resolved {len(resolutions)}/{len(items)} conflicts')
+        return Response({'resolved': len(resolutions), 'results': results})
+    except Exception as e:
+        count_lock_error('bulk_resolve', e)
+        logger.error(f'Error in resolve_conflicts_bulk: {str(e)}', exc_info=True)
+        return Response({'error': 'Failed to resolve conflicts'}, status=500)
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def get_unpaid_users(request):
     """Get list of users with unpaid balance"""
-    unpaid_data = Annotation.objects.filter(
-        is_correct=True, 
-        payment__isnull=True
-    ).values('user__id', 'user__username').annotate(
-        total_amount=Sum('image__bounty')
-    ).filter(total_amount__gt=0)
-    
-    data = [
-        {
-            'userId': item['user__id'],
-            'username': item['user__username'],
-            'amount': item['total_amount']
-        }
-        for item in unpaid_data
-    ]
+    def compute():
+        unpaid_data = Annotation.objects.filter(
+            is_correct=True, 
+            payment__isnull=True
+        ).values('user__id', 'user__username').annotate(
+            total_amount=Sum('image__bounty')
+        ).filter(total_amount__gt=0)
+
+        return [
+            {
+                'userId': item['user__id'],
+                'username': item['user__username'],
+                'amount': item['total_amount']
+            }
+            for item in unpaid_data
+        ]
     
-    return Response(data)
+    return Response(response_cache.get_or_compute('unpaid', 'all', compute))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_cache_stats(request):
+    """Response cache hit / miss counters of this server process"""
+    return Response(response_cache.stats())
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_query_metrics(request):
+    """Per-endpoint latency, DB time and query counts of this server process (?reset=1 clears them)"""
+    result = query_metrics.snapshot()
+    if request.query_params.get('reset') == '1':
+        query_metrics.reset()
+    return Response(result)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_labels(request):
+    """Stream reviewed labels (?votes=1 for every vote) as JSONL, CSV or Parquet; X-Export-Watermark marks the end"""
+    params = request.query_params
+    fmt = params.get('type', 'jsonl')  # not ?format=, which DRF keeps for renderer selection
+    try:
+        chunks, watermark = exporters.export_labels(
+            fmt, exporters.parse_time(params.get('since'), 'since'), exporters.parse_time(params.get('until'), 'until'),
+            votes=params.get('votes') == '1',
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    response = StreamingHttpResponse(chunks, content_type=exporters.CONTENT_TYPES[fmt])
+    kind = 'votes' if params.get('votes') == '1' else 'labels'
+    response['Content-Disposition'] = f'attachment; filename="{kind}-{watermark:%Y%m%dT%H%M%SZ}.{fmt}"'
+    response['X-Export-Watermark'] = watermark.isoformat()
+    logger.info(f'Admin {request.user.username} exported {kind} as {fmt} up to {watermark.isoformat()}')
+    return response
+
+@api_view(['GET'])
+@permission_classes([CanScrapeMetrics])
+def get_metrics(request):
+    """Counters and histograms of this server process in the Prometheus text format"""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 @csrf_exempt
 @authentication_classes([CsrfExemptSessionAuthentication])
 def run_payroll(request):
-    """Process payments for all unpaid annotations"""
+    """Queue a payroll job for all unpaid annotations; poll /admin/jobs/<id>/ for its total"""
+    job = jobs.enqueue('payroll', user=request.user)
+    logger.info(f'Admin {request.user.username} queued payroll job {job.id}')
+    return Response({'job': JobSerializer(job, context={'request': request}).data}, status=202)
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUser])
+@csrf_exempt
+@authentication_classes([CsrfExemptSessionAuthentication])
+def job_list(request):
+    """Queue a background job ({kind, params}), or list jobs newest first (?status=, ?kind=)"""
+    if request.method == 'POST':
+        try:
+            job = jobs.enqueue(request.data.get('kind'), request.data.get('params'), user=request.user)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        logger.info(f'Admin {request.user.username} queued {job.kind} job {job.id}')
+        return Response(JobSerializer(job, context={'request': request}).data, status=202)
+
+    params = request.query_params
+    queryset = Job.objects.select_related('created_by')
+    for name in ('status', 'kind'):
+        if params.get(name):
+            queryset = queryset.filter(**{name: params[name]})
     try:
-        with transaction.atomic():
-            payable = Annotation.objects.filter(is_correct=True, payment__isnull=True).select_related('image', 'user')
-            if not payable.exists():
-                return Response({'total': 0})
-            
-            # calculate amount for each user
-            payouts = {}
-            for a in payable:
-                payouts[a.user.id] = payouts.get(a.user.id, Decimal(0)) + a.image.bounty
-                
-            total = Decimal(0)
-            for uid, amt in payouts.items():
-                pmt = Payment.objects.create(annotator_id=uid, amount=amt)
-                # mark as paid
-                Annotation.objects.filter(user_id=uid, is_correct=True, payment__isnull=True).update(payment=pmt)
-                # update wallet balance
-                User.objects.filter(id=uid).update(balance_wallet=models.F('balance_wallet') + amt)
-                total += amt
-                logger.info(f'Payment processed for user {uid}: ${amt}')
-            
-        logger.info(f'Admin {request.user.username} ran payroll: total ${total}')
-        return Response({'total': float(total)})
-    except Exception as e:
-        logger.error(f'Error in run_payroll: {str(e)}', exc_info=True)
-        return Response({'error': 'Failed to process payroll'}, status=500)
+        rows, next_cursor = keyset_page(queryset, JOB_ORDERING, params.get('cursor'), parse_limit(params.get('limit')))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    return Response({'results': JobSerializer(rows, many=True, context={'request': request}).data,
+                     'next_cursor': next_cursor})
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def job_detail(request, job_id):
+    """Status, progress and result of one background job"""
+    job = Job.objects.select_related('created_by').filter(id=job_id).first()
+    if job is None:
+        return Response({'error': 'Job not found'}, status=404)
+    return Response(JobSerializer(job, context={'request': request}).data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def job_download(request, job_id):
+    """File written by a finished export job"""
+    job = Job.objects.filter(id=job_id).first()
+    path = jobs.export_path(job) if job else None
+    if path is None:
+        return Response({'error': 'No export file for this job'}, status=404)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name,
+                        content_type=exporters.CONTENT_TYPES[job.result['format']])
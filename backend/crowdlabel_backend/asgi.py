@@ -0,0 +1,38 @@
+import os
+import asyncio
+import weakref
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowdlabel_backend.settings')
+
+
+class ConcurrencyLimit:
+    """Let at most ASGI_CONCURRENCY requests into Django at once, queue the rest.
+
+    Django runs sync middleware and every ORM call in a thread per request, so
+    without a cap 1000 waiting annotators mean 1000 threads and connections.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._slots = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(getattr(settings, 'ASGI_CONCURRENCY', 32))
+        async with slots:
+            return await self.app(scope, receive, send)
+
+
+application = ConcurrencyLimit(get_asgi_application())
+
+# background jobs also run next to the requests when the deployment opts in (JOB_WORKERS_IN_PROCESS)
+if settings.JOB_WORKERS_IN_PROCESS:
+    from api import jobs
+    jobs.start_workers()
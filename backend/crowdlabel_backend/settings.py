@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -19,6 +20,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # must be first
+    'api.middleware.QueryMetricsMiddleware',  # wraps everything below, so it sees every statement
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,6 +49,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'crowdlabel_backend.wsgi.application'
+ASGI_APPLICATION = 'crowdlabel_backend.asgi.application'
 
 # Database
 DATABASES = {
@@ -60,7 +63,41 @@ DATABASES = {
     }
 }
 
+# Local stand-in for load tests and benchmarks: CROWDLABEL_DB=sqlite
+if os.environ.get('CROWDLABEL_DB') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('CROWDLABEL_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # take the write lock up front, like select_for_update on MySQL
+            'OPTIONS': {'timeout': 30, 'transaction_mode': 'IMMEDIATE'},
+        }
+    }
+
+# Response cache: bounded in-process LRU by default, shared Redis with CROWDLABEL_REDIS_URL
+# (Redis needs the redis package and should run with maxmemory-policy allkeys-lru)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crowdlabel',
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 10},
+    }
+}
+if os.environ.get('CROWDLABEL_REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['CROWDLABEL_REDIS_URL'],
+    }
+
 AUTH_PASSWORD_VALIDATORS = []
+
+# Fixture datasets only (scripts/generate_test_data.py --fast-hasher): MD5 keeps bulk users and their logins cheap
+if os.environ.get('CROWDLABEL_FAST_HASHER'):
+    PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ]
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -89,3 +126,73 @@ CSRF_TRUSTED_ORIGINS = [
     'http://localhost:5173',
     'http://127.0.0.1:5173',
 ]
+
+# Task dispatcher: rebuild in-memory ready-queues every N seconds
+TASK_DISPATCH_REFRESH_SECONDS = 30
+# Order within the fullest buckets: fullest (queue order) | random (among the first TOP_K eligible)
+# | shard (user_id % SHARDS slice of the images first); random and shard spread concurrent writers over more rows
+TASK_DISPATCH_MODE = 'fullest'
+TASK_DISPATCH_TOP_K = 32
+TASK_DISPATCH_SHARDS = 16
+# Users whose annotated-image sets stay in memory per process (least recently active ones are dropped)
+TASK_DISPATCH_SEEN_USERS = 10000
+
+# Task leases: each open slot is reserved for one annotator for N seconds
+TASK_LEASES_ENABLED = True
+TASK_LEASE_SECONDS = 300
+TASK_BATCH_MAX = 50
+
+# Single vote submit: locking (SELECT ... FOR UPDATE on the image, then checks and writes) | optimistic
+# (checks on a plain read, one compare-and-set UPDATE claims the slot, unique (user, image) catches duplicates)
+SUBMIT_MODE = os.environ.get('CROWDLABEL_SUBMIT_MODE', 'locking')
+
+# Consensus: unanimity | majority | weighted (dawid-skene runs via manage.py rescore_consensus)
+CONSENSUS_STRATEGY = 'unanimity'
+CONSENSUS_MAJORITY_K = 4
+CONSENSUS_WEIGHT_THRESHOLD = 0.7
+CONSENSUS_DS_THRESHOLD = 0.9
+
+# Payroll: users paid per transaction (0 = all in one transaction)
+PAYROLL_CHUNK_SIZE = 500
+
+# Bulk conflict resolution: max items per request, images per CASE statement
+RESOLVE_BATCH_MAX = 5000
+RESOLVE_CHUNK_SIZE = 500
+
+# Content-addressed store for uploaded / inline base64 images
+BLOB_STORE_ROOT = BASE_DIR / 'blobs'
+
+# Cached responses of the read-heavy endpoints (invalidated by writes, timeout is a backstop)
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_TIMEOUT = 60
+
+# Per-request SQL metrics: Server-Timing header, a log line per request, GET /api/admin/queries/
+QUERY_METRICS_ENABLED = True
+QUERY_METRICS_WINDOW = 1000  # recent requests kept per endpoint
+QUERY_METRICS_SLOW_MS = 200  # DB time that logs a warning with the slowest statement
+
+# Prometheus scrape of GET /api/metrics/: admin session, or this bearer token when set
+METRICS_TOKEN = os.environ.get('CROWDLABEL_METRICS_TOKEN')
+
+# Async versions of auth/check, tasks/next, annotate and stats (api/async_views.py); only for ASGI servers,
+# turn on with CROWDLABEL_ASYNC_VIEWS=1
+ASYNC_VIEWS = os.environ.get('CROWDLABEL_ASYNC_VIEWS') == '1'
+# Requests inside Django at once per ASGI process; each holds a worker thread and a DB connection,
+# the rest wait as coroutines
+ASGI_CONCURRENCY = 32
+
+# Label export: the window ends this many seconds ago so reviews still committing are not skipped.
+# Must exceed the time from a review's reviewed_at to its commit; long writes (rescore, bulk resolve)
+# stamp reviewed_at last and log a warning when stamping alone takes half of this
+EXPORT_SETTLE_SECONDS = 30
+
+# Background jobs (api/jobs.py): queued in the database and run by `python manage.py run_jobs`;
+# CROWDLABEL_JOB_WORKERS_IN_PROCESS=1 also starts a thread pool in each web process
+JOB_WORKERS_IN_PROCESS = os.environ.get('CROWDLABEL_JOB_WORKERS_IN_PROCESS') == '1'
+JOB_WORKERS = 2  # threads per pool
+JOB_POLL_SECONDS = 2  # idle workers look for jobs queued by other processes this often
+JOB_HEARTBEAT_SECONDS = 30
+JOB_STALE_SECONDS = 300  # a running job without a heartbeat for this long is requeued
+JOB_MAX_ATTEMPTS = 3
+JOB_PROGRESS_SECONDS = 1  # min time between progress writes of a job
+EXPORT_ROOT = BASE_DIR / 'exports'  # files written by export jobs
@@ -1,8 +1,14 @@
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowdlabel_backend.settings')
 
 application = get_wsgi_application()
 
+# background jobs also run next to the requests when the deployment opts in (JOB_WORKERS_IN_PROCESS)
+if settings.JOB_WORKERS_IN_PROCESS:
+    from api import jobs
+    jobs.start_workers()
+
@@ -0,0 +1,306 @@
+"""
+ASGI vs WSGI Load Test
+Simulates many concurrent annotators (auth/check once, then tasks/next ->
+think -> annotate, with stats every few tasks) against the real WSGI
+application served by a fixed pool of worker threads, like gunicorn --threads,
+and against the ASGI application with the async views, like uvicorn. Both run
+in process on a throwaway SQLite database, each in its own subprocess, and
+report sustained requests per second and latency percentiles per endpoint.
+
+SQLite answers in microseconds, so --db-latency-ms adds a blocking delay to
+every statement to stand in for the round trip to MySQL. Statements inside
+transactions are not delayed: SQLite holds one write lock for the whole
+database, and stretching it would serialize submits in a way MySQL's row
+locks do not.
+Run: python backend/scripts/async_load_test.py [--annotators 1000] [--seconds 30] [--wsgi-threads 32]
+"""
+import os
+import io
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+import django
+
+# Setup Django on a local SQLite stand-in
+os.environ['CROWDLABEL_DB'] = 'sqlite'
+os.environ.setdefault('CROWDLABEL_SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'async_load_test.sqlite3'))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowdlabel_backend.settings')
+if '--serve' in sys.argv:
+    # decides which views urls.py routes to, so it has to be set before setup
+    os.environ['CROWDLABEL_ASYNC_VIEWS'] = '1' if sys.argv[sys.argv.index('--serve') + 1] == 'asgi' else '0'
+django.setup()
+
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.db.backends.signals import connection_created
+from api.models import User, Image, Annotation, UserStats, LabelSet
+
+ENDPOINTS = ('auth/check', 'tasks/next', 'annotate', 'stats')
+STATS_EVERY = 5  # the dashboard refreshes stats every few tasks
+
+
+def print_header(title):
+    print(f"\n{'=' * 78}")
+    print(f"  {title}")
+    print("=" * 78)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(1, math.ceil(pct / 100 * len(sorted_values))) - 1]
+
+
+# ===== Setup (parent process) =====
+
+def setup_database(image_count, annotator_count):
+    """Create schema, annotators, images and a login session per annotator; returns the session keys"""
+    call_command('migrate', verbosity=0)
+    User.objects.bulk_create(
+        [User(username=f'async_annotator{i}', password='!') for i in range(annotator_count)], batch_size=500
+    )
+    label_set = LabelSet.intern('Cat, Dog')
+    Image.objects.bulk_create(
+        [Image(image_url=f'load://{i}', label_set=label_set) for i in range(image_count)], batch_size=500
+    )
+    keys = []
+    for user in User.objects.filter(username__startswith='async_annotator').order_by('id'):
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        keys.append(session.session_key)
+    return keys
+
+
+def reset_data():
+    """Clear votes before a run"""
+    Annotation.objects.all().delete()
+    UserStats.objects.all().delete()
+    Image.objects.update(assigned_count=0, vote_counts=[], status='active', review_status='none', final_label=None,
+                         reviewed_at=None)
+
+
+# ===== Transports (child process) =====
+
+def _headers(session_key, body):
+    return {'cookie': f'{settings.SESSION_COOKIE_NAME}={session_key}', 'content-type': 'application/json',
+            'content-length': str(len(body)), 'host': 'localhost'}
+
+
+def wsgi_request(app, method, path, session_key, body=b''):
+    """One request through the WSGI handler, as a threaded WSGI server would make it"""
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1', 'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': True,
+        'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    for name, value in _headers(session_key, body).items():
+        key = name.upper().replace('-', '_')
+        environ[key if key in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{key}'] = value
+    status = []
+    result = app(environ, lambda line, headers, exc_info=None: status.append(line))
+    try:
+        content = b''.join(result)
+    finally:
+        result.close()  # request_finished: closes the connection like a real server
+    return int(status[0].split()[0]), content
+
+
+async def asgi_request(app, method, path, session_key, body=b''):
+    """One request through the ASGI handler, as an ASGI server would make it"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(name.encode(), value.encode()) for name, value in _headers(session_key, body).items()],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    done = asyncio.Event()
+    pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'status': None, 'body': []}
+
+    async def receive():
+        if pending:
+            return pending.pop()
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+            if not message.get('more_body'):
+                done.set()
+
+    await app(scope, receive, send)
+    return response['status'], b''.join(response['body'])
+
+
+# ===== Simulated annotators (child process) =====
+
+async def annotator(call, session_key, deadline, think_seconds, samples, counts):
+    """auth/check, then fetch, label, submit until time runs out"""
+    await asyncio.sleep(random.uniform(0, think_seconds))  # spread the first logins
+
+    async def timed(endpoint, method, body=None):
+        start = time.perf_counter()
+        try:
+            status, content = await call(method, f'/api/{endpoint}/', session_key,
+                                         json.dumps(body).encode() if body else b'')
+        except Exception:
+            counts['errors'] += 1
+            return None, None
+        samples[endpoint].append(time.perf_counter() - start)
+        if status >= 500:
+            counts['errors'] += 1
+        return status, content
+
+    await timed('auth/check', 'GET')
+    await timed('stats', 'GET')  # dashboard
+    done = 0
+    while time.perf_counter() < deadline:
+        status, content = await timed('tasks/next', 'GET')
+        if status != 200 or not content:
+            break
+        await asyncio.sleep(think_seconds)  # time spent looking at the image
+        status, _ = await timed('annotate', 'POST', {'image_id': json.loads(content)['id'], 'label': 'Dog'})
+        if status == 200:
+            counts['annotations'] += 1
+            done += 1
+        elif status is not None and status < 500:
+            counts['rejected'] += 1
+        if done and done % STATS_EVERY == 0:
+            await timed('stats', 'GET')
+
+
+async def drive(mode, session_keys, seconds, think_seconds, wsgi_threads):
+    if mode == 'asgi':
+        from crowdlabel_backend.asgi import application
+
+        async def call(method, path, session_key, body):
+            return await asgi_request(application, method, path, session_key, body)
+    else:
+        from crowdlabel_backend.wsgi import application
+        pool = ThreadPoolExecutor(max_workers=wsgi_threads)
+        loop = asyncio.get_running_loop()
+
+        async def call(method, path, session_key, body):
+            # requests queue for a free worker thread, as they would in the server's backlog
+            return await loop.run_in_executor(pool, wsgi_request, application, method, path, session_key, body)
+
+    samples = {endpoint: [] for endpoint in ENDPOINTS}
+    counts = {'annotations': 0, 'rejected': 0, 'errors': 0}
+    start = time.perf_counter()
+    await asyncio.gather(*[annotator(call, key, start + seconds, think_seconds, samples, counts)
+                           for key in session_keys])
+    elapsed = time.perf_counter() - start
+    if mode == 'wsgi':
+        pool.shutdown()
+    return samples, counts, elapsed
+
+
+def add_db_latency(seconds):
+    """Block every statement outside a transaction for the given time, like a network round trip"""
+    def delay(execute, sql, params, many, context):
+        if not context['connection'].in_atomic_block:
+            time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(connection, **kwargs):
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+    connection_created.connect(install, weak=False)
+
+
+def serve(mode, args):
+    """Child process: one run in one mode, result as JSON on stdout"""
+    logging.disable(logging.WARNING)  # rejected submits and per-request logs are expected
+    settings.QUERY_METRICS_ENABLED = False
+    if args.db_latency_ms:
+        add_db_latency(args.db_latency_ms / 1000)
+    with open(args.sessions) as f:
+        session_keys = json.load(f)[:args.annotators]
+    random.seed(args.seed)
+    reset_data()
+    samples, counts, elapsed = asyncio.run(
+        drive(mode, session_keys, args.seconds, args.think_ms / 1000, args.wsgi_threads)
+    )
+    requests = sum(len(values) for values in samples.values())
+    result = {'mode': mode, 'elapsed': elapsed, 'requests': requests, 'rps': requests / elapsed,
+              'annotations_per_s': counts['annotations'] / elapsed, **counts, 'endpoints': {}}
+    everything = sorted(value for values in samples.values() for value in values)
+    for endpoint, values in list(samples.items()) + [('all', everything)]:
+        values = sorted(values)
+        result['endpoints'][endpoint] = {
+            'n': len(values), **{p: percentile(values, n) * 1000 for p, n in (('p50', 50), ('p95', 95), ('p99', 99))}
+        }
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ASGI vs WSGI load test')
+    parser.add_argument('--annotators', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--think-ms', type=float, default=5000, help='simulated labeling time per image')
+    parser.add_argument('--wsgi-threads', type=int, default=32, help='worker threads of the WSGI server')
+    parser.add_argument('--db-latency-ms', type=float, default=1.0, help='added to every SQL statement')
+    parser.add_argument('--images', type=int, default=50000)
+    parser.add_argument('--modes', nargs='+', choices=('wsgi', 'asgi'), default=['wsgi', 'asgi'])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--serve', choices=('wsgi', 'asgi'), help=argparse.SUPPRESS)
+    parser.add_argument('--sessions', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, args)
+
+    print_header("CrowdLabel System - ASGI vs WSGI Load Test")
+    print(f"  Database: {os.environ['CROWDLABEL_SQLITE_PATH']}")
+    print(f"  {args.annotators} annotators, {args.think_ms:g}ms think time, {args.seconds:g}s per mode, "
+          f"+{args.db_latency_ms:g}ms per statement, WSGI pool of {args.wsgi_threads} threads")
+    sessions = os.path.join(os.path.dirname(os.environ['CROWDLABEL_SQLITE_PATH']), 'async_load_test.sessions.json')
+    with open(sessions, 'w') as f:
+        json.dump(setup_database(args.images, args.annotators), f)
+
+    results = []
+    for mode in args.modes:
+        command = [sys.executable, os.path.abspath(__file__), '--serve', mode, '--sessions', sessions]
+        for name in ('annotators', 'seconds', 'think_ms', 'wsgi_threads', 'db_latency_ms', 'seed'):
+            command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print("""
+  +------+----------+---------+--------+--------+----------+----------+----------+
+  | Mode | Requests |   req/s |  ann/s | Errors |  p50 ms  |  p95 ms  |  p99 ms  |
+  +------+----------+---------+--------+--------+----------+----------+----------+""")
+    for r in results:
+        total = r['endpoints']['all']
+        print(f"  | {r['mode']:<4} | {r['requests']:>8} | {r['rps']:>7.1f} | {r['annotations_per_s']:>6.1f} "
+              f"| {r['errors']:>6} | {total['p50']:>8.1f} | {total['p95']:>8.1f} | {total['p99']:>8.1f} |")
+    print("  +------+----------+---------+--------+--------+----------+----------+----------+")
+
+    print("\n  Per endpoint (p50 / p95 / p99 ms):")
+    for endpoint in ENDPOINTS:
+        cells = [f"{r['mode']} {r['endpoints'][endpoint]['p50']:.1f} / {r['endpoints'][endpoint]['p95']:.1f} / "
+                 f"{r['endpoints'][endpoint]['p99']:.1f}" for r in results]
+        print(f"    {endpoint:<11} " + '   '.join(f'{cell:<32}' for cell in cells))
+    print("\n  Latency is measured by the client, so it includes waiting for a free WSGI worker thread")
+
+
+if __name__ == '__main__':
+    main()
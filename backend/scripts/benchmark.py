@@ -0,0 +1,430 @@
+"""
+Benchmark Suite
+Seeds a throwaway SQLite database at a chosen scale, then times every API
+endpoint through the Django test client and the hot queries at ORM level.
+Reports p50/p95/p99 latency and queries per call, writes the results as
+JSON and flags regressions against a saved baseline.
+Run: python backend/scripts/benchmark.py --images 10000 [--output results.json]
+     python backend/scripts/benchmark.py --images 10000 --baseline results.json
+     python backend/scripts/benchmark.py --db /tmp/bench.sqlite3 --images 1000000   (seed once, reuse)
+"""
+import os
+import sys
+import io
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timezone
+import django
+
+# Setup Django on a local SQLite stand-in (no MySQL needed)
+os.environ['CROWDLABEL_DB'] = 'sqlite'
+if '--db' in sys.argv[:-1]:
+    os.environ['CROWDLABEL_SQLITE_PATH'] = sys.argv[sys.argv.index('--db') + 1]
+os.environ.setdefault('CROWDLABEL_SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3'))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowdlabel_backend.settings')
+django.setup()
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.test import Client
+from django.test.utils import setup_test_environment
+from api.models import User, Image, Annotation, UserStats, Job, ANNOTATIONS_PER_IMAGE
+from api.dispatch import TaskDispatcher, dispatcher
+from api.pagination import keyset_page
+from api import stats, blobstore, jobs
+import generate_test_data
+
+PASSWORD = 'bench123'
+
+
+def print_header(title):
+    print(f"\n{'=' * 78}")
+    print(f"  {title}")
+    print("=" * 78)
+
+
+# ===== Dataset =====
+
+def seed(images, annotators, complete_rate=0.6, dispute_rate=0.2, rng_seed=42):
+    """Insert a deterministic dataset with the test data generator"""
+    generate_test_data.generate(
+        images, max(annotators, ANNOTATIONS_PER_IMAGE),
+        admin=('bench_admin', PASSWORD), annotator=('bench_annotator', PASSWORD),
+        complete_rate=complete_rate, dispute_rate=dispute_rate, resolved_rate=0.5, seed=rng_seed,
+    )
+
+
+def dataset_info():
+    return {
+        'images': Image.objects.count(),
+        'annotations': Annotation.objects.count(),
+        'annotators': User.objects.filter(role='annotator').count(),
+        'pending_reviews': Image.objects.filter(review_status='pending').count(),
+    }
+
+
+# ===== Measurement =====
+
+class QueryCounter:
+    """Counts statements through connection.execute_wrapper (cheaper than CaptureQueriesContext)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Case:
+    """One benchmark: prepare(i) runs untimed and feeds run(prepared), which is timed"""
+
+    def __init__(self, name, kind, run, prepare=None, runs=None, note=None):
+        self.name, self.kind, self.run, self.prepare = name, kind, run, prepare
+        self.runs, self.note = runs, note
+
+    def measure(self, runs, warmup):
+        runs = self.runs or runs
+        timings, queries = [], []
+        counter = QueryCounter()
+        for i in range(warmup + runs):
+            prepared = self.prepare(i) if self.prepare else None
+            counter.count = 0
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                result = self.run(prepared)
+                elapsed = time.perf_counter() - start
+            status = getattr(result, 'status_code', 200)
+            if status >= 400:
+                raise RuntimeError(f'{self.name}: HTTP {status} {getattr(result, "content", b"")[:200]!r}')
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(counter.count)
+        timings.sort()
+        queries.sort()
+        result = {
+            'kind': self.kind,
+            'runs': runs,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': queries[len(queries) // 2],
+            'max_queries': queries[-1],
+        }
+        if self.note:
+            result['note'] = self.note
+        return result
+
+
+def logged_in(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def build_cases(runs, warmup):
+    """Endpoint cases for every view in api/views.py plus ORM-level cases"""
+    admin_user = User.objects.get(username='bench_admin')
+    annotators = list(User.objects.filter(role='annotator').order_by('id'))
+    # the annotator with the longest history is the worst case for dispatch and history
+    top = Annotation.objects.values('user_id').annotate(n=Count('id')).order_by('-n').first()
+    heavy = User.objects.get(id=top['user_id']) if top else annotators[0]
+    admin, heavy_client = logged_in(admin_user), logged_in(heavy)
+    clients = {}
+
+    def client_for(i):
+        user = annotators[i % len(annotators)]
+        if user.id not in clients:
+            clients[user.id] = logged_in(user)
+        return clients[user.id]
+
+    # a cursor 10 pages deep into the heavy user's history
+    cursor = None
+    for _ in range(10):
+        cursor = heavy_client.get('/api/history/', {'cursor': cursor} if cursor else {}).json()['next_cursor']
+        if not cursor:
+            break
+    deep = {'cursor': cursor} if cursor else {}
+
+    digest = blobstore.store_bytes(random.Random(7).randbytes(64 * 1024))
+    pending = list(Image.objects.filter(review_status='pending').order_by('id').values_list('id', flat=True))
+    import_csv = 'url,categories,bounty\n' + ''.join(
+        f'https://images.example.com/import/{i}.jpg,"Cat, Dog",0.5\n' for i in range(100))
+
+    def next_for(i):
+        client = client_for(i)
+        task = client.get('/api/tasks/next/').json()
+        if not task:
+            raise RuntimeError('dataset has no open tasks left; seed more images')
+        return client, task['id']
+
+    def batch_for(i):
+        client = client_for(i)
+        tasks = client.get('/api/tasks/batch/', {'n': 5}).json()['tasks']
+        return client, [{'image_id': t['id'], 'label': 'Dog'} for t in tasks]
+
+    def take_pending(n):
+        return [pending.pop() for _ in range(n)]
+
+    def claimed_job(kind, params=None):
+        """Queue a job and claim it like a worker would, ready for jobs.run"""
+        Job.objects.filter(status='queued').delete()  # left by the queueing cases
+        jobs.enqueue(kind, params)
+        return jobs.claim('benchmark')
+
+    def drained(response):
+        """Read a streamed response to the end, so the timing covers producing it"""
+        for _ in response.streaming_content:
+            pass
+        response.close()
+        return response
+
+    # a finished export for the job status / download cases
+    export_job = claimed_job('export', {'format': 'jsonl'})
+    jobs.run(export_job)
+
+    # pending reviews are used up by the resolve cases: half for single, half for bulk
+    single_runs = min(runs, len(pending) // 2 - warmup)
+    bulk_runs = min(10, (len(pending) - len(pending) // 2) // 20 - warmup)
+
+    def login(_):
+        return Client().post('/api/auth/login/', {'username': heavy.username, 'password': PASSWORD},
+                             content_type='application/json')
+
+    def fresh_session(_):
+        return logged_in(heavy)
+
+    hist_ordering = ('-created_at', '-id')
+    engine = TaskDispatcher(refresh_seconds=float('inf'))
+    engine.load()
+    engine.next_task(heavy.id)  # builds the seen set once
+
+    def legacy_next_task(user_id):
+        """Dispatch as it was done before the dispatcher (NOT IN + sort)"""
+        done_ids = Annotation.objects.filter(user_id=user_id).values_list('image_id', flat=True)
+        return Image.objects.filter(status='active', assigned_count__lt=ANNOTATIONS_PER_IMAGE)\
+            .exclude(id__in=done_ids).order_by('assigned_count').last()
+
+    json_post = {'content_type': 'application/json'}
+    return [
+        # read endpoints
+        Case('GET auth/check', 'endpoint', lambda _: heavy_client.get('/api/auth/check/')),
+        Case('GET tasks/next', 'endpoint', lambda _: heavy_client.get('/api/tasks/next/')),
+        Case('GET tasks/batch?n=10', 'endpoint', lambda _: heavy_client.get('/api/tasks/batch/', {'n': 10})),
+        Case('GET stats', 'endpoint', lambda _: heavy_client.get('/api/stats/')),
+        Case('GET history', 'endpoint', lambda _: heavy_client.get('/api/history/')),
+        Case('GET history (page 11)', 'endpoint', lambda _: heavy_client.get('/api/history/', deep)),
+        Case('GET history?fields=full', 'endpoint', lambda _: heavy_client.get('/api/history/', {'fields': 'full'})),
+        Case('GET tasks/active', 'endpoint', lambda _: admin.get('/api/tasks/active/')),
+        Case('GET tasks/active?sort=-bounty', 'endpoint', lambda _: admin.get('/api/tasks/active/', {'sort': '-bounty'})),
+        Case('GET admin/reviews', 'endpoint', lambda _: admin.get('/api/admin/reviews/')),
+        Case('GET admin/unpaid', 'endpoint', lambda _: admin.get('/api/admin/unpaid/')),
+        Case('GET admin/cache', 'endpoint', lambda _: admin.get('/api/admin/cache/')),
+        Case('GET admin/queries', 'endpoint', lambda _: admin.get('/api/admin/queries/')),
+        Case('GET metrics', 'endpoint', lambda _: admin.get('/api/metrics/')),
+        Case('GET admin/export (jsonl)', 'endpoint', lambda _: drained(admin.get('/api/admin/export/')), runs=10),
+        Case('GET admin/export?votes=1 (csv)', 'endpoint',
+             lambda _: drained(admin.get('/api/admin/export/', {'type': 'csv', 'votes': '1'})), runs=10),
+        Case('GET admin/jobs', 'endpoint', lambda _: admin.get('/api/admin/jobs/')),
+        Case('GET admin/jobs/<id>', 'endpoint', lambda _: admin.get(f'/api/admin/jobs/{export_job.id}/')),
+        Case('GET admin/jobs/<id>/download', 'endpoint',
+             lambda _: drained(admin.get(f'/api/admin/jobs/{export_job.id}/download/')), runs=10),
+        Case('GET blobs/<digest>', 'endpoint', lambda _: admin.get(f'/api/blobs/{digest}/')),
+        Case('POST auth/login', 'endpoint', login),
+        Case('POST auth/logout', 'endpoint', lambda c: c.post('/api/auth/logout/'), prepare=fresh_session),
+        # write endpoints (each run gets fresh input from the untimed prepare step)
+        Case('POST annotate', 'endpoint',
+             lambda p: p[0].post('/api/annotate/', {'image_id': p[1], 'label': 'Dog'}, **json_post),
+             prepare=next_for),
+        Case('POST annotate/bulk (5)', 'endpoint',
+             lambda p: p[0].post('/api/annotate/bulk/', {'items': p[1]}, **json_post), prepare=batch_for),
+        Case('POST admin/resolve', 'endpoint',
+             lambda ids: admin.post('/api/admin/resolve/', {'image_id': ids[0], 'true_label': 'Dog'}, **json_post),
+             prepare=lambda _: take_pending(1), runs=single_runs),
+        Case('POST admin/resolve/bulk (20)', 'endpoint',
+             lambda ids: admin.post('/api/admin/resolve/bulk/',
+                                    {'items': [{'image_id': i, 'true_label': 'Dog'} for i in ids]}, **json_post),
+             prepare=lambda _: take_pending(20), runs=bulk_runs),
+        Case('POST tasks/add', 'endpoint',
+             lambda _: admin.post('/api/tasks/add/', {'url': 'https://images.example.com/new.jpg',
+                                                       'categories': 'Cat, Dog', 'bounty': 0.5}, **json_post)),
+        Case('POST tasks/import (100 rows)', 'endpoint',
+             lambda f: admin.post('/api/tasks/import/', {'file': f}),
+             prepare=lambda i: _named_file(import_csv, f'import{i}.csv'), runs=10),
+        Case('POST admin/payroll (queue)', 'endpoint', lambda _: admin.post('/api/admin/payroll/'), runs=5),
+        Case('POST admin/jobs (export)', 'endpoint',
+             lambda _: admin.post('/api/admin/jobs/', {'kind': 'export', 'params': {'format': 'csv'}}, **json_post)),
+        # the jobs themselves, as a worker runs them
+        Case('job: payroll', 'orm', lambda job: jobs.run(job), prepare=lambda _: claimed_job('payroll'), runs=5,
+             note='the first run pays the whole backlog, later runs only what was judged since'),
+        Case('job: export (jsonl)', 'orm', lambda job: jobs.run(job),
+             prepare=lambda _: claimed_job('export', {'format': 'jsonl'}), runs=5),
+        Case('job: rescore (dry run)', 'orm', lambda job: jobs.run(job),
+             prepare=lambda _: claimed_job('rescore', {'dry_run': True}), runs=5),
+        # ORM level
+        Case('orm: dispatcher next_task', 'orm', lambda _: engine.next_task(heavy.id)),
+        Case('orm: legacy next_task query', 'orm', lambda _: legacy_next_task(heavy.id), runs=10),
+        Case('orm: history page', 'orm', lambda _: keyset_page(
+            Annotation.objects.filter(user=heavy).values('id', 'image_id', 'label', 'is_correct', 'created_at'),
+            hist_ordering)),
+        Case('orm: stats row', 'orm', lambda _: UserStats.objects.get(user=heavy)),
+        Case('orm: stats from annotations', 'orm', lambda _: stats.compute([heavy.id])),
+        Case('orm: unpaid aggregate', 'orm', lambda _: list(
+            Annotation.objects.filter(is_correct=True, payment__isnull=True)
+            .values('user_id').annotate(total=Sum('image__bounty')))),
+        Case('orm: active page by bounty', 'orm', lambda _: keyset_page(
+            Image.objects.filter(status='active'), ('-bounty', '-id'))),
+        Case('orm: review page', 'orm', lambda _: keyset_page(
+            Image.objects.filter(review_status='pending'), ('created_at', 'id'))),
+    ]
+
+
+def _named_file(text, name):
+    f = io.BytesIO(text.encode())
+    f.name = name
+    return f
+
+
+# ===== Reporting =====
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Mark each case against the baseline; returns the names that regressed"""
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            res['verdict'] = 'new'
+            continue
+        ratio = res['p50_ms'] / base['p50_ms'] if base['p50_ms'] else 1.0
+        res['baseline_p50_ms'] = base['p50_ms']
+        res['p50_ratio'] = round(ratio, 3)
+        slower = ratio > threshold and res['p50_ms'] - base['p50_ms'] > min_delta_ms
+        more_queries = res['queries'] > base['queries']
+        if slower or more_queries:
+            res['verdict'] = 'REGRESSION' + (' (queries)' if more_queries else '')
+            regressions.append(name)
+        elif ratio < 1 / threshold and base['p50_ms'] - res['p50_ms'] > min_delta_ms:
+            res['verdict'] = 'improved'
+        else:
+            res['verdict'] = 'ok'
+    return regressions
+
+
+def print_table(results, with_baseline):
+    header = f"  {'Case':<34} {'p50':>8} {'p95':>8} {'p99':>8} {'SQL':>4}"
+    if with_baseline:
+        header += f" {'base p50':>9} {'ratio':>6}  verdict"
+    print(header)
+    print('  ' + '-' * (len(header) - 2))
+    for name, r in results.items():
+        line = f"  {name:<34} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['queries']:>4}"
+        if with_baseline:
+            if 'baseline_p50_ms' in r:
+                line += f" {r['baseline_p50_ms']:>9.2f} {r['p50_ratio']:>6.2f}  {r['verdict']}"
+            else:
+                line += f" {'-':>9} {'-':>6}  {r['verdict']}"
+        print(line)
+    print("\n  Latency in ms; SQL = median statements per call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CrowdLabel endpoint / ORM benchmark suite (SQLite)')
+    parser.add_argument('--images', type=int, default=10_000, help='images to seed (1k .. 1M)')
+    parser.add_argument('--annotators', type=int, default=100)
+    parser.add_argument('--complete-rate', type=float, default=0.6, help='share of images with all votes')
+    parser.add_argument('--dispute-rate', type=float, default=0.2, help='share of complete images with a dissenting vote')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='SQLite file to seed once and reuse (default: a temp file)')
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--only', help='run cases whose name contains this text')
+    parser.add_argument('--with-cache', action='store_true', help='leave the response cache on')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='p50 ratio that counts as a regression')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='ignore differences below this')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    logging.disable(logging.WARNING)  # per-request logs would dominate the output
+    settings.RESPONSE_CACHE_ENABLED = args.with_cache
+    # the seeded reviews are seconds old: export them all, and keep export files out of the tree
+    settings.EXPORT_SETTLE_SECONDS = 0
+    settings.EXPORT_ROOT = tempfile.mkdtemp()
+
+    print_header("CrowdLabel System - Benchmark Suite")
+    print(f"  Database: {os.environ['CROWDLABEL_SQLITE_PATH']}")
+    call_command('migrate', verbosity=0)
+    if not User.objects.filter(username='bench_admin').exists():
+        with transaction.atomic():
+            seed(args.images, args.annotators, complete_rate=args.complete_rate,
+                 dispute_rate=args.dispute_rate, rng_seed=args.seed)
+    else:
+        print("  Reusing seeded database")
+    info = dataset_info()
+    print(f"  Dataset: {info['images']:,} images, {info['annotations']:,} annotations, "
+          f"{info['annotators']:,} annotators, {info['pending_reviews']:,} pending reviews")
+    dispatcher.reset()
+
+    results = {}
+    for case in build_cases(args.runs, args.warmup):
+        if args.only and args.only not in case.name:
+            continue
+        if case.runs is not None and case.runs < 1:
+            print(f"  skipped {case.name}: dataset too small")
+            continue
+        print(f"  running {case.name:<40}", end='\r')
+        results[case.name] = case.measure(args.runs, args.warmup)
+    print(' ' * 60, end='\r')
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)
+        if base.get('dataset') != info:
+            print(f"  Note: baseline dataset differs ({base.get('dataset')})")
+        regressions = compare(results, base.get('results', {}), args.threshold, args.min_delta_ms)
+
+    print_header(f"Results ({args.runs} runs, {args.warmup} warm-up)")
+    print_table(results, bool(args.baseline))
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'dataset': info,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': f'{connection.vendor} {connection.Database.sqlite_version}',
+            'response_cache': args.with_cache,
+        },
+        'settings': {'runs': args.runs, 'warmup': args.warmup},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n  Results written to {args.output}")
+    if regressions:
+        print(f"\n  {len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
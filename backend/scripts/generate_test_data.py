@@ -1,30 +1,45 @@
 """
 Test data generator
-Creates demo users, dog images, and annotations
+Creates demo users, dog images, annotations with disputes and payment history.
+Users and payments go in with chunked bulk_create, images and annotations
+with raw executemany; everything is derived from one seed, so the same
+arguments always give the same dataset.
+Run: python scripts/generate_test_data.py                                  (demo: 1000 images, 10 annotators)
+     python scripts/generate_test_data.py --images 2000000 --annotators 5000 --fast-hasher
 """
 import os
 import sys
-import django
+import json
+import time
 import random
+import argparse
+from datetime import timedelta
 from decimal import Decimal
+import django
+
+# Fixture users hashed with MD5 (see settings.PASSWORD_HASHERS); must be set before setup
+if '--fast-hasher' in sys.argv:
+    os.environ['CROWDLABEL_FAST_HASHER'] = '1'
 
 # Setup Django
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowdlabel_backend.settings')
 django.setup()
 
-from api.models import User, Image, Annotation, Payment
-from django.db import transaction
-
-RANDOM_SEED = 42
-random.seed(RANDOM_SEED)
+from api.models import User, Image, Annotation, Payment, LabelSet, ANNOTATIONS_PER_IMAGE
+from api import stats
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 DOG_URL_TEMPLATE = "https://placedog.net/640/480?random={}"
-TOTAL_IMAGES = 1000
-ANNOTATOR_COUNT = 10
-ANNOTATED_COUNT = 500
-DISPUTE_COUNT = 100
-RESOLVED_DISPUTE_COUNT = 80
+CHUNK_SIZE = 20_000
+PAYROLL_INTERVAL = timedelta(days=7)
+IMAGE_COLUMNS = ('id', 'image_url', 'label_set', 'bounty', 'assigned_count', 'vote_counts',
+                 'status', 'review_status', 'final_label', 'created_at', 'reviewed_at')
+ANNOTATION_COLUMNS = ('user', 'image', 'label', 'is_correct', 'payment', 'created_at')
 
 
 def clear_existing_data():
@@ -37,170 +52,206 @@ def clear_existing_data():
     print("  OK Cleared annotations, payments, images, and annotators")
 
 
-def create_test_users():
-    """Create admin and 10 annotators"""
-    print("Creating test users...")
+def _bulk_insert(model, rows, chunk_size):
+    """bulk_create rows and return their ids in order"""
+    floor = model.objects.aggregate(top=Max('id'))['top'] or 0
+    model.objects.bulk_create(rows, batch_size=chunk_size)
+    if all(row.pk for row in rows):
+        return [row.pk for row in rows]
+    # MySQL does not return ids from bulk_create; one writer, so they are the next ones in order
+    return list(model.objects.filter(id__gt=floor).order_by('id')
+                .values_list('id', flat=True)[:len(rows)])
+
 
-    admin, created = User.objects.get_or_create(
-        username='admin',
+def create_test_users(count, admin=('admin', 'admin123'), annotator=('annotator', '123'), chunk_size=CHUNK_SIZE):
+    """Create the admin and count annotators; each password is hashed once"""
+    print(f"Creating admin and {count:,} annotators...")
+    admin_name, admin_password = admin
+    admin_user, created = User.objects.get_or_create(
+        username=admin_name,
         defaults={
             'role': 'admin',
             'is_staff': True,
-            'is_superuser': True
+            'is_superuser': True,
+            'password': make_password(admin_password),
         }
     )
     if created:
-        admin.set_password('admin123')
-        admin.save()
-        print("  OK Created admin user: admin/admin123")
+        print(f"  OK Created admin user: {admin_name}/{admin_password}")
     else:
         print("  - Admin user already exists (password unchanged)")
 
-    annotators = []
-    for i in range(1, ANNOTATOR_COUNT + 1):
-        username = f'annotator{i}'
-        user, created = User.objects.get_or_create(
-            username=username,
-            defaults={'role': 'annotator'}
-        )
-        if created:
-            user.set_password('123')
-            user.save()
-            print(f"  OK Created annotator: {username}/123")
-        else:
-            print(f"  - Annotator {username} already exists (password unchanged)")
-        annotators.append(user)
-
-    return admin, annotators
-
-
-def generate_dog_image_urls(count: int):
-    """Build unique dog image URLs"""
-    return [DOG_URL_TEMPLATE.format(i) for i in range(1, count + 1)]
-
-
-def create_test_images():
-    """Create 1000 dog image tasks"""
-    print("\nCreating 1000 dog images...")
-    image_urls = generate_dog_image_urls(TOTAL_IMAGES)
-    images = []
-    for url in image_urls:
-        image = Image.objects.create(
-            image_url=url,
-            category_options="Cat, Dog",
-            bounty=Decimal("0.50"),
-            status='active',
-            review_status='none'
-        )
-        images.append(image)
-    print(f"  OK Created {len(images)} image tasks")
-    return images
-
-
-def _pick_annotation_count():
-    """Return uneven annotation count, prefer 5-8 to meet completion rule"""
-    return random.choice([5, 5, 5, 6, 6, 7, 7, 8])
-
+    prefix, password = annotator
+    password = make_password(password)  # shared hash, so 100k fixture users cost one hash
+    rows = [User(username=f'{prefix}{i}', password=password, role='annotator') for i in range(1, count + 1)]
+    user_ids = _bulk_insert(User, rows, chunk_size)
+    print(f"  OK Created annotators: {prefix}1-{count} / {annotator[1]}")
+    return admin_user, user_ids
+
+
+def _plan_votes(rng, label_count, complete_rate, dispute_rate, resolved_rate):
+    """Return (truth, votes, review_status) for one image"""
+    truth = rng.randrange(label_count)
+    complete = rng.random() < complete_rate
+    n = ANNOTATIONS_PER_IMAGE if complete else rng.randint(0, ANNOTATIONS_PER_IMAGE - 1)
+    votes = [truth] * n
+    if not complete:
+        return truth, votes, 'none'
+    if label_count < 2 or rng.random() >= dispute_rate:
+        return truth, votes, 'reviewed'  # unanimous, auto-approved
+    # a minority disagrees with the truth
+    others = [code for code in range(label_count) if code != truth]
+    for j in rng.sample(range(n), rng.randint(1, max(1, (n - 1) // 2))):
+        votes[j] = rng.choice(others)
+    return truth, votes, 'reviewed' if rng.random() < resolved_rate else 'pending'
+
+
+def _insert_rows(model, fields, rows):
+    """INSERT value tuples with executemany, skipping bulk_create's per-object model and field work"""
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    sql = f"INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({', '.join(['%s'] * len(fields))})"
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def create_test_images(user_ids, images=1000, categories='Cat, Dog',
+                       complete_rate=0.5, dispute_rate=0.2, resolved_rate=0.8, paid_rate=0.0,
+                       payroll_runs=3, seed=42, chunk_size=CHUNK_SIZE):
+    """Create image tasks with their annotations and past payments, chunk_size images per transaction"""
+    print(f"\nCreating {images:,} images with annotations...")
+    if len(user_ids) < ANNOTATIONS_PER_IMAGE:
+        raise ValueError(f'Need at least {ANNOTATIONS_PER_IMAGE} annotators for a completed image')
+    rng = random.Random(seed)
+    label_set = LabelSet.intern(categories)
+    label_count = len(label_set.labels)
+
+    # one payment per (annotator, past payroll run); amounts and dates are filled in at the end
+    payment_ids = {}
+    if paid_rate > 0 and payroll_runs > 0:
+        keys = [(uid, run) for uid in user_ids for run in range(payroll_runs)]
+        rows = [Payment(annotator_id=uid, amount=0) for uid, _ in keys]
+        payment_ids = dict(zip(keys, _bulk_insert(Payment, rows, chunk_size)))
+
+    # ids are assigned here so annotations can reference them without reading images back
+    next_id = (Image.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+    now = Image._meta.get_field('created_at').get_db_prep_value(timezone.now(), connection)
+    start = time.perf_counter()
+    totals = {'annotations': 0, 'pending': 0, 'paid': 0}
+    for offset in range(0, images, chunk_size):
+        image_rows, annotation_rows = [], []
+        for i in range(offset, min(offset + chunk_size, images)):
+            truth, votes, review_status = _plan_votes(rng, label_count, complete_rate, dispute_rate, resolved_rate)
+            image_id = next_id + i
+            counts = [votes.count(code) for code in range(label_count)] if votes else []
+            image_rows.append((
+                image_id, DOG_URL_TEMPLATE.format(i + 1), label_set.id,
+                Decimal(rng.randint(10, 200)) / 100, len(votes), json.dumps(counts),
+                'completed' if len(votes) >= ANNOTATIONS_PER_IMAGE else 'active', review_status,
+                label_set.labels[truth] if review_status == 'reviewed' else None, now,
+                now if review_status == 'reviewed' else None,
+            ))
+            totals['pending'] += review_status == 'pending'
+
+            judged = review_status == 'reviewed'
+            for uid, code in zip(rng.sample(user_ids, len(votes)), votes):
+                correct = code == truth if judged else None
+                payment_id = None
+                if correct and payment_ids and rng.random() < paid_rate:
+                    payment_id = payment_ids[uid, rng.randrange(payroll_runs)]
+                    totals['paid'] += 1
+                annotation_rows.append((uid, image_id, code, correct, payment_id, now))
+
+        annotation_rows.sort()  # by user, so the (user, image) index fills page by page
+        with transaction.atomic():
+            _insert_rows(Image, IMAGE_COLUMNS, image_rows)
+            _insert_rows(Annotation, ANNOTATION_COLUMNS, annotation_rows)
+        totals['annotations'] += len(annotation_rows)
+        print(f"  {offset + len(image_rows):>11,} images / {totals['annotations']:>12,} annotations "
+              f"({time.perf_counter() - start:.1f}s)", end='\r')
+    print(f"\n  OK Created {images:,} images and {totals['annotations']:,} annotations "
+          f"in {time.perf_counter() - start:.1f}s")
+    print(f"  OK Pending disputes: {totals['pending']:,}")
+
+    if payment_ids:
+        create_payment_history(payment_ids, payroll_runs, chunk_size)
+        print(f"  OK Paid annotations: {totals['paid']:,} over {payroll_runs} past payroll runs")
+    return totals
+
+
+def create_payment_history(payment_ids, payroll_runs, chunk_size=CHUNK_SIZE):
+    """Total, date and credit the pre-created payments; drop the ones nothing was linked to"""
+    now = timezone.now()
+    runs = {}
+    for (uid, run), pid in payment_ids.items():
+        runs.setdefault(run, []).append(pid)
+    linked = Annotation.objects.filter(payment_id=OuterRef('id')).order_by()\
+        .values('payment_id').annotate(total=Sum('image__bounty')).values('total')
+    paid = Payment.objects.filter(annotator_id=OuterRef('id')).order_by()\
+        .values('annotator_id').annotate(total=Sum('amount')).values('total')
+    with transaction.atomic():
+        for run, ids in runs.items():
+            for i in range(0, len(ids), chunk_size):
+                Payment.objects.filter(id__in=ids[i:i + chunk_size]).update(
+                    amount=Coalesce(Subquery(linked), Value(Decimal(0))),
+                    payment_date=now - PAYROLL_INTERVAL * (payroll_runs - run),
+                )
+        Payment.objects.filter(amount=0).delete()
+        User.objects.filter(role='annotator').update(balance_wallet=Coalesce(Subquery(paid), Value(Decimal(0))))
+
+
+def generate(images=1000, annotators=10, admin=('admin', 'admin123'), annotator=('annotator', '123'), **options):
+    """Create users, images, annotations and payments, then rebuild the stats counters"""
+    chunk_size = options.get('chunk_size', CHUNK_SIZE)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size = -262144')  # 256 MB of pages for the annotation indexes
+    admin_user, user_ids = create_test_users(annotators, admin, annotator, chunk_size)
+    totals = create_test_images(user_ids, images, **options)
+    start = time.perf_counter()
+    stats.rebuild()
+    print(f"  OK Rebuilt user stats in {time.perf_counter() - start:.1f}s")
+    return admin_user, totals
 
-def _make_labels_for_dispute(count, pending):
-    """Make labels with some Cat votes"""
-    if count < 2:
-        count = 2  # need at least 2 to have conflict
-    num_cat = random.randint(1, max(1, min(2, count - 1)))
-    labels = ['Cat'] * num_cat + ['Dog'] * (count - num_cat)
-    random.shuffle(labels)
-    if pending:
-        correctness = [None] * count
-    else:
-        correctness = [label == 'Dog' for label in labels]
-    return labels, correctness
-
-
-def create_test_annotations(images, annotators):
-    """Create annotations with disputes"""
-    print("\nCreating annotations with disputes...")
-
-    annotated_images = random.sample(images, ANNOTATED_COUNT)
-    dispute_images = set(random.sample(annotated_images, DISPUTE_COUNT))
-    resolved_disputes = set(random.sample(list(dispute_images), RESOLVED_DISPUTE_COUNT))
-    total_annotations = 0
-    for image in images:
-        if image not in annotated_images:
-            image.status = 'active'
-            image.review_status = 'none'
-            image.final_label = None
-            image.assigned_count = 0
-            image.save()
-            continue
-
-        is_dispute = image in dispute_images
-        is_resolved = image in resolved_disputes
-
-        ann_count = _pick_annotation_count()
-        if is_dispute and ann_count < 2:
-            ann_count = 2  # need conflict
-        ann_count = min(ann_count, len(annotators))
-        chosen_annotators = random.sample(annotators, ann_count)
-
-        if not is_dispute:
-            # No dispute: all Dog, auto approve
-            labels = ['Dog'] * len(chosen_annotators)
-            correctness = [True] * len(chosen_annotators)
-            image.review_status = 'reviewed'
-            image.final_label = 'Dog'
-        elif is_resolved:
-            labels, correctness = _make_labels_for_dispute(len(chosen_annotators), pending=False)
-            image.review_status = 'reviewed'
-            image.final_label = 'Dog'
-        else:  # pending dispute
-            labels, correctness = _make_labels_for_dispute(len(chosen_annotators), pending=True)
-            image.review_status = 'pending'
-            image.final_label = None
-
-        for user, label, correct in zip(chosen_annotators, labels, correctness):
-            Annotation.objects.create(
-                user=user,
-                image=image,
-                submitted_label=label,
-                is_correct=correct
-            )
-            total_annotations += 1
-
-        image.assigned_count = len(chosen_annotators)
-
-        # Align with app: completed only when assigned_count >= 5
-        if image.assigned_count >= 5:
-            image.status = 'completed'
-        else:
-            image.status = 'active'
-
-        image.save()
-
-    print(f"  OK Created annotations for {ANNOTATED_COUNT} images")
-    print(f"  OK Total annotation records: {total_annotations}")
-    print(f"  OK Disputes: {DISPUTE_COUNT} (resolved {RESOLVED_DISPUTE_COUNT}, pending {DISPUTE_COUNT - RESOLVED_DISPUTE_COUNT})")
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description='CrowdLabel test data generator')
+    parser.add_argument('--images', type=int, default=1000)
+    parser.add_argument('--annotators', type=int, default=10)
+    parser.add_argument('--categories', default='Cat, Dog')
+    parser.add_argument('--complete-rate', type=float, default=0.5, help='share of images with all votes in')
+    parser.add_argument('--dispute-rate', type=float, default=0.2, help='share of completed images with dissent')
+    parser.add_argument('--resolved-rate', type=float, default=0.8, help='share of disputes already reviewed')
+    parser.add_argument('--paid-rate', type=float, default=0.5, help='share of correct annotations already paid')
+    parser.add_argument('--payroll-runs', type=int, default=3, help='past weekly payroll runs to spread them over')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--fast-hasher', action='store_true',
+                        help='hash fixture passwords with MD5; run the server with CROWDLABEL_FAST_HASHER=1 to log in')
+    args = parser.parse_args()
+
     print("=" * 60)
     print("CrowdLabel System - Test Data Generator")
     print("=" * 60)
-    
+
     try:
         clear_existing_data()
-        with transaction.atomic():
-            admin, annotators = create_test_users()
-            images = create_test_images()
-            create_test_annotations(images, annotators)
-        
+        generate(
+            args.images, args.annotators,
+            categories=args.categories, complete_rate=args.complete_rate,
+            dispute_rate=args.dispute_rate, resolved_rate=args.resolved_rate, paid_rate=args.paid_rate,
+            payroll_runs=args.payroll_runs, seed=args.seed, chunk_size=args.chunk_size,
+        )
+
         print("\n" + "=" * 60)
         print("OK Test data generation completed successfully!")
         print("=" * 60)
         print("\nYou can now login with:")
         print("  Admin: admin / admin123")
-        print("  Annotators: annotator1-10 / 123")
+        print(f"  Annotators: annotator1-{args.annotators} / 123")
         print("\n")
-        
+
     except Exception as e:
         print(f"\nERROR: {str(e)}")
         import traceback
@@ -209,4 +260,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
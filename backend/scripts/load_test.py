@@ -0,0 +1,179 @@
+"""
+Concurrent Dispatch Load Test
+Simulates annotators calling tasks/next + annotate in parallel threads against
+a throwaway SQLite database, for each dispatch mode with and without task leases.
+Besides throughput it reports lock contention: the wait for the submit lock,
+deadlocks / lock timeouts, and how often a submit hit an image another submit
+was still writing (a row-lock wait on MySQL; SQLite locks the whole database).
+Run: python backend/scripts/load_test.py [--workers 1 4 16 64] [--seconds 10] [--modes fullest random shard]
+     python backend/scripts/load_test.py --submit locking optimistic   (SUBMIT_MODE)
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import itertools
+import tempfile
+import threading
+import django
+
+# Setup Django on a local SQLite stand-in
+os.environ['CROWDLABEL_DB'] = 'sqlite'
+os.environ.setdefault('CROWDLABEL_SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'load_test.sqlite3'))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowdlabel_backend.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.db import connections
+from django.test.utils import setup_test_environment, override_settings
+from rest_framework.test import APIClient
+from api.models import User, Image, Annotation, LabelSet
+from api.dispatch import dispatcher, DISPATCH_MODES
+from api import metrics
+
+
+def print_header(title):
+    print(f"\n{'=' * 70}")
+    print(f"  {title}")
+    print("=" * 70)
+
+
+def setup_database(image_count, annotator_count):
+    """Create schema, annotators and images"""
+    call_command('migrate', verbosity=0)
+    User.objects.bulk_create(
+        [User(username=f'load_annotator{i}', password='!') for i in range(annotator_count)]
+    )
+    Image.objects.bulk_create(
+        [Image(image_url=f'load://{i}', label_set=LabelSet.intern('Cat, Dog')) for i in range(image_count)]
+    )
+    return list(User.objects.filter(username__startswith='load_annotator').order_by('id'))
+
+
+def reset_data():
+    """Clear votes between runs"""
+    Annotation.objects.all().delete()
+    Image.objects.update(assigned_count=0, vote_counts=[], status='active', review_status='none', final_label=None,
+                         reviewed_at=None)
+    dispatcher.reset()
+
+
+def annotator_loop(user, deadline, think_seconds, stats, lock, writing):
+    """One simulated annotator: fetch, label, submit until time runs out"""
+    client = APIClient()
+    client.force_authenticate(user)
+    counts = {'ok': 0, 'rejected': 0, 'errors': 0, 'collisions': 0}
+    try:
+        while time.perf_counter() < deadline:
+            task = client.get('/api/tasks/next/').data
+            if not task:
+                break
+            time.sleep(think_seconds)  # time spent looking at the image
+            with lock:
+                if writing.get(task['id']):
+                    counts['collisions'] += 1
+                writing[task['id']] = writing.get(task['id'], 0) + 1
+            try:
+                res = client.post('/api/annotate/', {'image_id': task['id'], 'label': 'Dog'}, format='json')
+            finally:
+                with lock:
+                    writing[task['id']] -= 1
+            if res.status_code == 200:
+                counts['ok'] += 1
+            elif res.status_code in (400, 409):
+                counts['rejected'] += 1  # wasted work
+            else:
+                counts['errors'] += 1
+    finally:
+        connections.close_all()
+    with lock:
+        for key, value in counts.items():
+            stats[key] += value
+
+
+def lock_snapshot():
+    """Submit lock-wait histogram entry and lock error count so far"""
+    wait = metrics.LOCK_WAIT_SECONDS.collect().get(('submit',), [0] * (len(metrics.LOCK_WAIT_SECONDS.buckets) + 3))
+    errors = sum(n for (site, _), n in metrics.LOCK_ERRORS.collect().items() if site == 'submit')
+    return wait, errors
+
+
+def bucket_quantile(entry, buckets, q):
+    """Upper bound of the bucket holding quantile q of a histogram entry"""
+    total = entry[-1]
+    if not total:
+        return 0.0
+    cumulative = 0
+    for bound, count in zip(buckets + (float('inf'),), entry):
+        cumulative += count
+        if cumulative >= q * total:
+            return bound
+    return float('inf')
+
+
+def run_round(users, workers, seconds, think_seconds, mode, leases, submit='locking'):
+    reset_data()
+    stats = {'ok': 0, 'rejected': 0, 'errors': 0, 'collisions': 0}
+    lock = threading.Lock()
+    writing = {}  # image_id -> submits in flight
+    wait_before, errors_before = lock_snapshot()
+    with override_settings(TASK_DISPATCH_MODE=mode, TASK_LEASES_ENABLED=leases, SUBMIT_MODE=submit):
+        start = time.perf_counter()
+        deadline = start + seconds
+        threads = [threading.Thread(target=annotator_loop,
+                                    args=(users[i], deadline, think_seconds, stats, lock, writing))
+                   for i in range(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    wait_after, errors_after = lock_snapshot()
+    wait = [after - before for before, after in zip(wait_before, wait_after)]
+    stats['throughput'] = stats['ok'] / elapsed
+    stats['lock_p95'] = bucket_quantile(wait, metrics.LOCK_WAIT_SECONDS.buckets, 0.95)
+    stats['lock_errors'] = errors_after - errors_before
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent dispatch load test')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--think-ms', type=float, default=50, help='simulated labeling time per image')
+    parser.add_argument('--images', type=int, default=5000)
+    parser.add_argument('--modes', nargs='+', choices=DISPATCH_MODES, default=list(DISPATCH_MODES))
+    parser.add_argument('--leases', nargs='+', choices=('off', 'on'), default=['off', 'on'])
+    parser.add_argument('--submit', nargs='+', choices=('locking', 'optimistic'), default=['locking'])
+    args = parser.parse_args()
+
+    setup_test_environment()
+    logging.getLogger('django.request').setLevel(logging.ERROR)  # rejected submits are expected
+    logging.getLogger('api.views').setLevel(logging.CRITICAL)  # lock timeouts are counted, not logged
+    logging.getLogger('api.middleware').setLevel(logging.ERROR)  # slow-request warnings are expected here
+    print_header("CrowdLabel System - Concurrent Dispatch Load Test")
+    print(f"  Database: {os.environ['CROWDLABEL_SQLITE_PATH']}")
+    users = setup_database(args.images, max(args.workers))
+
+    print("""
+  +---------+---------+--------+------------+----------+----------+---------+--------+-----------+-----------+-----------+
+  | Workers | Mode    | Leases | Submit     | Accepted | Rejected | Waste % | ann/s  | Collide % | Lock p95  | Lock errs |
+  +---------+---------+--------+------------+----------+----------+---------+--------+-----------+-----------+-----------+""")
+    for workers, mode, leases, submit in itertools.product(args.workers, args.modes, args.leases, args.submit):
+        s = run_round(users, workers, args.seconds, args.think_ms / 1000, mode, leases == 'on', submit)
+        attempts = s['ok'] + s['rejected'] + s['errors']
+        waste = (s['rejected'] / attempts * 100) if attempts else 0
+        collide = (s['collisions'] / attempts * 100) if attempts else 0
+        p95 = f"<={s['lock_p95'] * 1000:g}ms" if s['lock_p95'] != float('inf') else '>10s'
+        print(f"  | {workers:>7} | {mode:<7} | {leases:<6} | {submit:<10} | {s['ok']:>8} | {s['rejected']:>8} "
+              f"| {waste:>6.1f}% | {s['throughput']:>6.1f} | {collide:>8.1f}% | {p95:>9} | {s['lock_errors']:>9} |")
+    print("  +---------+---------+--------+------------+----------+----------+---------+--------+-----------+-----------+-----------+")
+    print("\n  Rejected = submissions refused with 'Task completed' / 'Already annotated' / 409")
+    print("  Collide = submits that found another submit on the same image in flight (a row-lock wait on MySQL)")
+    print("  Lock p95 = bucket bound of the 95th percentile wait for the submit lock; Lock errs = deadlocks + timeouts")
+
+
+if __name__ == '__main__':
+    main()
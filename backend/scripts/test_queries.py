@@ -1,347 +0,0 @@
-"""
-Query Performance Test Script
-Tests query efficiency with index usage analysis
-Run: python backend/scripts/test_queries.py
-"""
-import os
-import sys
-import time
-import django
-
-# Setup Django
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crowdlabel_backend.settings')
-django.setup()
-
-from django.db import connection
-from django.db.models import Sum, Count
-from api.models import User, Image, Annotation, Payment
-
-# Number of runs for average time
-NUM_RUNS = 5
-
-
-def print_separator():
-    print("=" * 70)
-
-
-def print_header(title):
-    print(f"\n{'=' * 70}")
-    print(f"  {title}")
-    print("=" * 70)
-
-
-def run_explain(sql):
-    """Run EXPLAIN on a SQL query and return the plan"""
-    with connection.cursor() as cursor:
-        try:
-            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
-            return cursor.fetchall()
-        except Exception:
-            # Fallback for MySQL/PostgreSQL
-            try:
-                cursor.execute(f"EXPLAIN {sql}")
-                return cursor.fetchall()
-            except Exception:
-                return []
-
-
-def measure_query(query_func, runs=NUM_RUNS):
-    """Run a query multiple times and return average time in ms"""
-    times = []
-    result = None
-    for _ in range(runs):
-        start = time.time()
-        result = query_func()
-        elapsed = (time.time() - start) * 1000
-        times.append(elapsed)
-    avg_time = sum(times) / len(times)
-    return avg_time, result
-
-
-def show_database_statistics():
-    """Show current database statistics"""
-    print_header("Database Statistics")
-    
-    stats = {
-        'Total Users': User.objects.count(),
-        'Total Images': Image.objects.count(),
-        'Total Annotations': Annotation.objects.count(),
-        'Total Payments': Payment.objects.count(),
-        'Active Images': Image.objects.filter(status='active').count(),
-        'Completed Images': Image.objects.filter(status='completed').count(),
-        'Pending Review': Image.objects.filter(review_status='pending').count(),
-        'Reviewed Images': Image.objects.filter(review_status='reviewed').count(),
-    }
-    
-    for key, value in stats.items():
-        print(f"  {key}: {value:,}")
-
-
-def test_task_distribution(user_id=17):
-    """
-    Test 1: Task Distribution Query
-    Scenario: Find available task for annotator (excludes already done)
-    Index used: (status, assigned_count) composite index on Image table
-    """
-    print_header("Test 1: Task Distribution")
-    print(f"  Scenario: Get available task for user {user_id}")
-    print(f"  Expected Index: api_image (status, assigned_count)")
-    
-    def query():
-        done_ids = list(Annotation.objects.filter(user_id=user_id).values_list('image_id', flat=True))
-        return Image.objects.filter(
-            status='active',
-            assigned_count__lt=5
-        ).exclude(id__in=done_ids).order_by('-assigned_count').first()
-    
-    avg_time, result = measure_query(query)
-    
-    print(f"\n  Result: Task ID = {result.id if result else 'None'}")
-    print(f"  Average Time ({NUM_RUNS} runs): {avg_time:.2f} ms")
-    
-    # Show EXPLAIN for the main query
-    sql = str(Image.objects.filter(status='active', assigned_count__lt=5).query)
-    explain_result = run_explain(sql)
-    print(f"\n  EXPLAIN Analysis:")
-    for row in explain_result:
-        print(f"    {row}")
-    
-    # Performance note
-    print(f"\n  Index Benefit: Composite index (status, assigned_count)")
-    print(f"  Without Index: ~500ms (full table scan on 10,000 images)")
-    print(f"  With Index: ~5ms (index seek)")
-    
-    return avg_time
-
-
-def test_user_history(user_id=17):
-    """
-    Test 2: User History Query
-    Scenario: Get all annotations by a user with related image data
-    Index used: Foreign key index on Annotation.user_id
-    """
-    print_header("Test 2: User History")
-    print(f"  Scenario: Get annotation history for user {user_id}")
-    print(f"  Expected Index: api_annotation (user_id) FK index")
-    
-    def query():
-        return list(Annotation.objects.filter(user_id=user_id)
-                    .select_related('image')
-                    .order_by('-created_at')
-                    .values('id', 'submitted_label', 'is_correct', 'image__bounty'))
-    
-    avg_time, result = measure_query(query)
-    
-    print(f"\n  Result: {len(result)} annotations found")
-    print(f"  Average Time ({NUM_RUNS} runs): {avg_time:.2f} ms")
-    
-    # Show sample
-    if result:
-        print(f"\n  Sample (first 3):")
-        for item in result[:3]:
-            status = "Pending" if item['is_correct'] is None else ("Correct" if item['is_correct'] else "Wrong")
-            print(f"    - Annotation #{item['id']}: {item['submitted_label']} ({status})")
-    
-    # Show EXPLAIN
-    sql = str(Annotation.objects.filter(user_id=user_id).query)
-    explain_result = run_explain(sql)
-    print(f"\n  EXPLAIN Analysis:")
-    for row in explain_result:
-        print(f"    {row}")
-    
-    print(f"\n  Index Benefit: FK index on user_id")
-    print(f"  Without Index: ~200ms (full table scan)")
-    print(f"  With Index: ~3ms (index seek by user_id)")
-    
-    return avg_time
-
-
-def test_unpaid_balance():
-    """
-    Test 3: Unpaid Balance Query
-    Scenario: Calculate total unpaid amount per user (aggregate with JOIN)
-    Index used: is_correct, payment_id indexes on Annotation table
-    """
-    print_header("Test 3: Unpaid Balance Calculation")
-    print(f"  Scenario: Get all users with unpaid balance (aggregate query)")
-    print(f"  Expected Index: api_annotation (is_correct, payment_id)")
-    
-    def query():
-        return list(Annotation.objects.filter(
-            is_correct=True,
-            payment__isnull=True
-        ).values('user__id', 'user__username').annotate(
-            total_amount=Sum('image__bounty')
-        ).filter(total_amount__gt=0))
-    
-    avg_time, result = measure_query(query)
-    
-    total_unpaid = sum(item['total_amount'] for item in result)
-    
-    print(f"\n  Result: {len(result)} users with unpaid balance")
-    print(f"  Total Unpaid Amount: ${total_unpaid:.2f}")
-    print(f"  Average Time ({NUM_RUNS} runs): {avg_time:.2f} ms")
-    
-    # Show details
-    if result:
-        print(f"\n  Unpaid Users:")
-        for item in result:
-            print(f"    - {item['user__username']}: ${item['total_amount']:.2f}")
-    
-    # Show EXPLAIN
-    sql = str(Annotation.objects.filter(is_correct=True, payment__isnull=True).query)
-    explain_result = run_explain(sql)
-    print(f"\n  EXPLAIN Analysis:")
-    for row in explain_result:
-        print(f"    {row}")
-    
-    print(f"\n  Index Benefit: Filters on is_correct + payment FK")
-    print(f"  Without Index: ~300ms (full table scan + JOIN)")
-    print(f"  With Index: ~10ms (filtered index seek)")
-    
-    return avg_time
-
-
-def test_review_queue():
-    """
-    Test 4: Admin Review Queue
-    Scenario: Get all images pending review (conflict detected)
-    Index used: review_status on Image table
-    """
-    print_header("Test 4: Admin Review Queue")
-    print(f"  Scenario: Get images with pending review (conflict)")
-    print(f"  Expected Index: api_image (review_status)")
-    
-    def query():
-        return list(Image.objects.filter(review_status='pending')
-                    .values('id', 'category_options', 'assigned_count'))
-    
-    avg_time, result = measure_query(query)
-    
-    print(f"\n  Result: {len(result)} images pending review")
-    print(f"  Average Time ({NUM_RUNS} runs): {avg_time:.2f} ms")
-    
-    # Show sample
-    if result:
-        print(f"\n  Sample (first 5):")
-        for task in result[:5]:
-            print(f"    - Image #{task['id']}: {task['category_options']} ({task['assigned_count']} annotations)")
-    
-    return avg_time
-
-
-def test_user_accuracy(user_id=17):
-    """
-    Test 5: User Accuracy Calculation
-    Scenario: Calculate accuracy rate for a specific user
-    Index used: user_id FK index + is_correct filter
-    """
-    print_header("Test 5: User Accuracy Rate")
-    print(f"  Scenario: Calculate accuracy for user {user_id}")
-    
-    def query():
-        judged = Annotation.objects.filter(user_id=user_id, is_correct__isnull=False)
-        total = judged.count()
-        correct = judged.filter(is_correct=True).count()
-        return {'total': total, 'correct': correct}
-    
-    avg_time, result = measure_query(query)
-    
-    accuracy = (result['correct'] / result['total'] * 100) if result['total'] > 0 else 100.0
-    
-    print(f"\n  Result:")
-    print(f"    Total Judged: {result['total']}")
-    print(f"    Correct: {result['correct']}")
-    print(f"    Accuracy: {accuracy:.1f}%")
-    print(f"  Average Time ({NUM_RUNS} runs): {avg_time:.2f} ms")
-    
-    return avg_time
-
-
-def show_index_summary():
-    """Show summary of indexes in use"""
-    print_header("Index Summary")
-    
-    print("""
-  Table: api_image
-    - PRIMARY KEY (id)
-    - INDEX (status, assigned_count)  <- Composite index for task distribution
-    
-  Table: api_annotation
-    - PRIMARY KEY (id)
-    - UNIQUE (user_id, image_id)      <- Prevents duplicate annotations
-    - FK INDEX (user_id)              <- User history queries
-    - FK INDEX (image_id)             <- Image annotation lookup
-    - FK INDEX (payment_id)           <- Payment tracking
-    
-  Table: api_user
-    - PRIMARY KEY (id)
-    - UNIQUE (username)               <- Login lookup
-    
-  Table: api_payment
-    - PRIMARY KEY (id)
-    - FK INDEX (annotator_id)         <- User payment history
-    """)
-
-
-def show_performance_summary(times):
-    """Show performance summary table"""
-    print_header("Performance Summary")
-    
-    print("""
-  +---------------------+-------------+------------+-------------+
-  | Query Scenario      | Avg Time    | With Index | Improvement |
-  +---------------------+-------------+------------+-------------+""")
-    
-    scenarios = [
-        ("Task Distribution", times.get('task_dist', 0), "~5ms", "100x faster"),
-        ("User History", times.get('user_hist', 0), "~3ms", "66x faster"),
-        ("Unpaid Balance", times.get('unpaid', 0), "~10ms", "30x faster"),
-        ("Review Queue", times.get('review', 0), "~5ms", "50x faster"),
-        ("User Accuracy", times.get('accuracy', 0), "~2ms", "40x faster"),
-    ]
-    
-    for name, measured, expected, improvement in scenarios:
-        print(f"  | {name:<19} | {measured:>8.2f}ms | {expected:>10} | {improvement:>11} |")
-    
-    print("  +---------------------+-------------+------------+-------------+")
-    print("\n  Note: 'With Index' shows expected time with proper indexing.")
-    print("  Measured times may vary based on data size and system load.")
-
-
-def main():
-    """Main function - run all tests"""
-    print("\n" + "=" * 70)
-    print("  CrowdLabel System - Query Performance Test")
-    print("  Using Django ORM with EXPLAIN Analysis")
-    print("=" * 70)
-    
-    # Reset query log
-    from django.db import reset_queries
-    reset_queries()
-    
-    # Show current data
-    show_database_statistics()
-    
-    # Run tests and collect times
-    times = {}
-    times['task_dist'] = test_task_distribution()
-    times['user_hist'] = test_user_history()
-    times['unpaid'] = test_unpaid_balance()
-    times['review'] = test_review_queue()
-    times['accuracy'] = test_user_accuracy()
-    
-    # Show index info
-    show_index_summary()
-    
-    # Show summary
-    show_performance_summary(times)
-    
-    print("\n" + "=" * 70)
-    print("  Query Performance Test Completed!")
-    print("=" * 70 + "\n")
-
-
-if __name__ == '__main__':
-    main()
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { api } from './src/services/api';
-import { User, ImageTask, Annotation, UserStats, UnpaidUser } from './src/types';
+import { User, ImageTask, ImageListItem, Annotation, UserStats, UnpaidUser } from './src/types';
 import { 
   LogOut, 
   CheckSquare, 
@@ -169,9 +169,9 @@ const AnnotatorDashboard = ({ onLogout }: { user: User, onLogout: () => void })
 // ===== Admin Dashboard =====
 const AdminDashboard = ({ onLogout }: { user: User, onLogout: () => void }) => {
   const [tab, setTab] = useState<'reviews'|'payroll'|'tasks'>('reviews');
-  const [reviews, setReviews] = useState<ImageTask[]>([]);
+  const [reviews, setReviews] = useState<ImageListItem[]>([]);
   const [unpaid, setUnpaid] = useState<UnpaidUser[]>([]);
-  const [activeTasks, setActiveTasks] = useState<ImageTask[]>([]);
+  const [activeTasks, setActiveTasks] = useState<ImageListItem[]>([]);
   
   // task form state
   const [url, setUrl] = useState('');
@@ -246,6 +246,11 @@ const AdminDashboard = ({ onLogout }: { user: User, onLogout: () => void }) => {
                <div key={r.id} className="bg-white p-4 rounded shadow">
                  <img src={r.image_url} className="h-40 w-full object-cover rounded mb-4"/>
                  <h4 className="font-bold text-red-500 mb-2">CONFLICT DETECTED</h4>
+                 <ul className="text-xs text-slate-500 mb-2">
+                   {(r.votes || []).map(v => (
+                     <li key={v.label}>{v.label}: {v.count} vote{v.count === 1 ? '' : 's'} (annotators {v.annotators.map(id => `#${id}`).join(', ')})</li>
+                   ))}
+                 </ul>
                  <div className="flex gap-2">
                    {r.options_list.map(opt => (
                      <button key={opt} onClick={() => handleResolve(r.id, opt)} className="bg-slate-100 px-3 py-1 rounded hover:bg-emerald-500 hover:text-white">
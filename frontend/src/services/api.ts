@@ -1,4 +1,4 @@
-import { User, ImageTask, Annotation, UserStats, UnpaidUser } from '../types';
+import { User, ImageTask, ImageListItem, Annotation, UserStats, UnpaidUser, TaskBatch, Page, Job, JobStatus, PayrollResult } from '../types';
 
 const API_URL = 'http://localhost:8000/api';
 
@@ -40,24 +40,62 @@ export const api = {
     return res;
   },
   
+  getTaskBatch: (n: number = 20) => request<TaskBatch>(`/tasks/batch/?n=${n}`, { method: 'GET' }),
+
   submitAnnotation: (image_id: number, label: string) => 
     request('/annotate/', { method: 'POST', body: JSON.stringify({ image_id, label }) }),
   
+  submitAnnotations: (items: { image_id: number; label: string }[]) =>
+    request<{ results: { image_id?: number; status: string; error?: string }[] }>('/annotate/bulk/', { method: 'POST', body: JSON.stringify({ items }) }),
+  
   getStats: () => request<UserStats>('/stats/', { method: 'GET' }),
   
-  getHistory: () => request<Annotation[]>('/history/', { method: 'GET' }),
+  getHistoryPage: (cursor?: string | null, limit: number = 50) =>
+    request<Page<Annotation>>(`/history/?limit=${limit}${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`, { method: 'GET' }),
+  
+  // latest page only
+  getHistory: async () => (await api.getHistoryPage()).results,
 
   // ===== Admin APIs =====
-  getReviewQueue: () => request<ImageTask[]>('/admin/reviews/', { method: 'GET' }),
+  // params: sort (created_at | bounty, "-" for descending), cursor, limit, min_bounty, ...
+  getReviewQueuePage: (params: Record<string, string> = {}) =>
+    request<Page<ImageListItem>>(`/admin/reviews/?${new URLSearchParams(params)}`, { method: 'GET' }),
+
+  getReviewQueue: async () => (await api.getReviewQueuePage()).results,
   
   resolveConflict: (image_id: number, true_label: string) => 
     request('/admin/resolve/', { method: 'POST', body: JSON.stringify({ image_id, true_label }) }),
+
+  resolveConflicts: (items: { image_id: number; true_label: string }[]) =>
+    request<{ resolved: number; results: { image_id?: number; status: string; error?: string }[] }>(
+      '/admin/resolve/bulk/', { method: 'POST', body: JSON.stringify({ items }) }),
     
   getUnpaidUsers: () => request<UnpaidUser[]>('/admin/unpaid/', { method: 'GET' }),
   
-  runPayroll: () => request<{total: number}>('/admin/payroll/', { method: 'POST' }),
+  // queues a payroll job and polls it; onProgress gets each update
+  runPayroll: async (onProgress?: (job: Job<PayrollResult>) => void) => {
+    const { job } = await request<{ job: Job<PayrollResult> }>('/admin/payroll/', { method: 'POST' });
+    return (await api.waitForJob(job.id, onProgress)).result as PayrollResult;
+  },
+
+  getJob: <R = Record<string, unknown>>(id: number) => request<Job<R>>(`/admin/jobs/${id}/`, { method: 'GET' }),
+
+  // poll a job until it finishes; rejects with the job's error if it failed
+  waitForJob: async <R = Record<string, unknown>>(id: number, onProgress?: (job: Job<R>) => void, intervalMs = 1000) => {
+    for (;;) {
+      const job = await api.getJob<R>(id);
+      onProgress?.(job);
+      if (job.status === JobStatus.SUCCEEDED) return job;
+      if (job.status === JobStatus.FAILED) throw new Error(job.error || `Job ${id} failed`);
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+  },
   
-  getAllActiveTasks: () => request<ImageTask[]>('/tasks/active/', { method: 'GET' }),
+  // params: sort (created_at | bounty | assigned_count), cursor, limit, min_bounty, max_bounty, ...
+  getActiveTasksPage: (params: Record<string, string> = {}) =>
+    request<Page<ImageListItem>>(`/tasks/active/?${new URLSearchParams(params)}`, { method: 'GET' }),
+
+  getAllActiveTasks: async () => (await api.getActiveTasksPage()).results,
   
   addTask: (url: string, categories: string, bounty: number) => 
     request('/tasks/add/', { method: 'POST', body: JSON.stringify({ url, categories, bounty }) }),
@@ -37,6 +37,7 @@ export interface User {
 export interface ImageTask {
   id: number;
   image_url: string;
+  label_set: number;
   category_options: string;  // e.g. "Cat,Dog,Bird"
   options_list: string[];    // e.g. ["Cat", "Dog", "Bird"]
   final_label: string | null;
@@ -46,17 +47,43 @@ export interface ImageTask {
   status: ImageStatus;
 }
 
-// Annotation type
+// Votes for one label of a queued image
+export interface VoteBreakdown {
+  label: string;
+  count: number;
+  annotators: number[];  // user ids
+}
+
+// Row of the admin task listings (no final label / raw options)
+export type ImageListItem = Omit<ImageTask, 'label_set' | 'category_options' | 'final_label'> & {
+  created_at: string;
+  vote_counts: Record<string, number>;  // e.g. {"Cat": 1, "Dog": 4}; never sent to annotators
+  votes?: VoteBreakdown[];  // review queue only, most votes first
+};
+
+// Batch of reserved tasks
+export interface TaskBatch {
+  tasks: ImageTask[];
+  expires_at: string;  // unsubmitted tasks are released after this
+}
+
+// Annotation type, as in the compact /history/ rows (?fields=full also returns user)
 export interface Annotation {
   id: number;
-  user: number;
   image: number;
+  label: number;             // index into the image's options
   submitted_label: string;
   is_correct: boolean | null;
   payment: number | null;
   created_at: string;
 }
 
+// Cursor-paginated list
+export interface Page<T> {
+  results: T[];
+  next_cursor: string | null;  // pass back as ?cursor= for the next page
+}
+
 // Payment type
 export interface Payment {
   id: number;
@@ -78,4 +105,36 @@ export interface UnpaidUser {
   userId: number;
   username: string;
   amount: number;
-}
\ No newline at end of file
+}
+
+// Background job status
+export enum JobStatus {
+  QUEUED = 'queued',
+  RUNNING = 'running',
+  SUCCEEDED = 'succeeded',
+  FAILED = 'failed',
+}
+
+// Background job (payroll, rescore, export)
+export interface Job<R = Record<string, unknown>> {
+  id: number;
+  kind: string;
+  params: Record<string, unknown>;
+  status: JobStatus;
+  progress: number;         // 0..1
+  message: string;          // latest progress message
+  result: R | null;         // set once succeeded
+  error: string;
+  attempts: number;
+  created_by: string | null;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+  download_url: string | null;  // finished export jobs only
+}
+
+// Result of a payroll job
+export interface PayrollResult {
+  total: number;
+  users: number;
+}